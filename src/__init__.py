@@ -1,7 +1,7 @@
 proj_id = 'cmat-315920'
 root_path = '/home/jupyter'
 
-import google, time, datetime, dataclasses, typing, os, pathlib, shutil, urllib
+import google, google.auth, time, datetime, dataclasses, typing, os, sys, pathlib, shutil, urllib, concurrent.futures, re, json, hashlib, threading, contextlib, functools, resource, fcntl, collections
 import zipfile as zf, numpy as np, pandas as pd, geopandas as gpd, networkx as nx
 import matplotlib.pyplot as plt, plotly.express as px
 from shapely.ops import orient
@@ -18,6 +18,92 @@ warnings.filterwarnings('ignore', message='.*Pyarrow could not determine the typ
 
 def rpt(msg):
     print(msg, end=concat_str, flush=True)
+
+######## Tracing - nested spans recording wall & cpu time, peak RSS and counters (bytes downloaded, rows, ########
+######## warehouse bytes processed & slot time). Spans opened in bq_pool threads nest under the submitting span ########
+######## cpu is this thread's time only - work in threads the span starts (pyarrow, the BigQuery storage reader) is missed. ########
+######## process_cpu is the whole process's, so it also counts whatever other threads did meanwhile ########
+######## process_peak_rss_gb is the process high-water mark at the span's end, whichever span reached it; ########
+######## peak_rss_growth_gb is how far the span raised it (0 when an earlier peak was higher) ########
+######## Only the most recent span_limit spans are kept, so a long chain's steps can't grow the trace without bound ########
+span_limit = 100000
+Spans = collections.deque(maxlen=span_limit)
+trace_local = threading.local()
+trace_lock = threading.Lock()
+
+def current_span():
+    stack = getattr(trace_local, 'stack', [])
+    return stack[-1] if len(stack) > 0 else None
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    parent = current_span()
+    s = {'name': name, 'id': f'{os.getpid()}_{threading.get_ident()}_{time.perf_counter_ns()}',
+         'parent': None if parent is None else parent['id'], 'pid': os.getpid(), 'tid': threading.get_ident(),
+         'start': time.time(), **attrs}
+    trace_local.stack = getattr(trace_local, 'stack', []) + [s]
+    cpu, process_cpu = time.thread_time(), time.process_time()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        yield s
+    except Exception as e:
+        s['error'] = repr(e)
+        raise
+    finally:
+        trace_local.stack = trace_local.stack[:-1]
+        s['wall'] = time.time() - s['start']
+        s['cpu'] = time.thread_time() - cpu
+        s['process_cpu'] = time.process_time() - process_cpu
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        s['process_peak_rss_gb'] = peak / 2**20
+        s['peak_rss_growth_gb'] = (peak - rss) / 2**20
+        with trace_lock:
+            Spans.append(s)
+
+def count(**counters):
+######## add to the innermost open span - a no-op outside any span ########
+    s = current_span()
+    if s is not None:
+        for k, v in counters.items():
+            if v is not None:
+                s[k] = s.get(k, 0) + v
+
+def traced(fn):
+######## decorator - one span per call named by the function, counting the rows it returns ########
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(fn.__qualname__):
+            out = fn(*args, **kwargs)
+            if isinstance(out, (pd.DataFrame, pd.Series)):
+                count(rows_out=len(out))
+            elif hasattr(out, 'num_rows'):
+                count(rows_out=out.num_rows)
+            return out
+    return wrapper
+
+def trace_report(fn=None, chrome=None):
+######## per-name summary; fn gets every span as json lines & chrome a chrome://tracing / Perfetto file ########
+    with trace_lock:
+        df = pd.DataFrame(list(Spans))
+    if len(df) == 0:
+        return df
+    if len(df) == Spans.maxlen:
+        print(f'only the last {Spans.maxlen} spans were kept - earlier ones are not in this report')
+    counters = [c for c in ['bytes_downloaded', 'rows_in', 'rows_out', 'bq_bytes_processed', 'bq_slot_ms', 'cache_hits'] if c in df]
+    summary = df.groupby('name').agg(calls=('id', 'size'), wall=('wall', 'sum'), cpu=('cpu', 'sum'), process_cpu=('process_cpu', 'sum'),
+                                     process_peak_rss_gb=('process_peak_rss_gb', 'max'), peak_rss_growth_gb=('peak_rss_growth_gb', 'max'),
+                                     **{c: (c, 'sum') for c in counters}).sort_values('wall', ascending=False)
+    if fn is not None:
+        df.to_json(fn, orient='records', lines=True, default_handler=str)
+    if chrome is not None:
+        t0 = df['start'].min()
+        events = [{'name': r['name'], 'ph': 'X', 'ts': (r['start'] - t0) * 1e6, 'dur': r['wall'] * 1e6, 'pid': r['pid'], 'tid': r['tid'],
+                   'args': {k: r[k] for k in ['cpu', 'process_cpu', 'process_peak_rss_gb', 'peak_rss_growth_gb'] + counters + [c for c in ['tbl', 'error'] if c in df] if pd.notna(r[k])}}
+                  for r in df.to_dict('records')]
+        with open(chrome, 'w') as f:
+            json.dump({'traceEvents': events}, f, default=str)
+    print(summary.to_string())
+    return summary
     
 def check_level(level):
     assert level in Levels, f"level must be one of {Levels}, got {level}"
@@ -59,33 +145,217 @@ def listify(x):
     else:
         return [x]
 
+@traced
 def extract_file(zipfile, fn, **kwargs):
     file = zipfile.extract(fn)
     return lower_cols(pd.read_csv(file, dtype=str, **kwargs))
 
+######## Persistent cache of table metadata & query results under data_path/cache ########
+######## results are keyed by normalized sql + last-modified time of every table it reads, re-checked on every query ########
+######## metadata & dataset table lists expire after meta_ttl seconds (tables change on other machines) - load_table & ########
+######## delete_table also invalidate the metadata of the table they touch & the table list of its dataset ########
+def cache_key(*args):
+    return hashlib.sha256('|'.join(str(x) for x in args).encode()).hexdigest()
+
+def cache_write(fn, write):
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    tmp = fn.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        write(tmp)
+        os.replace(tmp, fn)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+@contextlib.contextmanager
+def file_lock(fn):
+######## exclusive lock across processes on this machine - for caches several seeds build at once ########
+    fn = pathlib.Path(fn)
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    with open(fn, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def cache_prune():
+######## least recently used results go first once the cache exceeds cache_size ########
+    files = sorted((cache_path / 'results').glob('*.parquet'), key=lambda f: f.stat().st_atime)
+    total = sum(f.stat().st_size for f in files)
+    for f in files:
+        if total <= cache_size:
+            break
+        total -= f.stat().st_size
+        f.unlink(missing_ok=True)
+
+def clear_cache():
+    shutil.rmtree(cache_path, ignore_errors=True)
+
+def invalidate(tbl):
+    (cache_path / f'meta/{tbl}.json').unlink(missing_ok=True)
+    (cache_path / f"tables/{tbl.rsplit('.', 1)[0]}.json").unlink(missing_ok=True)
+
+def get_meta(tbl, max_age=None):
+######## metadata cached longer ago than max_age seconds (meta_ttl by default) is fetched again ########
+    fn = cache_path / f'meta/{tbl}.json'
+    try:
+        if time.time() - fn.stat().st_mtime <= (meta_ttl if max_age is None else max_age):
+            with open(fn) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    try:
+        t = get_client().get_table(tbl)
+        meta = {'exists': True, 'modified': str(t.modified), 'cols': [s.name for s in t.schema]}
+    except google.api_core.exceptions.NotFound:
+        meta = {'exists': False}
+    cache_write(fn, lambda tmp: tmp.write_text(json.dumps(meta)))
+    return meta
+
+def list_tables(ds, max_age=None):
+######## table ids of a dataset, cached & expired like get_meta ########
+    fn = cache_path / f'tables/{ds}.json'
+    try:
+        if time.time() - fn.stat().st_mtime <= (meta_ttl if max_age is None else max_age):
+            with open(fn) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    tables = [t.table_id for t in get_client().list_tables(ds)]
+    cache_write(fn, lambda tmp: tmp.write_text(json.dumps(tables)))
+    return tables
+
 def check_table(tbl):
     try:
-        bqclient.get_table(tbl)
-        return True
+        return get_meta(tbl)['exists']
     except:
         return False
 
 def get_cols(tbl):
-    return [s.name for s in bqclient.get_table(tbl).schema if s.name.lower() != 'geoid']
-    
-def run_query(query):
-    res = bqclient.query(query).result()
+    return [c for c in get_meta(tbl)['cols'] if c.lower() != 'geoid']
+
+######## Node tables are a narrow core plus column-group tables named {core}_{group} (geometry, census, elections_{yr}) ########
+def node_groups(tbl):
+    ds, stem = tbl.rsplit('.', 1)
+    return {t[len(stem)+1:]: f'{ds}.{t}' for t in list_tables(ds) if t.startswith(stem + '_')}
+
+def nodes_stamp(tbl):
+######## last-modified time of a node table & its column groups - local caches built from them compare against it ########
+    tbls = [tbl] + sorted(node_groups(tbl).values())
+    return json.loads(json.dumps({t: get_meta(t).get('modified') for t in tbls}, default=str))
+
+def node_cols(tbl, groups=None):
+######## {column: table holding it} over the core & the requested groups (all by default) - core wins ties ########
+    G = node_groups(tbl)
+    tbls = [tbl] + [t for g, t in G.items() if groups is None or g in groups or g.split('_')[0] in groups]
+    where = dict()
+    for t in tbls:
+        for c in get_cols(t):
+            where.setdefault(c, t)
+    return where
+
+def node_query(tbl, cols, groups=None):
+######## projection across the core & group tables - only the tables holding a requested column are joined ########
+    where = node_cols(tbl, groups)
+    cols = [c for c in cols if c != 'geoid']
+    missing = [c for c in cols if c not in where]
+    assert len(missing) == 0, f'no node table holds {missing}'
+    tbls = list(dict.fromkeys([tbl] + [where[c] for c in cols]))
+    joins = ''.join(f'\nleft join\n    {t} as T{i}\nusing\n    (geoid)' for i, t in enumerate(tbls[1:], 1))
+    return f"""
+select
+    geoid,
+    {join_str(1).join([f'T{tbls.index(where[c])}.{c}' for c in cols])}
+from
+    {tbl} as T0{joins}
+"""
+
+def read_nodes(tbl, cols, groups=None):
+    return run_query(node_query(tbl, cols, groups))
+
+def set_client(client, storage=None):
+######## swap in another client (e.g. a local fake for testing) - every BigQuery call below goes through these ########
+    global bqclient, bqstorage
+    bqclient, bqstorage = client, storage
+
+def get_client():
+######## the default clients are made on first use, so importing needs no credentials & set_client can come first ########
+    global bqclient, bqstorage
+    if bqclient is None:
+        cred, proj = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+        bqclient, bqstorage = bigquery.Client(credentials=cred, project=proj), BigQueryReadClient(credentials=cred)
+    return bqclient
+
+def log_job(job, tbl=None):
+    Jobs.append({'job_id'         : getattr(job, 'job_id', None),
+                 'job_type'       : getattr(job, 'job_type', None),
+                 'tbl'            : tbl,
+                 'bytes_processed': getattr(job, 'total_bytes_processed', None),
+                 'bytes_billed'   : getattr(job, 'total_bytes_billed', None),
+                 'slot_millis'    : getattr(job, 'slot_millis', None),
+                 'created'        : getattr(job, 'created', None),
+                 'ended'          : getattr(job, 'ended', None)})
+    count(bq_bytes_processed=getattr(job, 'total_bytes_processed', None), bq_slot_ms=getattr(job, 'slot_millis', None),
+          rows_in=getattr(job, 'output_rows', None))  # rows a load job wrote - the only place rows_in is counted
+    return job
+
+def job_report():
+    return pd.DataFrame(Jobs)
+
+def reset_pool():
+######## forked workers (e.g. multiprocessing.Pool of seeds) need their own threads ########
+    global bq_pool
+    bq_pool = concurrent.futures.ThreadPoolExecutor(max_workers=16)
+
+def submit(fn, *args, **kwargs):
+######## run independent jobs concurrently - collect results with wait ########
+    parent = current_span()
+    def run():
+        trace_local.stack = [] if parent is None else [parent]  # spans in the worker thread nest under the submitter
+        return fn(*args, **kwargs)
+    return bq_pool.submit(run)
+
+def wait(futures):
+    return [f.result() for f in futures]
+
+@traced
+def run_query(query, cache=True):
+    if cache:
+        tbls = sorted(set(re.findall(r'[\w-]+\.\w+\.\w+', query)))
+        metas = [get_meta(t, max_age=0) for t in tbls]  # one cheap get_table each - results must not outlive a change
+        cache = all(m['exists'] for m in metas)
+    if cache:
+        stamps = [f"{t}@{m['modified']}" for t, m in zip(tbls, metas)]
+        fn = cache_path / f'results/{cache_key(" ".join(query.split()), *stamps)}.parquet'
+        if fn.exists():
+            os.utime(fn)
+            count(cache_hits=1)
+            return pd.read_parquet(fn)
+    job = get_client().query(query)
+    res = job.result()
+    log_job(job)
     try:
-        return res.to_dataframe()
+        df = res.to_dataframe(bqstorage_client=bqstorage)
     except:
         return True
+    if cache:
+        try:
+            cache_write(fn, lambda tmp: df.to_parquet(tmp))
+            cache_prune()
+        except Exception as e:  # some result dtypes have no parquet form - return them uncached
+            rpt(f'result not cached - {e}')
+    return df
+
+def stream_query(query):
+######## yield results as Arrow record batches through the Storage Read API ########
+    job = get_client().query(query)
+    res = job.result()
+    log_job(job)
+    yield from res.to_arrow_iterable(bqstorage_client=bqstorage)
 
 def delete_table(tbl):
-    query = f"drop table {tbl}"
-    try:
-        run_query(query)
-    except google.api_core.exceptions.NotFound:
-        pass
+    get_client().delete_table(tbl, not_found_ok=True)
+    invalidate(tbl)
 
 def read_table(tbl, rows=99999999999, start=0, cols='*'):
     query = f'select {", ".join(cols)} from {tbl} limit {rows}'
@@ -96,19 +366,26 @@ def read_table(tbl, rows=99999999999, start=0, cols='*'):
 def head(tbl, rows=10):
     return read_table(tbl, rows)
 
-def load_table(tbl, df=None, file=None, query=None, overwrite=True, preview_rows=0):
+@traced
+def load_table(tbl, df=None, file=None, query=None, overwrite=True, preview_rows=0, job_config=None):
 #     rpt(f'loading BigQuery table {tbl}')
-    if overwrite:
-        delete_table(tbl)
+######## truncate/append dispositions replace the old drop-then-load ########
+    disp = 'WRITE_TRUNCATE' if overwrite else 'WRITE_APPEND'
+    if job_config is not None:
+        job_config.write_disposition = disp  # overwrite decides, whatever else a passed config sets
+    current_span()['tbl'] = tbl
     if df is not None:
-        job = bqclient.load_table_from_dataframe(df, tbl).result()
+        job = get_client().load_table_from_dataframe(df, tbl, job_config=job_config or bigquery.LoadJobConfig(write_disposition=disp))
     elif file is not None:
         with open(file, mode="rb") as f:
-            job = bqclient.load_table_from_file(f, tbl, job_config=bigquery.LoadJobConfig(autodetect=True)).result()
+            job = get_client().load_table_from_file(f, tbl, job_config=job_config or bigquery.LoadJobConfig(autodetect=True, write_disposition=disp))
     elif query is not None:
-        job = bqclient.query(query, job_config=bigquery.QueryJobConfig(destination=tbl)).result()
+        job = get_client().query(query, job_config=bigquery.QueryJobConfig(destination=tbl, write_disposition=disp))
     else:
         raise Exception('at least one of df, file, or query must be specified')
+    job.result()
+    log_job(job, tbl)
+    invalidate(tbl)
     if preview_rows > 0:
         print(head(tbl, preview_rows))
     return tbl
@@ -137,9 +414,63 @@ where
 """
     return lower_cols(run_query(query)).set_index('name')
 
+def register_state(abbr, fips, name=None):
+######## a state known without the warehouse - the synthetic fixture states, so offline runs never query ########
+    local_states[abbr] = pd.Series({'fips': fips, 'abbr': abbr}, name=name or abbr)
+    return local_states[abbr]
+
+def get_state(abbr):
+######## the state table is fetched on first use rather than at import - registered states need no query at all ########
+    global states
+    if abbr in local_states:
+        return local_states[abbr]
+    if states is None:
+        print('getting states')
+        states = get_states()
+    return states[states['abbr']==abbr].iloc[0]
+
 def get_components(graph):
     return sorted([tuple(x) for x in nx.connected_components(graph)], key=lambda x:len(x), reverse=True)
 
+######## Reversible int64 codec for geoids and aggregated ids (tabblock, bg, tract, cnty, cntyvtd, ...) ########
+######## all-digit ids (up to 15 chars) are base 11 with '0'-'9' -> 1-10 so leading zeros & length survive ########
+######## ids with letters (up to 12 chars, e.g. cntyvtd '001000001a') are base 37 and stored negative ########
+######## used by the graph files, MCMC, the plan store & the local caches - the BigQuery stages keep string geoids, ########
+######## as their SQL slices them (substring(cnty, 3), level prefixes, crosswalk joins) ########
+def encode_geoid(x):
+    s = np.char.lower(np.asarray(x, dtype='U'))
+    assert np.char.str_len(s).max(initial=0) <= 15, 'geoids longer than 15 characters cannot be encoded'
+    u = np.frombuffer(s.astype('S15').tobytes(), dtype='uint8').reshape(-1, 15).astype('int64')
+    digit = np.where((u >= 48) & (u <= 57), u - 47, np.where((u >= 97) & (u <= 122), u - 86, 0))
+    assert not ((u > 0) & (digit == 0)).any(), 'geoids may only contain digits & letters'
+    numeric = (digit <= 10).all(axis=1)
+    assert ((u > 0).sum(axis=1)[~numeric] <= 12).all(), 'geoids with letters are limited to 12 characters'
+    base = np.where(numeric, 11, 37)
+    val = np.zeros(len(u), dtype='int64')
+    for j in range(15):
+        val = np.where(u[:, j] > 0, val * base + digit[:, j], val)
+    return np.where(numeric, val, -val)
+
+def decode_geoid(x):
+######## presentation edge only - everything internal works on the int64 codes ########
+    x = np.asarray(x, dtype='int64')
+    base = np.where(x < 0, 37, 11)
+    v = np.abs(x)
+    asc = np.zeros((len(x), 15), dtype='uint8')
+    for j in range(15):  # least significant first, so the string comes out reversed
+        d = v % base
+        asc[:, j] = np.where(d == 0, 0, np.where(d <= 10, d + 47, d + 86))
+        v = v // base
+    s = np.ascontiguousarray(asc).view('S15').ravel().astype('U15')
+    return pd.Series(s).str[::-1].to_numpy()
+
+def graph_to_codes(graph):
+######## older graph files are keyed by geoid strings ########
+    if len(graph) > 0 and isinstance(next(iter(graph.nodes)), str):
+        nodes = list(graph.nodes)
+        graph = nx.relabel_nodes(graph, dict(zip(nodes, encode_geoid(nodes).tolist())))
+    return graph
+
 
 @dataclasses.dataclass
 class Base():
@@ -156,6 +487,16 @@ class Variable(Base):
     name  : str = 'variable'
     level : str = 'tabblock'
 
+######## Stages are lazy - constructing one only sets paths; materialize() builds it (upstream first) on demand ########
+######## A stage rebuilds exactly when its fingerprint changes: upstream fingerprints, the parameters of g it reads, ########
+######## the source of the module that builds it & of any other module it builds with, and its version - this package's ########
+######## __init__ is shared by every stage, so it is not hashed: bump version when a change there alters a stage's output ########
+    deps    = ()        # upstream stages
+    params  = ()        # attributes of g that change this stage's output
+    outputs = ('df',)   # attributes whose first access materializes the stage
+    modules = ()        # other modules of this package whose source changes this stage's output
+    version = 0         # bump to rebuild after a change outside modules (shared helpers, Census_columns, ...)
+
     def __post_init__(self):
         a = f'{self.name}/{self.g.state.abbr}'
         self.path = data_path / a
@@ -168,10 +509,69 @@ class Variable(Base):
         self.raw     = f'{bq_dataset}.{b}_raw'
         self.tbl     = f'{bq_dataset}.{c}'
         self.gpickle = self.path / f'{d}.gpickle'
-        self.get()
-        print(f'success')
-
-
+        self.built   = False
+
+
+    def __getattr__(self, key):
+        if key in type(self).outputs and self.__dict__.get('built') is False:
+            self.materialize()
+            return self.__getattribute__(key)
+        raise AttributeError(f"{type(self).__name__} has no attribute '{key}'")
+
+
+    @property
+    def fp_file(self):
+        return self.path / f"{self.tbl.split('.')[-1]}.fingerprint"
+
+
+    def fingerprint(self):
+        if 'fp' not in self.__dict__:
+            names = [type(self).__module__] + [f'{__name__}.{m}' for m in self.modules]
+            code = b''.join(pathlib.Path(sys.modules[m].__file__).read_bytes() for m in names)
+            x = {'tbl'   : self.tbl,
+                 'yr'    : self.yr,
+                 'level' : self.level,
+                 'params': {p: listify(self.g[p]) if isinstance(self.g[p], (tuple, list, set)) else self.g[p] for p in self.params},
+                 'deps'  : {d: self.g[d].fingerprint() for d in self.deps},
+                 'code'  : hashlib.sha256(code).hexdigest(),
+                 'version': self.version}
+            self.fp = hashlib.sha256(json.dumps(x, sort_keys=True, default=str).encode()).hexdigest()
+        return self.fp
+
+
+    def load(self):
+######## stages whose output lives in BigQuery need nothing local, but the table must still be there ########
+######## - Graph & Compaction override this to read their gpickle ########
+        return check_table(self.tbl)
+
+
+    def materialize(self):
+        if self.built is not False:
+            return self
+        self.built = None  # building - output lookups inside get() must not recurse
+        fp = self.fingerprint()
+        stored = self.fp_file.read_text() if self.fp_file.exists() else None
+        forced = self.name in self.g.refresh_tbl or self.name in self.g.refresh_all
+        if stored == fp and not forced and self.load():
+            rpt(f"{self.tbl.split('.')[-1]}".ljust(33, ' ') + 'current')
+        else:
+            for d in self.deps:
+                self.g[d].materialize()
+            with span(f'stage {self.name}', tbl=self.tbl):
+                if stored is not None and stored != fp:
+                    rpt(f"{self.tbl.split('.')[-1]}".ljust(33, ' ') + 'inputs changed - rebuilding')
+                    delete_table(self.tbl)
+                    delete_table(self.raw)
+                    self.gpickle.unlink(missing_ok=True)
+                self.get()
+            self.fp_file.parent.mkdir(parents=True, exist_ok=True)
+            self.fp_file.write_text(fp)
+            print(f'success')
+        self.built = True
+        return self
+
+
+    @traced
     def get_zip(self):
         try:
             self.zipfile = zf.ZipFile(self.zip)
@@ -182,6 +582,7 @@ class Variable(Base):
                 os.chdir(self.path)
                 rpt(f'getting zip from {self.url}')
                 self.zipfile = zf.ZipFile(urllib.request.urlretrieve(self.url, self.zip)[0])
+                count(bytes_downloaded=self.zip.stat().st_size)
                 rpt(f'finished{concat_str}processing')
             except urllib.error.HTTPError:
                 raise Exception(f'n\nFAILED - BAD URL {self.url}\n\n')
@@ -214,24 +615,29 @@ class Variable(Base):
 ############################################################################################################
     
 pd.set_option('display.max_columns', None)
-cred, proj = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
-bqclient   = bigquery.Client(credentials=cred, project=proj)
+bqclient   = None  # see get_client & set_client
+bqstorage  = None
+states     = None  # see get_state
+local_states = {'ZZ': pd.Series({'fips': '99', 'abbr': 'ZZ'}, name='Synthetic')}  # see register_state & fixtures.py
+Jobs       = list()
+reset_pool()
+os.register_at_fork(after_in_child=reset_pool)
 root_path  = pathlib.Path(root_path)
 data_path  = root_path / 'redistricting_data'
+results_root = pathlib.Path(os.getenv('REDISTRICTING_RESULTS', root_path / 'results'))  # one shared mount for every worker of a fleet
+cache_path = data_path / 'cache'
+cache_size = 20 * 2**30  # bytes
+meta_ttl   = 600  # seconds
 bq_dataset = proj_id   +'.redistricting_data'
 
 Levels = ['tabblock', 'bg', 'tract', 'cnty', 'state', 'cntyvtd']
+Stages = ['crosswalks', 'assignments', 'shapes', 'census', 'elections', 'nodes', 'graph']
+Level_prefixes = {'state': 2, 'cnty': 5, 'tract': 11, 'bg': 12, 'tabblock': 15}  # geoid prefix length of each nested level
 District_types = ['cd', 'sldu', 'sldl']
 Years = [2010, 2020]
 concat_str = ' ... '
 meters_per_mile = 1609.344
 
-try:
-    states
-except:
-    print('getting states')
-    states = get_states()
-    
 
 Census_columns = {'joins':  ['fileid', 'stusab', 'chariter', 'cifsn', 'logrecno']}
 
@@ -1,4 +1,6 @@
 from . import *
+from .results import Results
+from .maps import Geometry, load_colors, write_map
 
 try:
     import pandas_bokeh
@@ -15,44 +17,46 @@ class Analysis(Base):
         self.run = self.tbl.split(".")[-1]
         
         self.abbr, self.yr, self.level, self.district_type, _, self.seed = self.run.split('_')
-        self.results_path = root_path / f'results/{self.run}'
+        self.results_path = results_root / self.run
         self.results_path.mkdir(parents=True, exist_ok=True)
         
-    def plot(self, show=True):
+    def plot(self, show=True, tol=0.001, max_plans=100):
         try:
-            df = read_table(tbl=self.tbl+'_plans')
-            df = df.pivot(index='geoid', columns='plan').astype(int)
-            df.columns = df.columns.droplevel().rename(None)
-            d = len(str(df.columns.max()))
-            plans = ['plan_'+str(c).rjust(d, '0') for c in df.columns]
-            df.columns = plans
+######## Geometry is prepared once per nodes table and shared by all seeds ########
+            self.geometry = Geometry(nodes=self.nodes).get()
+            self.gdf = self.geometry.load(tol)
+            geoids = pd.Index(encode_geoid(self.gdf['geoid']))
 
-            shapes = run_query(f'select geoid, county, total_pop, density, aland, perim, polsby_popper, polygon from {self.nodes}')
-            df = df.merge(shapes, on='geoid')
-            geo = gpd.GeoSeries.from_wkt(df['polygon'], crs='EPSG:4326').simplify(0.001).buffer(0) #<-- little white space @ .001 ~5.7 mb, minimal at .0001 ~10mb, with no white space ~37mb
-#             geo = gpd.GeoSeries.from_wkt(df['polygon'], crs='EPSG:4326').buffer(0) # <-------------------- to not simplify at all
-            self.gdf = gpd.GeoDataFrame(df.drop(columns='polygon'), geometry=geo)
+######## Plans are stored as a compact plans x nodes array of color indices ########
+            colors_npy = self.results_path / f'{self.run}_colors.npy'
+            self.colors = load_colors(self.results_path / f'{self.run}_plans.parquet', geoids, self.district_type, colors_npy, self.geometry)
 
+######## Only a subsample of plans goes into the html - the full array stays on disk ########
+            idx = np.unique(np.linspace(0, self.colors.shape[0]-1, min(max_plans, self.colors.shape[0])).astype(int))
+            d = len(str(idx.max()))
+            plans = ['plan_'+str(c).rjust(d, '0') for c in idx]
+
+######## the html inlines only these color indices & references the shared geometry script for the polygons ########
+            fn = write_map(self.results_path / f'{self.run}_map.html', self.geometry.get_map_js(tol), plans, self.colors[idx], self.run)
+            fig = fn
             if show:
+                self.gdf = pd.concat([self.gdf, pd.DataFrame(self.colors[idx].T.astype(int), columns=plans)], axis=1)
                 pandas_bokeh.output_notebook() #<------------- uncommment to view in notebook
-            fig = self.gdf.plot_bokeh(
-                figsize = (900, 600),
-                slider = plans,
-                slider_name = "PLAN #",
-                show_colorbar = False,
-                colorbar_tick_format="0",
-                colormap = "Category20",
-                hovertool_string = '@geoid, @county<br>pop=@total_pop<br>density=@density{0.0}<br>land=@aland{0.0}<br>pp=@polsby_popper{0.0}',
-                tile_provider = "CARTODBPOSITRON",
-                return_html = True,
-                show_figure = show,
-#                 number_format="1.0 $",
-                **{'fill_alpha' :.8,
-                  'line_alpha':.05,}
-            )
-            fn = self.results_path / f'{self.run}_map.html'
-            with open(fn, 'w') as file:
-                file.write(fig)
+                fig = self.gdf.plot_bokeh(
+                    figsize = (900, 600),
+                    slider = plans,
+                    slider_name = "PLAN #",
+                    show_colorbar = False,
+                    colorbar_tick_format="0",
+                    colormap = "Category20",
+                    hovertool_string = '@geoid, @county<br>pop=@total_pop<br>density=@density{0.0}<br>land=@aland{0.0}<br>pp=@polsby_popper{0.0}',
+                    tile_provider = "CARTODBPOSITRON",
+                    return_html = True,
+                    show_figure = True,
+#                     number_format="1.0 $",
+                    **{'fill_alpha' :.8,
+                      'line_alpha':.05,}
+                )
 #             rpt(f'map creation for {self.seed} - success')
         except Exception as e:
             rpt(f'map creation for {self.seed} - FAIL {e}')
@@ -60,7 +64,8 @@ class Analysis(Base):
         return fig
 
 
-    def get_results(self):
+    def get_results(self, local=False):
+######## local=True tallies from the local plan store into parquet parts instead of the BigQuery join & csv ########
         try:
 #             rpt(f'graph copy for {self.seed}')
             graph_source = root_path / f'redistricting_data/graph/{self.abbr}/graph_{self.run}.gpickle'
@@ -80,9 +85,17 @@ class Analysis(Base):
             rpt(f'summary copy for {self.seed} - FAIL {e}')
         
 
+        if local:
+            try:
+                rpt(f'results calculation for {self.seed}')
+                self.results = Results(nodes=self.nodes, tbl=self.tbl).get()
+            except Exception as e:
+                rpt(f'results calulation for {self.seed} - FAIL {e}')
+            return
+
         try:
             rpt(f'results calculation for {self.seed}')
-            cols = [c for c in get_cols(self.nodes) if c not in Levels + District_types + ['county', 'aland', 'perim', 'polsby_popper', 'density', 'polygon', 'point']]
+            cols = [c for c in node_cols(self.nodes, groups=('census', 'elections')) if c not in Levels + District_types + ['county', 'aland', 'perim', 'polsby_popper', 'density', 'polygon', 'point']]
             query = f"""
 select
     D.*,
@@ -94,8 +107,9 @@ from (
         {join_str(2).join([f'sum(B.{c}) as {c}' for c in cols])}
     from
         {self.tbl+'_plans'} as A
-    left join
-        {self.nodes} as B
+    left join (
+        {subquery(node_query(self.nodes, cols, groups=('census', 'elections')), 2)}
+        ) as B
     on
         A.geoid = B.geoid
     group by 
@@ -2,6 +2,7 @@ from . import *
 @dataclasses.dataclass
 class Assignments(Variable):
     name: str = 'assignments'
+    outputs = ('df', 'hierarchy')
     
     def __post_init__(self):
         self.yr = self.g.shapes_yr
@@ -22,25 +23,49 @@ class Assignments(Variable):
         return self
 
 
+    @traced
+    def read_baf(self, fn):
+######## stream a BAF straight out of the zip - nothing is extracted to disk ########
+        with self.zipfile.open(fn) as f:
+            return lower_cols(pd.read_csv(f, sep='|', dtype=str))
+
+
+    @traced
     def process(self):
         L = []
         for fn in self.zipfile.namelist():
             col = fn.lower().split('_')[-1][:-4]
             if fn[-3:] == 'txt' and col != 'aiannh':
-                df = extract_file(self.zipfile, fn, sep='|')
+                df = self.read_baf(fn)
                 if col == 'vtd':
                     df['countyfp'] = df['countyfp'].str.rjust(3, '0') + df['district'].str.rjust(6, '0')
                     col = 'cntyvtd'
                 df = df.iloc[:,:2]
                 df.columns = ['geoid', col]
                 L.append(df.set_index('geoid'))
-                os.unlink(fn)
-        self.df = lower(pd.concat(L, axis=1).reset_index()).sort_values('geoid')
-        c = self.df['geoid'].str
-        self.df.insert(1, 'state'   , c[:2])
-        self.df.insert(1, 'cnty'    , c[:5])
-        self.df.insert(1, 'tract'   , c[:11])
-        self.df.insert(1, 'bg'      , c[:12])
-        self.df.insert(1, 'tabblock', c[:15])
+        df = lower(pd.concat(L, axis=1).reset_index()).sort_values('geoid', ignore_index=True)
+
+######## district columns & geography levels are dictionary encoded (pandas categorical / parquet dictionary) ########
+######## this only shrinks the local frame & parquet - the upload writes the string values, so BigQuery joins (which ########
+######## take substrings of these ids) still run on strings ########
+######## every level is a prefix of geoid, so each unit also gets the index of its parent unit one level up ########
+######## tabblock is geoid itself (all values unique) - it stays a plain column, kept only for the table schema ########
+        for c in df.columns[1:]:
+            df[c] = df[c].astype('category')
+        self.hierarchy = dict()
+        parent = None
+        for level, k in Level_prefixes.items():
+            if k == 15:
+                units = pd.Index(df['geoid'])
+                df.insert(1, level, df['geoid'])
+            else:
+                codes, units = pd.factorize(df['geoid'].str[:k], sort=True)
+                df.insert(1, level, pd.Categorical.from_codes(codes, units))
+            if parent is not None:
+                self.hierarchy[level] = pd.DataFrame({'geoid': units, 'parent': pd.Index(parent).get_indexer(units.str[:Level_prefixes[prev]]).astype('int32')})
+            parent, prev = units, level
+        self.df = df
         self.df.to_parquet(self.pq)
-        load_table(tbl=self.tbl, df=self.df, preview_rows=0)
\ No newline at end of file
+        for level, h in self.hierarchy.items():
+            h.to_parquet(self.path / f'{self.pq.stem}_{level}_parent.parquet')
+        load_table(tbl=self.tbl, df=self.df, preview_rows=0)
@@ -0,0 +1,138 @@
+from . import *
+import multiprocessing, resource, pyarrow.parquet as pq
+from .graph import Graph
+
+######## Rough per-stage cost model: (cpus, base GB, GB per million tabblocks, minutes per million tabblocks) ########
+######## Most stages run in BigQuery, so local cost is dominated by downloads, parsing & the graph build ########
+Stage_costs = {
+    'crosswalks' : (1, 0.5, 3.0, 2.0),
+    'assignments': (1, 0.5, 2.0, 2.0),
+    'shapes'     : (1, 1.0, 6.0, 10.0),
+    'census'     : (1, 0.5, 1.0, 5.0),
+    'elections'  : (1, 0.5, 0.5, 3.0),
+    'nodes'      : (1, 0.5, 0.5, 5.0),
+    'graph'      : (1, 1.0, 4.0, 10.0),
+}
+Shared_stages = ['crosswalks', 'assignments', 'shapes', 'census', 'elections']  # do not depend on level or district_type
+default_blocks = 500000  # states missing from State_blocks
+
+######## Approximate 2020 tabulation block counts (rounded) - sizes a state's tasks before its assignments parquet exists, ########
+######## so the first, memory-heavy crosswalks & assignments passes already keep TX & CA apart ########
+State_blocks = {
+    'AL': 186000, 'AK':  32000, 'AZ': 154000, 'AR': 161000, 'CA': 520000, 'CO': 140000, 'CT':  52000, 'DE':  19000,
+    'DC':   6000, 'FL': 390000, 'GA': 233000, 'HI':  25000, 'ID': 101000, 'IL': 366000, 'IN': 218000, 'IA': 175000,
+    'KS': 183000, 'KY': 151000, 'LA': 136000, 'ME':  50000, 'MD':  84000, 'MA': 119000, 'MI': 270000, 'MN': 193000,
+    'MS': 151000, 'MO': 255000, 'MT':  93000, 'NE': 146000, 'NV':  62000, 'NH':  36000, 'NJ': 148000, 'NM': 112000,
+    'NY': 288000, 'NC': 237000, 'ND': 100000, 'OH': 276000, 'OK': 195000, 'OR': 132000, 'PA': 335000, 'RI':  17000,
+    'SC': 138000, 'SD':  88000, 'TN': 172000, 'TX': 669000, 'UT':  71000, 'VT':  25000, 'VA': 219000, 'WA': 157000,
+    'WV': 100000, 'WI': 221000, 'WY':  59000, 'PR':  53000,
+}
+
+
+def run_stage(job, stage):
+######## runs in a worker process - builds one state's stages up to & including stage ########
+    start, cpu = time.time(), time.process_time()
+    Graph(**job, upto=stage)
+    return {'elapsed': time.time() - start, 'cpu': time.process_time() - cpu,
+            'peak_rss_gb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20}
+
+
+@dataclasses.dataclass
+class Batch(Base):
+    jobs    : typing.Any          # list of dicts of Graph options - abbr, level, district_type, shapes_yr, census_yr, ...
+    cpus    : int = None
+    mem_gb  : float = None
+
+    def __post_init__(self):
+        if self.cpus is None:
+            self.cpus = multiprocessing.cpu_count()
+        if self.mem_gb is None:
+            self.mem_gb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 2**30 * 0.8
+        self.jobs = [dict(j) for j in self.jobs]
+        self.get_tasks()
+
+
+    def task_key(self, job, stage):
+######## jobs for the same state share the level-independent stages, so those tasks are deduplicated ########
+######## - except elections & everything built from it, which also depend on the job's election_filters ########
+        k = (job['abbr'], job.get('shapes_yr', 2020), job.get('census_yr', 2020), stage)
+        if stage not in Shared_stages:
+            k += (job.get('level', 'tract'), job.get('district_type', 'cd'))
+        if Stages.index(stage) >= Stages.index('elections'):
+            k += (tuple(job.get('election_filters', Graph.election_filters)),)
+        return k
+
+
+    def get_tasks(self):
+        self.tasks = dict()
+        for job in self.jobs:
+            prev = None
+            for stage in Stages:
+                k = self.task_key(job, stage)
+                if k not in self.tasks:
+                    self.tasks[k] = {'job': job, 'stage': stage, 'deps': set(), 'status': 'todo'}
+                if prev is not None:
+                    self.tasks[k]['deps'].add(prev)
+                prev = k
+
+
+    def blocks(self, abbr):
+######## tabblock count from the local assignments parquet once that stage has run, else the static table ########
+        for fn in (data_path / f'assignments/{abbr}').glob('*.parquet'):
+            if '_parent' not in fn.name:
+                try:
+                    return pq.ParquetFile(fn).metadata.num_rows
+                except:
+                    pass
+        return State_blocks.get(abbr, default_blocks)
+
+
+    def estimate(self, task):
+        cpus, base, per_gb, per_min = Stage_costs[task['stage']]
+        b = self.blocks(task['job']['abbr']) / 1e6
+        return {'cpus': cpus, 'mem_gb': base + per_gb * b, 'minutes': per_min * b}
+
+
+    def run(self):
+######## greedy list scheduler - start the biggest ready tasks that fit in the free cpu & memory budget ########
+        ctx = multiprocessing.get_context('spawn')
+        running = dict()
+        self.report = list()
+        free_cpus, free_mem = self.cpus, self.mem_gb
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.cpus, mp_context=ctx, max_tasks_per_child=1) as pool:
+            while any(t['status'] in ('todo', 'running') for t in self.tasks.values()):
+                ready = [k for k, t in self.tasks.items() if t['status'] == 'todo' and all(self.tasks[d]['status'] == 'done' for d in t['deps'])]
+                for k in sorted(ready, key=lambda k: self.estimate(self.tasks[k])['mem_gb'], reverse=True):
+                    est = self.estimate(self.tasks[k])
+                    if len(running) == 0 or (est['cpus'] <= free_cpus and est['mem_gb'] <= free_mem):
+                        t = self.tasks[k]
+                        t.update(status='running', start=time.time(), est=est)
+                        free_cpus -= est['cpus']
+                        free_mem -= est['mem_gb']
+                        running[pool.submit(run_stage, t['job'], t['stage'])] = k
+                        rpt(f"start {' '.join(str(x) for x in k)}")
+                if len(running) == 0:
+                    break  # everything left depends on a failed task
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for f in done:
+                    k = running.pop(f)
+                    t = self.tasks[k]
+                    free_cpus += t['est']['cpus']
+                    free_mem += t['est']['mem_gb']
+                    row = {'abbr': k[0], 'task': ' '.join(str(x) for x in k), 'stage': t['stage'], 'est_mem_gb': t['est']['mem_gb'], 'est_minutes': t['est']['minutes']}
+                    try:
+                        row.update(f.result(), status='done')
+                    except Exception as e:
+                        row.update(elapsed=time.time() - t['start'], status=f'FAIL {e}')
+                    t['status'] = 'done' if row['status'] == 'done' else 'failed'
+                    rpt(f"{row['status']} {row['task']}")
+                    self.report.append(row)
+        for k, t in self.tasks.items():
+            if t['status'] == 'todo':
+                self.report.append({'abbr': k[0], 'task': ' '.join(str(x) for x in k), 'stage': t['stage'], 'status': 'skipped - upstream failed'})
+        self.report = pd.DataFrame(self.report)
+        fn = data_path / f"batch/report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        fn.parent.mkdir(parents=True, exist_ok=True)
+        self.report.to_csv(fn, index=False)
+        print(f'\nreport written to {fn}')
+        return self
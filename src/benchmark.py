@@ -0,0 +1,118 @@
+from . import *
+import multiprocessing
+from .crosswalks import Crosswalks
+from .assignments import Assignments
+from .shapes import Shapes
+from .census import Census
+from .elections import Elections
+from .fixtures import write_fixtures
+
+######## Offline benchmark of each stage's local ingest (unzip, parse, transform, serialize for upload) on synthetic ########
+######## fixtures. The warehouse is replaced by LocalWarehouse through set_client: uploads are written to local ########
+######## parquet & queries are recorded but not run, so warehouse-only steps (Nodes, the process() queries) are not timed ########
+
+class LocalJob():
+    def __init__(self, job_type, output_rows=0):
+        self.job_id, self.job_type, self.output_rows = f'local_{time.perf_counter_ns()}', job_type, output_rows
+        self.total_bytes_processed = self.total_bytes_billed = self.slot_millis = 0
+        self.created = self.ended = datetime.datetime.now()
+
+    def result(self):
+        return self
+
+    def to_dataframe(self, **kwargs):
+        return pd.DataFrame()
+
+
+class LocalWarehouse():
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.queries = list()
+        self.lock = threading.Lock()
+
+    def fn(self, tbl):
+        return self.path / f"{tbl.split('.')[-1]}_{time.perf_counter_ns()}.parquet"
+
+    def load_table_from_dataframe(self, df, tbl, job_config=None):
+        df.to_parquet(self.fn(tbl))
+        return LocalJob('load', len(df))
+
+    def load_table_from_file(self, f, tbl, job_config=None):
+        data = f.read()
+        self.fn(tbl).with_suffix('.txt').write_bytes(data)
+        return LocalJob('load', data.count(b'\n'))
+
+    def query(self, query, job_config=None):
+        with self.lock:
+            self.queries.append(query)
+        return LocalJob('query')
+
+    def get_table(self, tbl):
+        raise google.api_core.exceptions.NotFound(f'{tbl} is not in the local warehouse')
+
+    def delete_table(self, tbl, not_found_ok=True):
+        pass
+
+    def list_tables(self, ds):
+        return []
+
+
+@dataclasses.dataclass
+class BenchGraph(Base):
+######## just enough of Graph for the stages to build their paths - stage objects are lazy so nothing is fetched ########
+    abbr          : str = 'ZZ'
+    fips          : str = '99'
+    shapes_yr     : int = 2020
+    census_yr     : int = 2020
+    district_type : str = 'cd'
+    level         : str = 'tabblock'
+    election_filters : typing.Tuple = (
+        "office='USSen' and race='general'",
+        "office='President' and race='general'",
+        "office like 'USRep%' and race='general'")
+
+    def __post_init__(self):
+        self.state = register_state(self.abbr, self.fips, 'Synthetic')  # spawned workers start with a fresh registry
+        self.g = self
+        self.refresh_tbl, self.refresh_all = set(), set()
+        for stage, cls in zip(Stages, [Crosswalks, Assignments, Shapes, Census, Elections]):
+            self[stage] = cls(g=self)
+
+
+def bench_stage(args):
+######## runs in a fresh process so peak RSS belongs to this stage alone ########
+    abbr, fips, stage, blocks = args
+    warehouse = LocalWarehouse(data_path / f'benchmark/warehouse/{abbr}_{blocks}')
+    set_client(warehouse)
+    s = BenchGraph(abbr=abbr, fips=fips)[stage]
+    os.chdir(s.path)
+    with span(f'bench {stage}') as sp:
+        s.get_zip()
+        s.process_raw() if hasattr(type(s), 'process_raw') else s.process()
+    rows = sum(r.get('rows_in', 0) for r in Spans if r['name'] == 'load_table')
+    return {'stage': stage, 'blocks': blocks, 'wall': sp['wall'], 'cpu': sp['process_cpu'], 'peak_rss_gb': sp['process_peak_rss_gb'], 'rows_uploaded': rows,
+            'input_mb': s.zip.stat().st_size / 2**20, 'queries_recorded': len(warehouse.queries)}
+
+
+def benchmark(sizes=(10000, 100000), stages=('crosswalks', 'assignments', 'shapes', 'census', 'elections'), abbr='ZZ', fips='99', seed=0):
+######## throughput (tabblocks/s & compressed MB/s) and peak memory per stage & state size ########
+######## stages run in order because elections matches vtds against the assignments parquet ########
+    ctx = multiprocessing.get_context('spawn')
+    report = list()
+    for blocks in sizes:
+        rpt(f'writing fixtures for {blocks} tabblocks')
+        write_fixtures(abbr=abbr, fips=fips, blocks=blocks, seed=seed)
+        for stage in stages:
+            with ctx.Pool(1) as pool:
+                r = pool.apply(bench_stage, ((abbr, fips, stage, blocks),))
+            r['blocks_per_s'] = r['blocks'] / r['wall']
+            r['mb_per_s'] = r['input_mb'] / r['wall']
+            rpt(f"{stage} {blocks} - {r['wall']:.1f}s {r['peak_rss_gb']:.2f}GB")
+            report.append(r)
+    report = pd.DataFrame(report)
+    fn = data_path / f"benchmark/report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(fn, index=False)
+    print(f'\n{report.to_string()}\nreport written to {fn}')
+    return report
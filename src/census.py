@@ -2,6 +2,8 @@ from . import *
 @dataclasses.dataclass
 class Census(Variable):
     name: str = 'census'
+    deps   = ('crosswalks', 'assignments')
+    params = ('shapes_yr',)
     
     def __post_init__(self):
         self.yr = self.g.census_yr
@@ -25,8 +27,15 @@ class Census(Variable):
         cmd = 'sed -i "1s/^/' + '|'.join(header) + '\\n/" ' + file
         os.system(cmd)
 
+    @traced
+    def load_raw(self, file, tbl, schema):
+        return load_table(tbl, file=file, job_config=bigquery.LoadJobConfig(field_delimiter='|', schema=schema, write_disposition='WRITE_TRUNCATE'))
+
+    @traced
     def process_raw(self):
 ######## In 2010 PL_94-171 involved 3 files - we first load each into a temp table ########
+######## the loads are independent so they run concurrently ########
+        jobs = list()
         for fn in self.zipfile.namelist():
             if fn[-3:] == '.pl':
                 rpt(fn)
@@ -38,10 +47,9 @@ class Census(Variable):
                     i = fn[6]
                 schema = [bigquery.SchemaField(**col) for col in Census_columns[i]]
                 tbl = self.raw+i
-                delete_table(tbl)    
-                with open(file, mode="rb") as f:
-                    bqclient.load_table_from_file(f, tbl, job_config=bigquery.LoadJobConfig(field_delimiter='|', schema=schema)).result()
+                jobs.append(submit(self.load_raw, file, tbl, schema))
 #                 os.unlink(fn)
+        wait(jobs)
 
 ######## combine census tables into one table ########
         rpt(f'joining')
@@ -80,12 +88,10 @@ order by
         load_table(self.raw, query=query, preview_rows=0)
         
 ######## clean up ########
-        delete_table(self.raw+'geo')
-        delete_table(self.raw+'1')
-        delete_table(self.raw+'2')
-        delete_table(self.raw+'3')
+        wait([submit(delete_table, self.raw+i) for i in ['geo', '1', '2', '3']])
 
 
+    @traced
     def process(self):
 ######## Use crosswalks to push 2010 data on 2010 tabblocks onto 2020 tabblocks ########
         if self.g.census_yr == self.g.shapes_yr:
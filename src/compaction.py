@@ -0,0 +1,117 @@
+from . import *
+
+######## Node attributes recomputed after a merge rather than summed ########
+Derived_attrs = ('perim', 'density', 'polsby_popper', 'plan')
+
+def merge_nodes(G, u, v):
+######## fold u into its neighbor v - attributes add, perimeter loses the shared boundary twice ########
+    a, b = G.nodes[u], G.nodes[v]
+    sp = G.edges[u, v].get('shared_perim') or 0
+    for k, x in a.items():
+        if k not in Derived_attrs and isinstance(x, (int, float, np.number)) and not isinstance(x, bool):
+            b[k] = b.get(k, 0) + x
+    b['perim'] = a.get('perim', 0) + b.get('perim', 0) - 2 * sp
+    b['density'] = b['total_pop'] / b['aland'] if b.get('aland', 0) > 0 else 0
+    b['polsby_popper'] = 4 * np.pi * b['aland'] / (b['perim']**2) * 100 if b['perim'] > 0 else 0
+    for w in list(G.neighbors(u)):
+        if w == v:
+            continue
+        e = G.edges[u, w]
+        if G.has_edge(v, w):
+            f = G.edges[v, w]
+            f['shared_perim'] = (f.get('shared_perim') or 0) + (e.get('shared_perim') or 0)
+            f['distance'] = min(f.get('distance', np.inf), e.get('distance', np.inf))
+        else:
+            G.add_edge(v, w, **e)
+    G.remove_node(u)
+
+
+def compact_graph(graph, district_type, pop_col='total_pop', zero_pop=False):
+######## Merge single-neighbor enclaves into their neighbor until none remain - an enclave shares a district with its only ########
+######## neighbor in every connected plan (unless it is a whole district by itself), so no reachable plan is lost ########
+######## zero_pop also merges zero-population units with several neighbors. That is NOT lossless: the unit is then always ########
+######## in the district of the neighbor it was folded into, so plans giving it to another neighbor become unreachable - ########
+######## population balance is unaffected, but shape & boundary statistics of the ensemble are biased ########
+######## Prefer a neighbor in the same district, then the one sharing the most boundary ########
+######## Returns the compact graph & {original node: node it was merged into} to expand plans back ########
+    G = graph.copy()
+    members = {n: [n] for n in G}
+    changed = True
+    while changed:
+        changed = False
+        for u in list(G.nodes):
+            if u not in G:
+                continue
+            nbrs = list(G.neighbors(u))
+            if len(nbrs) == 0 or (len(nbrs) > 1 and not (zero_pop and G.nodes[u][pop_col] == 0)):
+                continue
+            same = [v for v in nbrs if G.nodes[v][district_type] == G.nodes[u][district_type]]
+            v = max(same if len(same) > 0 else nbrs, key=lambda v: G.edges[u, v].get('shared_perim') or 0)
+            merge_nodes(G, u, v)
+            members[v] += members.pop(u)
+            changed = True
+    node_map = {o: v for v, M in members.items() for o in M}
+    rpt(f'compacted graph from {len(graph)} to {len(G)} nodes')
+    return G, node_map
+
+
+def expand_plans(plans, node_map):
+######## plans indexed by compact node -> plans indexed by every original geoid ########
+    m = pd.Series(list(node_map.keys()), index=list(node_map.values()), name='geoid')
+    return plans.join(m, how='inner').set_index('geoid').sort_values('plan', kind='stable')
+
+
+def node_map_file(gpickle):
+    gpickle = pathlib.Path(gpickle)
+    return gpickle.with_name(f'{gpickle.stem}_node_map.parquet')
+
+
+def read_node_map(gpickle):
+    fn = node_map_file(gpickle)
+    assert fn.exists(), f'{fn} not found - build it with Graph(compact=True) and pass its compaction.gpickle'
+    m = pd.read_parquet(fn)
+    return dict(zip(m['geoid'].tolist(), m['node'].tolist()))
+
+
+@dataclasses.dataclass
+class Compaction(Variable):
+######## Compact graph & node map persisted beside each other - built once from the graph, not in every MCMC ########
+    name : str = 'compaction'
+    params  = ('district_type', 'compact_zero_pop')
+    outputs = ('graph', 'node_map')
+
+    def __post_init__(self):
+        self.yr = self.g.census_yr
+        self.level = self.g.level
+        super().__post_init__()
+        self.node_map_pq = node_map_file(self.gpickle)
+
+
+    @property
+    def fp_file(self):
+        return self.gpickle.with_suffix('.fingerprint')
+
+
+    def fingerprint(self):
+######## the graph is g itself rather than a stage of g, so its fingerprint is folded in here ########
+        if 'fp' not in self.__dict__:
+            self.fp = hashlib.sha256((super().fingerprint() + self.g.fingerprint()).encode()).hexdigest()
+        return self.fp
+
+
+    def load(self):
+        try:
+            self.graph = nx.read_gpickle(self.gpickle)
+            self.node_map = read_node_map(self.gpickle)
+            return True
+        except:
+            return False
+
+
+    def get(self):
+        self.g.materialize()
+        self.graph, self.node_map = compact_graph(self.g.graph, self.g.district_type, zero_pop=self.g.compact_zero_pop)
+        self.gpickle.parent.mkdir(parents=True, exist_ok=True)
+        nx.write_gpickle(self.graph, self.gpickle)
+        pd.DataFrame({'geoid': list(self.node_map.keys()), 'node': list(self.node_map.values())}).to_parquet(self.node_map_pq, index=False)
+        return self
@@ -0,0 +1,66 @@
+from . import *
+from .compaction import Derived_attrs
+
+def level_mapping(assignments, level, district_type='cd', county_line=True):
+######## tabblock node -> coarse unit id, using the same ids Nodes.process gives each level - nodes drop the state fips, ########
+######## so a tabblock node is geoid[2:] and a county node is cnty[2:] ########
+######## county_line: a county lying entirely inside one district becomes a single unit - such a county is already one ########
+######## node in a county_line tabblock graph, so it maps to itself as well ########
+    df = assignments
+    if level in Level_prefixes:
+        unit = df['geoid'].str[2:Level_prefixes[level]]
+    else:
+        unit = df[level].astype(str)
+    m = pd.Series(unit.to_numpy(), index=df['geoid'].str[2:].to_numpy())
+    if county_line:
+        ct = df.groupby('cnty', observed=True)[district_type].transform('nunique')
+        cnty = df['cnty'].astype(str).str[2:]
+        m = m.where(ct.to_numpy() > 1, cnty.to_numpy())
+        whole = pd.unique(cnty[ct <= 1])
+        m = pd.concat([m, pd.Series(whole, index=whole)])
+    return m
+
+
+def contract_graph(graph, mapping, district_type='cd', pop_col='total_pop'):
+######## Coarse graph from a fine graph & {fine node: coarse node} - no geometry is touched ########
+######## node attributes add, shared_perim adds across contracted edges & perimeters lose their internal boundary ########
+######## a coarse unit takes the district holding most of its fine nodes (as in Nodes.process) ########
+######## distance becomes the closest pair of contracted fine centroids - approximate, as no geometry is available ########
+######## shared_perim & perim are approximate too: the fine graph drops edges with shared_perim <= 0.01 miles, so that ########
+######## boundary is never subtracted - a coarse perim is overestimated & a coarse shared_perim underestimated by it ########
+    nodes = pd.DataFrame.from_dict(dict(graph.nodes(data=True)), orient='index')
+    nodes['unit'] = pd.Series(mapping).reindex(nodes.index).to_numpy()
+    assert nodes['unit'].notna().all(), f"{nodes['unit'].isna().sum()} nodes are missing from mapping"
+    edges = nx.to_pandas_edgelist(graph, source='x', target='y')
+    for c in ['shared_perim', 'distance']:
+        if c not in edges:
+            edges[c] = np.nan
+    edges['shared_perim'] = edges['shared_perim'].fillna(0)
+    edges['x'] = nodes['unit'].reindex(edges['x']).to_numpy()
+    edges['y'] = nodes['unit'].reindex(edges['y']).to_numpy()
+    internal = edges['x'] == edges['y']
+
+    add = [c for c in nodes.columns if c not in Derived_attrs and c not in ('unit', district_type)
+           and pd.api.types.is_numeric_dtype(nodes[c]) and not pd.api.types.is_bool_dtype(nodes[c])]
+    keep = [c for c in nodes.columns if c not in add and c not in Derived_attrs and c not in ('unit', district_type)]
+    G = nodes.groupby('unit')[add].sum()
+    for c in keep:
+        G[c] = nodes.groupby('unit')[c].max()
+    if district_type in nodes:
+        N = nodes.groupby(['unit', district_type]).size().rename('N').reset_index()
+        G[district_type] = N.sort_values('N', kind='stable').drop_duplicates('unit', keep='last').set_index('unit')[district_type]
+    if 'perim' in nodes:
+        inner = edges[internal].groupby('x')['shared_perim'].sum()
+        G['perim'] = nodes.groupby('unit')['perim'].sum() - 2 * inner.reindex(G.index, fill_value=0)
+        G['polsby_popper'] = np.where(G['perim'] > 0, (4 * np.pi * G.get('aland', 0) / G['perim']**2 * 100).round(2), 0)
+    if 'aland' in G:
+        G['density'] = np.where(G['aland'] > 0, G.get(pop_col, 0) / G['aland'].where(G['aland'] > 0, 1), 0)
+
+    E = edges[~internal].copy()
+    E[['x', 'y']] = np.sort(E[['x', 'y']].to_numpy(), axis=1)
+    E = E.groupby(['x', 'y']).agg(shared_perim=('shared_perim', 'sum'), distance=('distance', 'min')).reset_index()
+    H = nx.from_pandas_edgelist(E, source='x', target='y', edge_attr=('distance', 'shared_perim'))
+    H.add_nodes_from(G.index)
+    nx.set_node_attributes(H, G.to_dict('index'))
+    rpt(f'contracted graph from {len(graph)} to {len(H)} nodes')
+    return H
@@ -0,0 +1,188 @@
+from . import *
+import socket, socketserver, threading, collections, multiprocessing
+from .diagnostics import rhat
+
+######## Seed work queue for many machines - newline-delimited json over a plain TCP socket ########
+######## worker -> {'op': 'lease' | 'heartbeat' | 'done' | 'fail' | 'diag', 'worker': ..., 'seed': ...} ########
+######## 'diag' also carries 'stats' = {metric: [n, mean, var]} and gets back cross-chain {'rhat': {metric: r}} ########
+######## coordinator -> {'seed': s} for a lease, {'seed': None, 'wait': bool} when nothing is free, else {'ok': bool} ########
+######## chains write under results_root - point REDISTRICTING_RESULTS at one shared mount on every machine ########
+
+@dataclasses.dataclass
+class Coordinator(Base):
+    seeds         : typing.Any
+    host          : str = '0.0.0.0'
+    port          : int = 5555
+    lease_timeout : float = 600.0  # seconds without a heartbeat before a seed is handed to someone else
+    max_failures  : int = 3
+    done_file     : str = None     # seeds finished in an earlier run are skipped
+
+    def __post_init__(self):
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.done = set()
+        if self.done_file is not None:
+            self.done_file = pathlib.Path(self.done_file)
+            if self.done_file.exists():
+                self.done = {int(x) for x in self.done_file.read_text().split()}
+        self.todo = collections.deque(int(s) for s in self.seeds if int(s) not in self.done)
+        self.leases = dict()  # seed -> (worker, expiry)
+        self.leased = collections.Counter()  # times each seed was handed out
+        self.failures = collections.Counter()
+        self.failed = set()
+        self.chain_stats = dict()  # seed -> latest diagnostics posted by its chain
+        self.check_finished()
+
+
+    def check_finished(self):
+        if len(self.todo) == 0 and len(self.leases) == 0:
+            self.finished.set()
+
+
+    def reclaim(self):
+######## leases of dead workers go back to the front of the queue ########
+        now = time.time()
+        for seed, (worker, expiry) in list(self.leases.items()):
+            if expiry < now:
+                rpt(f'lease on seed {seed} by {worker} expired')
+                del self.leases[seed]
+                self.todo.appendleft(seed)
+
+
+    def handle(self, msg):
+        op, worker, seed = msg.get('op'), msg.get('worker'), msg.get('seed')
+        with self.lock:
+            if op == 'lease':
+                self.reclaim()
+                if len(self.todo) > 0:
+                    seed = self.todo.popleft()
+                    self.leases[seed] = (worker, time.time() + self.lease_timeout)
+                    self.leased[seed] += 1
+                    return {'seed': seed}
+                return {'seed': None, 'wait': len(self.leases) > 0}
+            elif op == 'heartbeat':
+                if self.leases.get(seed, (None,))[0] == worker:
+                    self.leases[seed] = (worker, time.time() + self.lease_timeout)
+                    return {'ok': True}
+                return {'ok': False}
+            elif op == 'done':
+######## only the lease holder may finish a seed - or anyone, once its expired lease is back in the queue unclaimed ########
+                holder = self.leases.get(seed, (None,))[0]
+                if holder == worker:
+                    del self.leases[seed]
+                elif holder is None and seed in self.todo:
+                    self.todo.remove(seed)
+                else:
+                    return {'ok': False}
+                if seed not in self.done:
+                    self.done.add(seed)
+                    if self.done_file is not None:
+                        with open(self.done_file, 'a') as f:
+                            f.write(f'{seed}\n')
+                self.check_finished()
+                return {'ok': True}
+            elif op == 'fail':
+                if self.leases.get(seed, (None,))[0] == worker:
+                    del self.leases[seed]
+                    self.failures[seed] += 1
+                    if self.failures[seed] < self.max_failures:
+                        self.todo.append(seed)
+                    else:
+                        self.failed.add(seed)
+                self.check_finished()
+                return {'ok': True}
+            elif op == 'diag':
+                self.chain_stats[seed] = msg.get('stats', dict())
+                return {'rhat': rhat(list(self.chain_stats.values()))}
+            return {'ok': False, 'error': f'unknown op {op}'}
+
+
+    def serve(self):
+        coordinator = self
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    reply = coordinator.handle(json.loads(line))
+                    self.wfile.write(json.dumps(reply).encode() + b'\n')
+                    self.wfile.flush()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        with socketserver.ThreadingTCPServer((self.host, self.port), Handler) as server:
+            server.daemon_threads = True
+            self.port = server.server_address[1]
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            rpt(f'coordinator listening on {self.host}:{self.port} with {len(self.todo)} seeds')
+            self.finished.wait()
+            server.shutdown()
+        print(f'all seeds finished - {len(self.done)} done, {len(self.failed)} failed {sorted(self.failed)}')
+        return self
+
+
+@dataclasses.dataclass
+class Client(Base):
+    host   : str = 'localhost'
+    port   : int = 5555
+    worker : str = None
+
+    def __post_init__(self):
+        if self.worker is None:
+            self.worker = f'{socket.gethostname()}_{os.getpid()}'
+        self.lock = threading.Lock()
+        self.sock = socket.create_connection((self.host, self.port))
+        self.file = self.sock.makefile('rwb')
+
+    def request(self, op, seed=None, **kwargs):
+        with self.lock:
+            self.file.write(json.dumps({'op': op, 'worker': self.worker, 'seed': seed, **kwargs}).encode() + b'\n')
+            self.file.flush()
+            return json.loads(self.file.readline())
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def run_worker(fn, host='localhost', port=5555, heartbeat=30.0, poll=5.0):
+######## lease a seed, run fn(seed) while a thread keeps the lease alive, report, repeat ########
+    client = Client(host=host, port=port)
+    try:
+        while True:
+            r = client.request('lease')
+            seed = r['seed']
+            if seed is None:
+                if r['wait']:
+                    time.sleep(poll)
+                    continue
+                break
+            stop = threading.Event()
+            def beat():
+                while not stop.wait(heartbeat):
+                    client.request('heartbeat', seed)
+            thread = threading.Thread(target=beat, daemon=True)
+            thread.start()
+            try:
+                fn(seed)
+                ok = True
+            except Exception as e:
+                rpt(f'seed {seed} - FAIL {e}')
+                ok = False
+            finally:
+                stop.set()
+                thread.join()
+            client.request('done' if ok else 'fail', seed)
+    except (ConnectionError, json.JSONDecodeError):
+        rpt(f'lost coordinator at {host}:{port}')
+    finally:
+        client.close()
+
+
+def run_workers(fn, host='localhost', port=5555, processes=None, **kwargs):
+######## one worker per core on this machine ########
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    P = [multiprocessing.Process(target=run_worker, args=(fn, host, port), kwargs=kwargs) for i in range(processes)]
+    for p in P:
+        p.start()
+    for p in P:
+        p.join()
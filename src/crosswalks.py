@@ -27,6 +27,7 @@ class Crosswalks(Variable):
 #         return self
 
 
+    @traced
     def process(self):
         yrs = [2010, 2020]
         ids = [f'geoid_{yr}' for yr in yrs]
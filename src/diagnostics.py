@@ -0,0 +1,99 @@
+from . import *
+import collections
+
+@dataclasses.dataclass
+class Diagnostics(Base):
+######## Incremental autocorrelation & effective sample size of scalar chain summaries ########
+######## Lagged cross sums are updated each step so acf & ess are exact up to max_lag at any time ########
+    metrics : typing.Tuple
+    max_lag : int = 200
+
+    def __post_init__(self):
+        M = len(self.metrics)
+        self.n = 0
+        self.total = np.zeros(M)
+        self.lag_sums = np.zeros((self.max_lag+1, M))  # row k = sum_t x_t * x_{t-k}
+        self.first = list()                            # first max_lag values
+        self.last = collections.deque(maxlen=self.max_lag)  # last max_lag values
+
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        L = len(self.last)
+        self.lag_sums[0] += x * x
+        if L > 0:
+            self.lag_sums[1:L+1] += x * np.array(self.last)[::-1]
+        self.last.append(x)
+        if len(self.first) < self.max_lag:
+            self.first.append(x)
+        self.total += x
+        self.n += 1
+        return self
+
+
+    @property
+    def mean(self):
+        return self.total / max(self.n, 1)
+
+
+    @property
+    def var(self):
+        return (self.lag_sums[0] - self.n * self.mean**2) / max(self.n - 1, 1)
+
+
+    def acf(self):
+        mu = self.mean
+        K = min(self.max_lag, self.n - 1)
+        first = np.array(self.first).reshape(-1, len(self.metrics))
+        last = np.array(self.last).reshape(-1, len(self.metrics))
+        cov = np.zeros((K+1, len(self.metrics)))
+        for k in range(K+1):
+            m = self.n - k
+            head = self.total - first[:k].sum(axis=0)  # sum of x_t for t >= k
+            tail = self.total - last[len(last)-k:].sum(axis=0) if k > 0 else self.total  # sum of x_{t-k} for t >= k
+            cov[k] = (self.lag_sums[k] - mu * (head + tail) + m * mu**2) / self.n
+        return np.divide(cov, cov[0], out=np.zeros_like(cov), where=cov[0] > 0)
+
+
+    def ess(self):
+######## Geyer's initial positive sequence - sum autocorrelation pairs while they stay positive ########
+######## a sequence still positive at the last available lag has not ended, so its ess is undetermined (NaN) - ########
+######## the chain is too short or max_lag too small for it, and converged() treats it as not yet converged ########
+        if self.n < 4:
+            return pd.Series(0.0, index=self.metrics)
+        rho = self.acf()
+        ess = np.zeros(len(self.metrics))
+        for j in range(len(self.metrics)):
+            if rho[0, j] <= 0:  # constant so far
+                ess[j] = self.n
+                continue
+            tau = -1.0
+            for k in range(0, len(rho) - 1, 2):
+                g = rho[k, j] + rho[k+1, j]
+                if g <= 0:
+                    ess[j] = self.n / max(tau, 1e-9)
+                    break
+                tau += 2 * g
+            else:
+                ess[j] = np.nan
+        return pd.Series(np.minimum(ess, self.n), index=self.metrics)
+
+
+    def chain_stats(self):
+        return {m: [self.n, mu, v] for m, mu, v in zip(self.metrics, self.mean.tolist(), self.var.tolist())}
+
+
+def rhat(chain_stats):
+######## Gelman-Rubin potential scale reduction from per-chain [n, mean, var] - chains may differ in length ########
+    out = dict()
+    metrics = set(m for s in chain_stats for m in s)
+    for m in metrics:
+        a = np.array([s[m] for s in chain_stats if m in s and s[m][0] > 1], dtype=float)
+        if len(a) < 2:
+            continue
+        n = a[:, 0].mean()
+        B = n * a[:, 1].var(ddof=1)
+        W = a[:, 2].mean()
+        if W > 0:
+            out[m] = float(np.sqrt(((n - 1) / n * W + B / n) / W))
+    return out
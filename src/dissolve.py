@@ -0,0 +1,103 @@
+from . import *
+import scipy.sparse as sp, shapely.geometry, shapely.ops, shapely.wkb
+from .results import Results
+from .maps import Geometry
+
+def arcs_to_region(lines):
+######## faces cut out by a district's boundary arcs alternate in & out of it - keep the ones at even nesting depth ########
+    faces = list(shapely.ops.polygonize(lines))
+    shells = [shapely.geometry.Polygon(f.exterior) for f in faces]
+    keep = [f for f in faces if sum(s.contains(f.representative_point()) for s in shells) % 2 == 1]  # a face's own shell counts once
+    return shapely.geometry.MultiPolygon(keep)
+
+
+@dataclasses.dataclass
+class Dissolve(Base):
+######## District geometry for every stored plan, one row per (plan, district), from the shared-arc topology of the nodes ########
+######## An arc is on a district's boundary iff exactly one of its nodes uses it, so no polygon union is ever computed ########
+######## and only districts whose nodes changed since the previous plan are rebuilt - the rest reuse their last outline ########
+    nodes      : str
+    tbl        : str
+    tol        : float = 0.0001  # simplification of the Geometry cache to build from - 0 keeps the exact arcs
+    chunk_size : int = 2000000
+
+    def __post_init__(self):
+        self.results = Results(nodes=self.nodes, tbl=self.tbl, chunk_size=self.chunk_size)
+        self.run = self.results.run
+        self.district_type = self.results.district_type
+        self.out_path = self.results.results_path / f'{self.run}_district_geometry'
+
+
+    def get_topology(self):
+        arcs, node_arcs = Geometry(nodes=self.nodes, tols=(self.tol,)).get().load_arcs(self.tol)
+        self.arcs = arcs.geometry.to_numpy()
+        self.geoids = pd.Index(pd.unique(encode_geoid(node_arcs['geoid'])))
+        node = self.geoids.get_indexer(encode_geoid(node_arcs['geoid']))
+        self.incidence = sp.csr_matrix((np.ones(len(node), dtype='int8'), (node, node_arcs['arc'].to_numpy())), shape=(len(self.geoids), len(self.arcs)))
+        return self
+
+
+    def region(self, members):
+        idx = self.incidence[members].indices
+        a, c = np.unique(idx, return_counts=True)
+        return arcs_to_region(self.arcs[a[c == 1]])
+
+
+    def labels(self, P):
+######## a plan's district label for every node, in topology order ########
+        node = self.geoids.get_indexer(P['geoid'])
+        assert (node >= 0).all(), 'plan store has geoids missing from the geometry cache'
+        labels = np.empty(len(self.geoids), dtype=object)
+        labels[node] = P[self.district_type].to_numpy()
+        return labels
+
+
+    @traced
+    def get(self):
+        self.get_topology()
+        shutil.rmtree(self.out_path, ignore_errors=True)
+        self.out_path.mkdir(parents=True, exist_ok=True)
+        prev, wkb = None, dict()
+        built = total = 0
+        for i, df in enumerate(self.results.stream_plans()):
+            rpt(f'chunk {i}')
+            rows = list()
+            for plan, P in df.groupby('plan', sort=True):
+                labels = self.labels(P)
+                if prev is None:
+                    changed = set(labels)
+                else:
+                    moved = labels != prev
+                    changed = set(labels[moved]).union(prev[moved])
+                for D in changed:
+                    members = np.flatnonzero(labels == D)
+                    if len(members) > 0:
+                        wkb[D] = shapely.wkb.dumps(self.region(members))
+                    else:
+                        wkb.pop(D, None)
+                rows.extend({'plan': plan, self.district_type: D, 'changed': D in changed, 'geometry': g} for D, g in sorted(wkb.items()))
+                built += len(changed)
+                total += len(wkb)
+                prev = labels
+            self.write(rows, i)
+        count(districts_built=built, districts_reused=total - built)
+        rpt(f'{total} district geometries - {built} built, {total - built} reused')
+        return self
+
+
+    def write(self, rows, part):
+        df = pd.DataFrame(rows)
+        gdf = gpd.GeoDataFrame(df.drop(columns='geometry'), geometry=gpd.GeoSeries.from_wkb(df['geometry']), crs='EPSG:4326')
+        gdf.to_parquet(self.out_path / f'part_{str(part).rjust(5, "0")}.parquet', index=False)
+
+
+    def load(self, plans=None):
+        filters = None if plans is None else [('plan', 'in', listify(plans))]
+        return gpd.read_parquet(self.out_path, filters=filters)
+
+
+    def to_geojson(self, plans, fn=None):
+######## a few plans as GeoJSON for reviewers - the full store stays GeoParquet ########
+        fn = fn or self.results.results_path / f'{self.run}_district_geometry.geojson'
+        self.load(plans).to_file(fn, driver='GeoJSON')
+        return fn
@@ -1,7 +1,10 @@
 from . import *
+import pyarrow as pa, pyarrow.csv as csv, pyarrow.compute as pc
 @dataclasses.dataclass
 class Elections(Variable):
     name: str = 'elections'
+    deps   = ('assignments', 'census')
+    params = ('election_filters',)
 
     def __post_init__(self):
         self.yr = self.g.shapes_yr
@@ -27,38 +30,57 @@ class Elections(Variable):
         return self
 
         
+    @traced
+    def read_returns(self, fn):
+######## parse one returns file straight from the zip into arrow - every column a string except votes ########
+        with self.lock:
+            data = self.zipfile.read(fn)
+        header = [c.strip().strip('"') for c in data.split(b'\n', 1)[0].decode().split(',')]
+        types = {c: pa.int64() if c.lower() == 'votes' else pa.string() for c in header}
+        tbl = csv.read_csv(pa.BufferReader(data), convert_options=csv.ConvertOptions(column_types=types))
+        tbl = tbl.rename_columns([c.lower() for c in tbl.column_names])
+        tbl = tbl.filter(pc.and_(pc.greater(tbl['votes'], 0), pc.is_in(tbl['party'], value_set=pa.array(['R', 'D', 'L', 'G']))))
+        w = fn.lower().split('_')
+        tbl = tbl.append_column('election_yr', pa.array([int(w[0])] * tbl.num_rows, pa.int64()))
+        tbl = tbl.append_column('race', pa.array(["_".join(w[1:-2])] * tbl.num_rows, pa.string()))
+        return tbl
+
+
+    def get_cntyvtds(self):
+######## distinct cntyvtd codes - from the local assignments parquet when present, else a (cached) distinct query ########
+        c = 'cntyvtd'
+        try:
+            return pd.Index(pd.read_parquet(self.g.assignments.pq, columns=[c])[c].unique())
+        except FileNotFoundError:
+            return pd.Index(run_query(f'select distinct {c} from {self.g.assignments.tbl}')[c])
+
+
+    @traced
     def process_raw(self):
         ext = '_Returns.csv'
         k = len(ext)
-        L = []
-        for fn in self.zipfile.namelist():
-            if fn[-k:]==ext:
-                rpt(fn)
-                df = extract_file(self.zipfile, fn, sep=',')
-                df = (df.astype({'votes':int, 'fips':str, 'vtd':str})
-                      .query('votes > 0')
-                      .query("party in ['R', 'D', 'L', 'G']")
-                     )
-                w = fn.lower().split('_')
-                df['election_yr'] = int(w[0])
-                df['race'] = "_".join(w[1:-2])
-                L.append(df)
-                os.unlink(fn)
-        
+        self.lock = threading.Lock()
+        fns = [fn for fn in self.zipfile.namelist() if fn[-k:]==ext]
+        rpt(f'parsing {len(fns)} returns files')
+        with concurrent.futures.ThreadPoolExecutor() as pool:
+            L = list(pool.map(self.read_returns, fns))
+
 ######## vertically stack then clean so that joins work correctly later ########
-        df = pd.concat(L, axis=0, ignore_index=True).reset_index(drop=True)
-        f = lambda col: col.str.replace(".", "", regex=False).str.replace(" ", "", regex=False).str.replace(",", "", regex=False).str.replace("-", "", regex=False).str.replace("'", "", regex=False)
-        df['name'] = f(df['name'])
-        df['office'] = f(df['office'])
-        df['race'] = f(df['race'])
-        df['fips'] = df['fips'].str.lower()
-        df['vtd']  = df['vtd'] .str.lower()
+######## one regex pass per column strips the characters that break joins ########
+        tbl = pa.concat_tables(L, promote_options='default')
+        strip = lambda col: pc.replace_substring_regex(tbl[col], pattern="[. ,'-]", replacement="")
+        tbl = tbl.set_column(tbl.column_names.index('name')  , 'name'  , strip('name'))
+        tbl = tbl.set_column(tbl.column_names.index('office'), 'office', strip('office'))
+        tbl = tbl.set_column(tbl.column_names.index('race')  , 'race'  , strip('race'))
+        tbl = tbl.set_column(tbl.column_names.index('fips')  , 'fips'  , pc.utf8_lower(tbl['fips']))
+        tbl = tbl.set_column(tbl.column_names.index('vtd')   , 'vtd'   , pc.utf8_lower(tbl['vtd']))
+        df = tbl.to_pandas()
 
 ######## correct differences between cntyvtd codes in assignements (US Census) and elections (TX Legislative Council) ########
         c = f'cntyvtd'
         df[c]     = df['fips'].str.rjust(3, '0') + df['vtd']         .str.rjust(6, '0')
         df['alt'] = df['fips'].str.rjust(3, '0') + df['vtd'].str[:-1].str.rjust(6, '0')
-        assign = read_table(self.g.assignments.tbl)[c].drop_duplicates()
+        assign = self.get_cntyvtds()
         
         # find cntyvtd in elections not among assignments
         unmatched = ~df[c].isin(assign)
@@ -75,6 +97,7 @@ class Elections(Variable):
         load_table(self.raw, df=self.df, preview_rows=0)
         
 
+    @traced
     def process(self):
 ######## Apportion votes from cntyvtd to its tabblock proportional to population ########
 ######## We computed cntyvtd_pop_prop = pop_tabblock / pop_cntyvtd  during census processing ########
@@ -109,6 +132,7 @@ order by
         elections = tuple(sorted(df['election']))
         stride = 100
         tbl_chunks = list()
+        jobs = list()
         alias_chr = 64 # silly hack to give table aliases A, B, C, ...
         for r in np.arange(0, len(elections), stride):
             E = elections[r:r+stride]
@@ -130,7 +154,7 @@ pivot(
     sum(votes)
     for election in {E})
 """
-            load_table(t, query=query, preview_rows=0)
+            jobs.append(submit(load_table, t, query=query, preview_rows=0))
         
 ######## create the join query as we do each chunk so we can run it at the end ########
             alias_chr += 1
@@ -152,9 +176,8 @@ on
     A.geoid = {alias}.geoid
 """
         query_join += f"order by geoid"
+        wait(jobs)  # chunk pivots are independent so they run concurrently
 
 ######## clean up ########
         load_table(self.tbl, query=query_join, preview_rows=0)
-        delete_table(tbl_temp)
-        for t in tbl_chunks:
-            delete_table(t)
\ No newline at end of file
+        wait([submit(delete_table, t) for t in [tbl_temp] + tbl_chunks])
\ No newline at end of file
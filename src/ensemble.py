@@ -0,0 +1,171 @@
+from . import *
+import pickle, copy
+
+######## Default histogram ranges - metrics not listed here get moments & quantiles only ########
+######## counts give their own bin count too - unit bins centred on the integers, so no two counts share a bin ########
+Hist_ranges = {
+    'pop_deviation' : (-25.0, 25.0),
+    'pop_imbalance' : (0.0, 50.0),
+    'polsby_popper' : (0.0, 100.0),
+    'vote_share'    : (0.0, 1.0),
+    'seats'         : (-0.5, 200.5, 201),
+    'efficiency_gap': (-1.0, 1.0),
+    'mean_median'   : (-1.0, 1.0),
+}
+
+@dataclasses.dataclass
+class Stat(Base):
+######## Running summary of a vector-valued metric (one entry per district rank, or length 1 for scalars) ########
+######## Moments use Welford/Chan updates, quantiles use a KLL-style compactor shared across ranks ########
+    width : int
+    k     : int = 200
+    bins  : int = 100
+    rng   : typing.Any = None
+    hist_range : typing.Any = None
+
+    def __post_init__(self):
+        if self.rng is None:
+            self.rng = np.random.default_rng()
+        self.n = 0
+        self.mean = np.zeros(self.width)
+        self.m2 = np.zeros(self.width)
+        self.min = np.full(self.width, np.inf)
+        self.max = np.full(self.width, -np.inf)
+        self.levels = [np.empty((0, self.width))]
+        if self.hist_range is not None:
+            lo, hi, *bins = self.hist_range
+            if len(bins) > 0:
+                self.bins = bins[0]
+            self.edges = np.linspace(lo, hi, self.bins+1)
+            self.hist = np.zeros((self.bins, self.width), dtype=int)
+
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float).reshape(-1, self.width)
+        for row in x:
+            self.n += 1
+            delta = row - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (row - self.mean)
+        self.min = np.minimum(self.min, x.min(axis=0))
+        self.max = np.maximum(self.max, x.max(axis=0))
+        if self.hist_range is not None:
+            b = np.clip(np.searchsorted(self.edges, x, side='right') - 1, 0, self.bins-1)
+            np.add.at(self.hist, (b, np.broadcast_to(np.arange(self.width), b.shape)), 1)
+        self.levels[0] = np.concatenate([self.levels[0], x])
+        self.compact()
+        return self
+
+
+    def compact(self):
+######## Level h items each stand for 2^h observations - when a level fills, sort it & promote every other item ########
+        h = 0
+        while h < len(self.levels):
+            L = self.levels[h]
+            if len(L) >= self.k:
+                L = np.sort(L, axis=0)
+                m = len(L) - len(L) % 2
+                offset = self.rng.integers(2)
+                if h+1 == len(self.levels):
+                    self.levels.append(np.empty((0, self.width)))
+                self.levels[h+1] = np.concatenate([self.levels[h+1], L[offset:m:2]])
+                self.levels[h] = L[m:]
+            h += 1
+
+
+    def merge(self, other):
+        assert self.width == other.width, f'cannot merge stats of width {self.width} and {other.width}'
+        n = self.n + other.n
+        if n > 0:
+            delta = other.mean - self.mean
+            self.m2 = self.m2 + other.m2 + delta**2 * self.n * other.n / n
+            self.mean = self.mean + delta * other.n / n
+        self.n = n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        if self.hist_range is not None:
+            self.hist += other.hist
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty((0, self.width)))
+        for h, L in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], L])
+        self.compact()
+        return self
+
+
+    @property
+    def var(self):
+        return self.m2 / max(self.n - 1, 1)
+
+
+    def quantile(self, q):
+        q = np.atleast_1d(q)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(L), 2.0**h) for h, L in enumerate(self.levels)])
+        out = np.empty((len(q), self.width))
+        for j in range(self.width):
+            i = np.argsort(items[:, j])
+            cdf = np.cumsum(weights[i]) / weights.sum()
+            out[:, j] = items[i, j][np.minimum(np.searchsorted(cdf, q), len(i)-1)]
+        return out
+
+
+@dataclasses.dataclass
+class Ensemble(Base):
+    k          : int = 200
+    bins       : int = 100
+    random_seed: int = 0
+
+    def __post_init__(self):
+        self.rng = np.random.default_rng(self.random_seed)
+        self.stats = dict()
+
+
+    def update(self, metrics):
+######## metrics = {name: scalar or array ordered by district rank} for a single accepted plan ########
+        for name, x in metrics.items():
+            x = np.atleast_1d(np.asarray(x, dtype=float))
+            if name not in self.stats:
+                rng_key = name.split('/')[0]
+                self.stats[name] = Stat(width=len(x), k=self.k, bins=self.bins, rng=self.rng, hist_range=Hist_ranges.get(rng_key))
+            self.stats[name].update(x)
+        return self
+
+
+    def merge(self, other):
+        for name, s in other.stats.items():
+            if name in self.stats:
+                self.stats[name].merge(s)
+            else:
+                self.stats[name] = copy.deepcopy(s)  # later updates to either ensemble must not reach the other
+                self.stats[name].rng = self.rng
+        return self
+
+
+    def summary(self, q=(0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)):
+        L = []
+        for name, s in self.stats.items():
+            df = pd.DataFrame({'metric': name, 'rank': np.arange(s.width), 'n': s.n, 'mean': s.mean, 'std': np.sqrt(s.var), 'min': s.min, 'max': s.max})
+            for p, v in zip(q, s.quantile(q)):
+                df[f'q{p}'] = v
+            L.append(df)
+        return pd.concat(L, ignore_index=True)
+
+
+    def save(self, fn):
+        with open(fn, 'wb') as f:
+            pickle.dump(self, f)
+
+
+def load_ensemble(fn):
+    with open(fn, 'rb') as f:
+        return pickle.load(f)
+
+
+def merge_ensembles(fns):
+######## Combine sketches from many chains / processes / machines into one ensemble summary ########
+    E = None
+    for fn in fns:
+        e = load_ensemble(fn)
+        E = e if E is None else E.merge(e)
+    return E
@@ -0,0 +1,140 @@
+from . import *
+import io, shapely.geometry
+
+######## Synthetic Census / TIGER / TLC archives on a square lattice of tabblocks - no network needed ########
+######## Files mimic the real layouts closely enough that every stage's ingest code runs on them unchanged ########
+######## and are written where each stage looks for its zip, so get_zip finds them instead of downloading ########
+
+def lattice(blocks, fips='99', counties=None, districts=None, seed=0):
+######## one row per tabblock: county = column strip, tract = 8x8 cells, bg = 4x4 quadrant, vtd = 4x4 cells ########
+    rng = np.random.default_rng(seed)
+    n = int(np.ceil(np.sqrt(blocks)))
+    if counties is None:
+        counties = max(1, n // 40)
+    if districts is None:
+        districts = {'cd': max(2, blocks // 25000), 'sldu': max(2, blocks // 8000), 'sldl': max(2, blocks // 3000)}
+    i, j = [x.ravel() for x in np.meshgrid(np.arange(n), np.arange(n), indexing='ij')]
+    df = pd.DataFrame({'i': i, 'j': j})
+    df['county'] = pd.Series(2 * (j * counties // n) + 1).map('{:03d}'.format)
+    df['tract']  = pd.Series((i // 8) * 1000 + j // 8).map('{:06d}'.format)
+    df['block']  = (1 + (i % 8) // 4 * 2 + (j % 8) // 4).astype(str) + pd.Series((i % 4) * 4 + j % 4).map('{:03d}'.format)
+    df['geoid']  = fips + df['county'] + df['tract'] + df['block']
+    df['vtd']    = pd.Series((i // 4) * 1000 + j // 4).map('{:06d}'.format)
+    for d, k in districts.items():
+        df[d] = (i * k // n + 1).astype(str)
+    df['total_pop'] = np.where(rng.uniform(size=len(df)) < 0.1, 0, rng.lognormal(3, 1, size=len(df)).astype(int))
+    df['aland'] = np.where(rng.uniform(size=len(df)) < 0.02, 0, 1000000)
+    return df
+
+
+def write_zip(fn, files):
+    fn = pathlib.Path(fn)
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    with zf.ZipFile(fn, 'w', compression=zf.ZIP_DEFLATED) as z:
+        for name, data in files.items():
+            z.writestr(name, data)
+    return fn
+
+
+def baf(df, abbr, fips):
+    files = {f'BlockAssign_ST{fips}_{abbr}_{d.upper()}.txt': df[['geoid', d]].to_csv(sep='|', index=False, header=['BLOCKID', 'DISTRICT']) for d in District_types}
+    files[f'BlockAssign_ST{fips}_{abbr}_VTD.txt'] = df[['geoid', 'county', 'vtd']].to_csv(sep='|', index=False, header=['BLOCKID', 'COUNTYFP', 'DISTRICT'])
+    return files
+
+
+def crosswalk(df, fips, rng):
+######## identity 2010 -> 2020 with 10% of blocks split across their right-hand neighbor ########
+    a = df.copy()
+    b = df.copy()
+    split = rng.uniform(size=len(df)) < 0.1
+    nbr = df.set_index(['i', 'j'])
+    b = b[split & (df['j'] < df['j'].max())]
+    b[['county', 'tract', 'block']] = nbr.loc[list(zip(b['i'], b['j'] + 1)), ['county', 'tract', 'block']].to_numpy()
+    a['arealand_int'] = np.where(split & (df['j'] < df['j'].max()), 700000, 1000000)
+    b['arealand_int'] = 300000
+    x = pd.concat([a, b], ignore_index=True)
+    out = pd.DataFrame({'STATE_2010': fips, 'COUNTY_2010': x['county'], 'TRACT_2010': x['tract'], 'BLK_2010': x['block'],
+                        'BLKSF_2010': '', 'AREALAND_2010': 1000000, 'AREAWATER_2010': 0, 'BLOCK_PART_FLAG_O': '',
+                        'STATE_2020': fips, 'COUNTY_2020': x['county'], 'TRACT_2020': x['tract'], 'BLK_2020': x['block'],
+                        'BLKSF_2020': '', 'AREALAND_2020': 1000000, 'AREAWATER_2020': 0, 'BLOCK_PART_FLAG_R': '',
+                        'AREALAND_INT': x['arealand_int'], 'AREAWATER_INT': 0})
+    return {f'TAB2010_TAB2020_ST{fips}.txt': out.to_csv(sep='|', index=False)}
+
+
+def pl94(df, abbr, fips, yr, rng):
+######## pipe-delimited geo header file + 3 segment files joined on logrecno, with a state summary row first ########
+    a = abbr.lower()
+    N = len(df)
+    geo_cols = [c['name'] for c in Census_columns['geo']]
+    geo = pd.DataFrame('', index=range(N + 1), columns=geo_cols)
+    geo['fileid'], geo['stusab'], geo['chariter'], geo['logrecno'] = 'PLST', abbr, '000', np.arange(1, N + 2)
+    geo['state'] = fips
+    geo.loc[0, 'sumlev'] = '040'
+    geo.loc[1:, 'sumlev'] = '750'
+    geo.loc[1:, 'county'] = df['county'].to_numpy()
+    geo.loc[1:, 'tract'] = df['tract'].to_numpy()
+    geo.loc[1:, 'blkgrp'] = df['block'].str[0].to_numpy()
+    geo.loc[1:, 'block'] = df['block'].to_numpy()
+    geo.loc[1:, 'geoid'] = ('7500000US' + df['geoid']).to_numpy()
+    files = {f'{a}geo{yr}.pl': geo.to_csv(sep='|', index=False, header=False)}
+    pop = np.concatenate([[df['total_pop'].sum()], df['total_pop'].to_numpy()])
+    for k in ['1', '2', '3']:
+        cols = [c['name'] for c in Census_columns[k]][5:]
+        seg = pd.DataFrame((rng.uniform(size=(N + 1, len(cols))) * pop[:, None]).astype(int), columns=cols)
+        for c in cols:
+            if c in ['total_pop', 'total_pop2']:
+                seg[c] = pop
+        seg.insert(0, 'logrecno', np.arange(1, N + 2))
+        seg.insert(0, 'cifsn', f'0{k}')
+        seg.insert(0, 'chariter', '000')
+        seg.insert(0, 'stusab', abbr)
+        seg.insert(0, 'fileid', 'PLST')
+        files[f'{a}0000{k}{yr}.pl'] = seg.to_csv(sep='|', index=False, header=False)
+    return files
+
+
+def tiger(df, fips, yr, cell=0.01, origin=(-100.0, 30.0)):
+######## tabblock shapefile of lattice squares with GEOID{yy} & ALAND{yy} columns, as TIGER names them ########
+    yy = str(yr)[-2:]
+    x0, y0 = origin[0] + df['j'].to_numpy() * cell, origin[1] + df['i'].to_numpy() * cell
+    geo = [shapely.geometry.box(a, b, a + cell, b + cell) for a, b in zip(x0, y0)]
+    gdf = gpd.GeoDataFrame({f'GEOID{yy}': df['geoid'], f'ALAND{yy}': df['aland']}, geometry=geo, crs='EPSG:4269')
+    stem = f'tl_{yr}_{fips}_tabblock{yy}'
+    tmp = cache_path / f'fixtures_{os.getpid()}'
+    tmp.mkdir(parents=True, exist_ok=True)
+    gdf.to_file(tmp / f'{stem}.shp')
+    files = {fn.name: fn.read_bytes() for fn in tmp.glob(f'{stem}.*')}
+    shutil.rmtree(tmp, ignore_errors=True)
+    return files
+
+
+def returns(df, yrs, rng):
+######## TX Legislative Council style - one csv per election year, one row per (vtd, candidate) ########
+    vtd = df.groupby(['county', 'vtd'], as_index=False)['total_pop'].sum()
+    files = dict()
+    for yr in yrs:
+        races = [('U.S. Sen', ['R', 'D', 'L'])] + [(f'U.S. Rep {k}', ['R', 'D']) for k in range(1, 4)]
+        if yr % 4 == 0:
+            races.append(('President', ['R', 'D', 'L', 'G']))
+        L = list()
+        for office, parties in races:
+            for p in parties:
+                L.append(pd.DataFrame({'County': 'County ' + vtd['county'], 'FIPS': vtd['county'].astype(int).astype(str),
+                                       'VTD': vtd['vtd'].astype(int).astype(str), 'Office': office, 'Name': f'{p} Candidate-{office}',
+                                       'Party': p, 'Incumbent': 'N',
+                                       'Votes': (vtd['total_pop'] * rng.uniform(0, 0.5, size=len(vtd))).astype(int)}))
+        files[f'{yr}_General_Election_Returns.csv'] = pd.concat(L, ignore_index=True).to_csv(index=False)
+    return files
+
+
+def write_fixtures(abbr='ZZ', fips='99', blocks=10000, shapes_yr=2020, census_yr=2020, election_yrs=(2018, 2020), seed=0):
+######## every archive for one synthetic state at the path its stage reads - returns {stage: zip path} ########
+    register_state(abbr, fips, 'Synthetic')
+    rng = np.random.default_rng(seed)
+    df = lattice(blocks, fips, seed=seed)
+    zips = {'crosswalks' : (2010     , crosswalk(df, fips, rng)),
+            'assignments': (shapes_yr, baf(df, abbr, fips)),
+            'shapes'     : (shapes_yr, tiger(df, fips, shapes_yr)),
+            'census'     : (census_yr, pl94(df, abbr, fips, census_yr, rng)),
+            'elections'  : (shapes_yr, returns(df, election_yrs, rng))}
+    return {stage: write_zip(data_path / f'{stage}/{abbr}/{stage}_{abbr}_{yr}.zip', files) for stage, (yr, files) in zips.items()}
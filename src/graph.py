@@ -5,6 +5,8 @@ from .shapes import Shapes
 from .census import Census
 from .elections import Elections
 from .nodes import Nodes
+from .contraction import level_mapping, contract_graph
+from .compaction import Compaction
 
 @dataclasses.dataclass
 class Graph(Variable):
@@ -16,6 +18,8 @@ class Graph(Variable):
     level             : str = 'tract'
     district_type     : str = 'cd'
     county_line       : bool = True
+    compact           : bool = False  # also build the compact graph MCMC(compact=True) runs on (see compaction.py)
+    compact_zero_pop  : bool = False  # ... merging zero-population units too - lossy, see compact_graph
     node_attrs        : typing.Tuple = ('county', 'total_pop', 'density', 'aland', 'perim', 'polsby_popper')
     refresh_tbl       : typing.Tuple = ()
     refresh_all       : typing.Tuple = ()
@@ -24,6 +28,11 @@ class Graph(Variable):
         "office='President' and race='general'",
         "office like 'USRep%' and race='general'")
     g                 : typing.Any = None
+    upto              : str = 'graph'  # build stages only up to this one (see Stages)
+    deps    = ('assignments', 'nodes')
+    params  = ('node_attrs', 'county_line')
+    outputs = ('graph',)
+    modules = ('contraction',)
 
     def __post_init__(self):
         check_level(self.level)
@@ -31,7 +40,7 @@ class Graph(Variable):
         check_year(self.census_yr)
         check_year(self.shapes_yr)
         
-        self.state = states[states['abbr']==self.abbr].iloc[0]
+        self.state = get_state(self.abbr)
         self.__dict__.update(self.state)
         self.yr = self.census_yr
         self.g = self
@@ -40,39 +49,91 @@ class Graph(Variable):
         self.refresh_tbl = set(self.refresh_tbl).union(self.refresh_all)
         if self.name in self.refresh_tbl:
             self.refresh_all.add(self.name)
+        if len(self.refresh_tbl.difference(('nodes', 'graph'))) > 0:
+            self.refresh_tbl.update(('nodes', 'graph'))
+            self.refresh_all.update(('nodes', 'graph'))
+        if len(self.refresh_tbl) > 0:
+            self.refresh_tbl.add('compaction')
+
+######## stage objects are cheap - nothing is checked or built until something materializes ########
+        assert self.upto in Stages, f"upto must be one of {Stages}, got {self.upto}"
+        for stage, cls in zip(Stages, [Crosswalks, Assignments, Shapes, Census, Elections, Nodes]):
+            self[stage] = cls(g=self)
         super().__post_init__()
-        
-    def get(self):
-        s = set(self.refresh_tbl).union(self.refresh_all).difference(('nodes', 'graph'))
-        if len(s) > 0:
-            self.refresh_all = listify(self.refresh_all) + ['nodes', 'graph']
-        self.crosswalks    = Crosswalks(g=self)
-        self.assignments   = Assignments(g=self)
-        self.shapes        = Shapes(g=self)
-        self.census        = Census(g=self)
-        self.elections     = Elections(g=self)
-        self.nodes         = Nodes(g=self)
+        self.compaction = Compaction(g=self)
+######## the graph stage is this object itself - g['graph'] is its output, not a stage ########
+        (self if self.upto == 'graph' else self[self.upto]).materialize()
+        if self.compact and self.upto == 'graph':
+            self.compaction.materialize()
+
+
+    @property
+    def fp_file(self):
+        return self.gpickle.with_suffix('.fingerprint')
+
+
+    def load(self):
+######## a current graph needs only its gpickle - no stage upstream of it is touched ########
+        try:
+            self.graph = graph_to_codes(nx.read_gpickle(self.gpickle))
+            return True
+        except:
+            return False
 
+
+    def get(self):
         exists = super().get()
         try:
             self.graph
             rpt(f'graph exists')
         except:
             try:
-                self.graph = nx.read_gpickle(self.gpickle)
+                self.graph = graph_to_codes(nx.read_gpickle(self.gpickle))
                 rpt(f'gpickle exists')
             except:
-                rpt(f'creating graph')
-                self.process()
+                if not self.contract():
+                    rpt(f'creating graph')
+                    self.process()
                 self.gpickle.parent.mkdir(parents=True, exist_ok=True)
                 nx.write_gpickle(self.graph, self.gpickle)
         return self
     
     
+    @traced
+    def contract(self):
+######## coarse levels come from the tabblock graph in seconds when it already exists - no spatial self-join ########
+        fine = self.gpickle.parent / self.gpickle.name.replace(f'_{self.level}_', '_tabblock_')
+        if self.level == 'tabblock' or not fine.exists():
+            return False
+        rpt(f'contracting tabblock graph')
+        try:
+            df = self.assignments.df
+        except AttributeError:
+            df = pd.read_parquet(self.assignments.pq)
+        m = level_mapping(df, self.level, self.district_type, self.county_line)
+        mapping = dict(zip(encode_geoid(m.index).tolist(), encode_geoid(m.to_numpy()).tolist()))
+        fine = graph_to_codes(nx.read_gpickle(fine))
+######## a county_line tabblock graph has no blocks for its whole counties - it cannot give a county_line=False level ########
+        if any(n not in mapping for n in fine.nodes):
+            rpt(f'tabblock graph does not match county_line={self.county_line}')
+            return False
+######## perimeters come out approximate (see contract_graph) - process() measures them exactly ########
+        graph = contract_graph(fine, mapping, self.district_type)
+######## a coarse district can split even though its tabblocks were connected - then build it the usual way ########
+        districts = pd.Series(dict(graph.nodes(data=self.district_type)))
+        for D, N in districts.groupby(districts):
+            if len(get_components(graph.subgraph(N.index))) > 1:
+                rpt(f'District {self.district_type} {D} is disconnected after contraction')
+                return False
+        self.graph = graph
+        return True
+
+
     def edges_to_graph(self, edges, edge_attrs=None):
         return nx.from_pandas_edgelist(edges, source=f'geoid_x', target=f'geoid_y', edge_attr=edge_attrs)
 
 
+    @traced
     def process(self):
         rpt(f'getting edges')
         query = f"""
@@ -85,8 +146,8 @@ from (
         st_distance(x.point, y.point) / {meters_per_mile} as distance,
         st_length(st_intersection(x.polygon, y.polygon)) / {meters_per_mile} as shared_perim
     from
-        {self.nodes.tbl} as x,
-        {self.nodes.tbl} as y
+        {self.nodes.group('geometry')} as x,
+        {self.nodes.group('geometry')} as y
     where
         x.geoid < y.geoid
         and st_intersects(x.polygon, y.polygon)
@@ -98,7 +159,7 @@ order by
 """
         self.edges = run_query(query)
         self.graph = self.edges_to_graph(self.edges, edge_attrs=('distance', 'shared_perim'))
-        self.nodes.df = read_table(self.nodes.tbl, cols=list(self.node_attrs) + [self.district_type, 'geoid']).set_index('geoid')
+        self.nodes.df = read_nodes(self.nodes.tbl, cols=list(self.node_attrs) + [self.district_type]).set_index('geoid')
         nx.set_node_attributes(self.graph, self.nodes.df.to_dict('index'))
 
         print(f'connecting districts')
@@ -130,8 +191,8 @@ from (
             y.geoid as geoid_y,
             st_distance(x.point, y.point) / {meters_per_mile} as distance
         from
-            {self.nodes.tbl} as x,
-            {self.nodes.tbl} as y
+            {self.nodes.group('geometry')} as x,
+            {self.nodes.group('geometry')} as y
         where
             x.geoid < y.geoid
             and x.geoid in ('{C[0]}')
@@ -142,4 +203,6 @@ where distance < 1.05 * min_distance
 """
                     new_edges = run_query(query)
                     self.graph.update(self.edges_to_graph(new_edges))
-                print('done')
\ No newline at end of file
+                print('done')
+######## nodes are keyed by int64 geoid codes from here on ########
+        self.graph = graph_to_codes(self.graph)
\ No newline at end of file
@@ -0,0 +1,68 @@
+from . import *
+from .maps import Geometry, load_colors
+
+@dataclasses.dataclass
+class Lookup(Base):
+######## Which district is this point in under each plan - point -> node polygon via an STR-tree, node -> label via a ########
+######## node-major copy of the plans x nodes color array, so all plans of a node are one contiguous read ########
+    nodes : str
+    tbl   : str
+
+    def __post_init__(self):
+        self.run = self.tbl.split(".")[-1]
+        self.abbr, self.yr, self.level, self.district_type, _, self.seed = self.run.split('_')
+        self.results_path = results_root / self.run
+        self.plans_pq = self.results_path / f'{self.run}_plans.parquet'
+        self.colors_npy = self.results_path / f'{self.run}_colors.npy'  # same array Analysis.plot uses
+        self.by_node_npy = self.results_path / f'{self.run}_colors_by_node.npy'
+
+
+    def get(self):
+######## Geometry & both color arrays are built once & persisted - later sessions only memory-map them & pack the tree ########
+######## points are matched against the exact polygons - a simplified outline can be off by ~10m, enough to change district ########
+        geometry = Geometry(nodes=self.nodes, tols=()).get()
+        gdf = geometry.load()
+        self.geoids = gdf['geoid'].to_numpy()
+        self.polygons = gdf.geometry
+        self.tree = self.polygons.sindex
+        colors = load_colors(self.plans_pq, pd.Index(encode_geoid(gdf['geoid'])), self.district_type, self.colors_npy, geometry)
+######## the node-major copy is redone whenever the colors array was rebuilt after it ########
+        if not self.by_node_npy.exists() or self.by_node_npy.stat().st_mtime_ns < self.colors_npy.stat().st_mtime_ns:
+            rpt(f'transposing colors')
+            arr = np.lib.format.open_memmap(self.by_node_npy, mode='w+', dtype=colors.dtype, shape=colors.shape[::-1])
+            step = max(1, 2**27 // colors.shape[1])  # ~128M cells per block
+            for i in range(0, colors.shape[0], step):
+                arr[:, i:i+step] = colors[i:i+step].T
+            arr.flush()
+        self.colors = np.load(self.by_node_npy, mmap_mode='r')
+        self.labels = pd.read_parquet(str(self.colors_npy)[:-4] + '_labels.parquet')['label'].to_numpy()
+        self.num_plans = self.colors.shape[1]
+        return self
+
+
+    def nodes_at(self, lat, lon):
+######## index of the node containing each point, -1 outside every node - a point on a shared edge takes its first hit ########
+        pts = gpd.points_from_xy(np.asarray(lon, dtype='float64'), np.asarray(lat, dtype='float64'), crs='EPSG:4326')
+        i, j = self.tree.query(pts, predicate='intersects')
+        node = np.full(len(pts), -1, dtype='int64')
+        node[i[::-1]] = j[::-1]
+        return node
+
+
+    def codes(self, node, plans=None):
+######## points x plans array of indices into self.labels - each distinct node is read once, however many points share it ########
+        plans = np.arange(self.num_plans) if plans is None else np.asarray(listify(plans))
+        uniq, inv = np.unique(np.clip(node, 0, None), return_inverse=True)
+        return self.colors[np.ix_(uniq, plans)][inv]
+
+
+    def lookup(self, lat, lon, plans=None):
+######## one row per point: its node geoid & a categorical district label column per plan - NaN outside the state ########
+        plans = np.arange(self.num_plans) if plans is None else np.asarray(listify(plans))
+        node = self.nodes_at(lat, lon)
+        outside = node < 0
+        codes = self.codes(node, plans).astype('int32')
+        codes[outside] = -1
+        df = pd.DataFrame({'lat': lat, 'lon': lon, 'geoid': np.where(outside, None, self.geoids[np.clip(node, 0, None)])})
+        labels = pd.DataFrame({p: pd.Categorical.from_codes(codes[:, k], self.labels) for k, p in enumerate(plans)})
+        return pd.concat([df, labels], axis=1)
@@ -0,0 +1,211 @@
+from . import *
+import pyarrow.parquet as pq, shapely.geometry, string
+
+try:
+    import topojson
+except:
+    os.system('pip install --upgrade topojson')
+    import topojson
+
+@dataclasses.dataclass
+class Geometry(Base):
+    nodes : str
+    tols  : typing.Tuple = (0.01, 0.001, 0.0001)  # zoom levels - coarse to fine
+
+    def __post_init__(self):
+        self.path = data_path / f'geometry/{self.nodes.split(".")[-1]}'
+        self.attrs_pq = self.path / 'attrs.parquet'
+        self.exact_pq = self.path / 'geometry_exact.parquet'  # unsimplified polygons - for point lookups, not drawing
+        self.source_json = self.path / 'source.json'
+        self.lock = self.path.with_name(f'{self.path.name}.lock')
+
+
+    def stamp(self):
+######## last-modified time of every node table the cache is built from - a change to any of them rebuilds it ########
+        if 'source' not in self.__dict__:
+            self.source = nodes_stamp(self.nodes)
+        return self.source
+
+
+    def geo_pq(self, tol):
+        return self.path / f'geometry_{tol}.parquet'
+
+
+    def arcs_pq(self, tol):
+        return self.path / f'arcs_{tol}.parquet'
+
+
+    def node_arcs_pq(self, tol):
+        return self.path / f'node_arcs_{tol}.parquet'
+
+
+    def map_js(self, tol):
+        return self.path / f'map_{tol}.js'
+
+
+    def current(self):
+        try:
+            return json.loads(self.source_json.read_text()) == json.loads(json.dumps(self.stamp(), default=str))
+        except FileNotFoundError:
+            return False
+
+
+    def get(self):
+######## Runs once per nodes table - every seed's map references this cache instead of re-downloading polygons ########
+######## Seeds call this at once, so it runs under a lock: a stale or partial cache is replaced whole by one built aside ########
+######## & renamed into place, and a current cache only gains the tols it is missing - tols other callers built stay ########
+        with file_lock(self.lock):
+            if not (self.current() and self.attrs_pq.exists() and self.exact_pq.exists()):
+                self.build()
+            missing = [tol for tol in self.tols if not all(fn(tol).exists() for fn in [self.geo_pq, self.arcs_pq, self.node_arcs_pq])]
+            if len(missing) > 0:
+                self.simplify(missing)
+        return self
+
+
+    def build(self):
+        rpt(f'preparing geometry')
+        tmp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        df = read_nodes(self.nodes, cols=['county', 'total_pop', 'density', 'aland', 'perim', 'polsby_popper', 'polygon']).sort_values('geoid', ignore_index=True)
+        geo = gpd.GeoSeries.from_wkt(df['polygon'], crs='EPSG:4326').buffer(0)
+        gpd.GeoDataFrame(df[['geoid']], geometry=geo).to_parquet(tmp / self.exact_pq.name)
+        df.drop(columns='polygon').to_parquet(tmp / self.attrs_pq.name, index=False)
+        (tmp / self.source_json.name).write_text(json.dumps(self.stamp()))
+        old = self.path.with_name(f'{self.path.name}.{os.getpid()}.old')
+        if self.path.exists():
+            os.rename(self.path, old)
+        os.rename(tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+
+
+    def simplify(self, tols):
+######## Simplify shared arcs rather than each polygon on its own so neighbors stay flush (no white slivers) ########
+        topo = topojson.Topology(gpd.read_parquet(self.exact_pq), prequantize=False)
+        for tol in tols:
+            rpt(f'simplifying at {tol}')
+            simple = topo.toposimplify(tol)
+            gdf = simple.to_gdf().set_crs('EPSG:4326', allow_override=True)
+            cache_write(self.geo_pq(tol), lambda tmp: gdf.to_parquet(tmp))
+######## keep the shared arcs too - district outlines are assembled from them without polygon unions ########
+            arcs, node_arcs = topo_arcs(simple.to_dict())
+            cache_write(self.arcs_pq(tol), lambda tmp: arcs.to_parquet(tmp))
+            cache_write(self.node_arcs_pq(tol), lambda tmp: node_arcs.to_parquet(tmp, index=False))
+
+
+    def load(self, tol=None):
+######## tol=None gives the exact polygons ########
+        gdf = gpd.read_parquet(self.exact_pq if tol is None else self.geo_pq(tol))
+        attrs = pd.read_parquet(self.attrs_pq)
+        return gdf.merge(attrs, on='geoid').sort_values('geoid').reset_index(drop=True)
+
+
+    def load_arcs(self, tol):
+        return gpd.read_parquet(self.arcs_pq(tol)), pd.read_parquet(self.node_arcs_pq(tol))
+
+
+    def get_map_js(self, tol):
+######## geometry & node attributes as a script every seed's map html includes - feature i is column i of the colors ########
+        fn = self.map_js(tol)
+        if not fn.exists():
+            gdf = self.load(tol)
+            gdf.insert(0, 'i', np.arange(len(gdf)))
+            cache_write(fn, lambda tmp: tmp.write_text(f'var Geometry = {gdf.to_json()};'))
+        return fn
+
+
+def topo_arcs(topo):
+######## arcs as linestrings & the (geoid, arc) incidence - each ring lists its arcs, ~i meaning arc i reversed ########
+    arcs = gpd.GeoDataFrame({'arc': np.arange(len(topo['arcs']))}, geometry=[shapely.geometry.LineString(a) for a in topo['arcs']], crs='EPSG:4326')
+    def flatten(x):
+        for a in x:
+            if isinstance(a, list):
+                yield from flatten(a)
+            else:
+                yield a if a >= 0 else ~a
+    L = [(g['properties']['geoid'], a) for obj in topo['objects'].values() for g in obj['geometries'] for a in flatten(g.get('arcs', []))]
+    return arcs, pd.DataFrame(L, columns=['geoid', 'arc'])
+
+
+def colors_stamp(plans_pq, geometry):
+    return json.loads(json.dumps({'plans': os.stat(plans_pq).st_mtime_ns, 'nodes': geometry.stamp()}, default=str))
+
+
+def load_colors(plans_pq, geoids, district_type, colors_npy, geometry):
+######## the colors array is rebuilt when the plan store or the node tables behind the geometry change ########
+    stamp_json = pathlib.Path(str(colors_npy)[:-4] + '_source.json')
+    stamp = colors_stamp(plans_pq, geometry)
+    try:
+        current = json.loads(stamp_json.read_text()) == stamp
+    except FileNotFoundError:
+        current = False
+    if not (current and pathlib.Path(colors_npy).exists()):
+        get_colors(plans_pq, geoids, district_type, colors_npy)
+        stamp_json.write_text(json.dumps(stamp))
+    return np.load(colors_npy, mmap_mode='r')
+
+
+def get_colors(plans_pq, geoids, district_type, colors_npy):
+######## Plans x nodes array of small integer color indices, built by streaming the plan store ########
+    plans = pq.read_table(plans_pq, columns=['plan'])['plan'].to_numpy()
+    num_plans = plans.max() + 1
+    labels = pd.Index(sorted(pq.read_table(plans_pq, columns=[district_type])[district_type].unique().to_pylist()))
+    dtype = 'uint8' if len(labels) < 256 else 'uint16'
+    arr = np.lib.format.open_memmap(colors_npy, mode='w+', dtype=dtype, shape=(num_plans, len(geoids)))
+    for batch in pq.ParquetFile(plans_pq).iter_batches(batch_size=1000000):
+        df = batch.to_pandas()
+        arr[df['plan'].to_numpy(), geoids.get_indexer(df['geoid'])] = labels.get_indexer(df[district_type])
+    arr.flush()
+    pd.Series(labels, name='label').to_frame().to_parquet(str(colors_npy)[:-4] + '_labels.parquet')
+    return arr
+
+
+Category20 = ['#1f77b4', '#aec7e8', '#ff7f0e', '#ffbb78', '#2ca02c', '#98df8a', '#d62728', '#ff9896', '#9467bd', '#c5b0d5',
+              '#8c564b', '#c49c94', '#e377c2', '#f7b6d2', '#7f7f7f', '#c7c7c7', '#bcbd22', '#dbdb8d', '#17becf', '#9edae5']
+
+######## Per-seed map - only the sampled plans' color indices are inlined, polygons come from the shared geometry script ########
+Map_html = string.Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$run</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<script src="$geometry"></script>
+<style>#map {height: 600px; width: 900px;}</style>
+</head>
+<body>
+<div id="map"></div>
+<div>PLAN # <input id="slider" type="range" min="0" max="$last" value="0"> <span id="plan"></span></div>
+<script>
+var Plans = $plans, Colors = $colors, Palette = $palette, k = 0;
+var map = L.map('map');
+L.tileLayer('https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png').addTo(map);
+function style(f) {
+    return {fillColor: Palette[Colors[k][f.properties.i] % Palette.length], fillOpacity: 0.8, color: 'black', weight: 0.5, opacity: 0.05};
+}
+var layer = L.geoJSON(Geometry, {style: style, onEachFeature: function (f, l) {
+    var p = f.properties;
+    l.bindTooltip(p.geoid + ', ' + p.county + '<br>pop=' + p.total_pop + '<br>density=' + p.density.toFixed(1) +
+                  '<br>land=' + p.aland.toFixed(1) + '<br>pp=' + p.polsby_popper.toFixed(1));
+}}).addTo(map);
+map.fitBounds(layer.getBounds());
+document.getElementById('plan').textContent = Plans[0];
+document.getElementById('slider').oninput = function () {
+    k = this.value;
+    document.getElementById('plan').textContent = Plans[k];
+    layer.setStyle(style);
+};
+</script>
+</body>
+</html>
+""")
+
+
+def write_map(fn, geometry_js, plans, colors, run):
+    fn = pathlib.Path(fn)
+    html = Map_html.substitute(run=run, geometry=os.path.relpath(geometry_js, fn.parent), last=len(plans)-1, plans=json.dumps(plans),
+                               colors=json.dumps(np.asarray(colors).astype(int).tolist()), palette=json.dumps(Category20))
+    fn.write_text(html)
+    return fn
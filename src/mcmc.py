@@ -1,4 +1,12 @@
 from . import *
+from .ensemble import Ensemble
+from .seeds import recursive_tree_part
+from .proposals import Proposals
+from .compaction import read_node_map, expand_plans
+from .diagnostics import Diagnostics
+from .coordinator import Client
+from .spanning import TreeCounter, uniform_spanning_tree, balanced_cuts
+from .sketch import PlanSketch
 
 @dataclasses.dataclass
 class MCMC(Base):
@@ -11,9 +19,31 @@ class MCMC(Base):
     pop_imbalance_tol  : float = 10.0
     pop_imbalance_stop : bool = False
     new_districts      : int = 0
+    ensemble           : bool = False  # stream metric summaries into {run}_ensemble.pkl (see ensemble.py)
+    store_plans        : bool = True
+    nodes_tbl          : str = None
+    elections          : typing.Tuple = ()
+    seed_plan          : bool = False
+    proposal_pool      : int = 0
+    compact            : bool = False  # gpickle is Graph(compact=True).compaction.gpickle
+    diag_metrics       : typing.Tuple = ('pop_imbalance', 'polsy_popper')
+    ess_stop           : float = 0.0   # stop once every diag metric has at least this effective sample size
+    rhat_stop          : float = 1.05  # ... and cross-chain R-hat at most this, when a coordinator is given
+    diag_every         : int = 0      # steps between R-hat exchanges - with ess_stop=0, 0 leaves the diagnostics (& their summary columns) off
+    coordinator_host   : str = None
+    coordinator_port   : int = 5555
+    reversible         : bool = False  # Metropolis-Hastings ReCom once the plan is within pop_imbalance_tol
+    tree_power         : float = 0.0   # target is prod over districts of (spanning tree count)^tree_power - 0 is uniform on plans
+    max_cuts           : int = 5       # bound on balanced cut edges per tree - each is taken with probability 1/max_cuts
+    approx_above       : int = 5000    # districts with more nodes use a bound on their spanning tree count
+    sketch_size        : int = 0       # MinHash entries kept per accepted plan (see sketch.py) - 0 keeps none
 
     def __post_init__(self):
+        assert len(self.elections) == 0 or self.nodes_tbl is not None, 'elections are read from the nodes table - give nodes_tbl too'
         self.random_seed = int(self.random_seed)
+        self.diagnosing = self.ess_stop > 0 or self.diag_every > 0
+        if self.diagnosing and self.diag_every <= 0:
+            self.diag_every = 100
         self.rng = np.random.default_rng(self.random_seed)
         
         self.gpickle = pathlib.Path(self.gpickle)
@@ -22,10 +52,22 @@ class MCMC(Base):
 #         label = str(pd.Timestamp.now().round("s")).replace(' ','_').replace('-','_').replace(':','_')
         label = 'seed_' + str(self.random_seed).rjust(4, "0")
         self.tbl = f'{proj_id}.redistricting_results_{self.user_name}.{b}_{label}'
-        self.graph = nx.read_gpickle(self.gpickle)
+        self.graph = graph_to_codes(nx.read_gpickle(self.gpickle))
         self.gpickle_out = f'{str(self.gpickle)[:-8]}_{label}.gpickle'
+        self.run = self.tbl.split('.')[-1]
+        self.results_path = results_root / self.run
+        self.results_path.mkdir(parents=True, exist_ok=True)
         
-        if self.new_districts > 0:
+        if self.compact:
+######## gpickle is then a Compaction output - its node map expands plans back to every original node ########
+            self.node_map = read_node_map(self.gpickle)
+
+        if self.seed_plan:
+######## start inside tolerance from a recursive spanning tree partition instead of the enacted plan ########
+            num_districts = self.nodes_df()[self.district_type].nunique() + self.new_districts
+            labels = recursive_tree_part(self.graph, num_districts, self.pop_imbalance_tol, self.rng)
+            nx.set_node_attributes(self.graph, labels, self.district_type)
+        elif self.new_districts > 0:
             M = int(self.nodes_df()[self.district_type].max())
             for n in self.nodes_df().nlargest(self.new_districts, 'total_pop').index:
                 M += 1
@@ -35,6 +77,55 @@ class MCMC(Base):
         self.num_districts = len(self.districts)
         self.pop_total = self.sum_nodes(self.graph, 'total_pop')
         self.pop_ideal = self.pop_total / self.num_districts
+        if len(self.elections) > 0:
+            self.get_votes()
+
+    def get_votes(self):
+######## Node x (election, party) matrix of two-party votes for the chosen elections ########
+######## election columns look like office_yr_race_party_candidate - a party's candidates in one race are summed ########
+        cols = dict()
+        for c in node_cols(self.nodes_tbl, groups=('elections',)):
+            w = c.split('_')
+            e = '_'.join(w[:-2])
+            if e in self.elections and w[-2].upper() in ['D', 'R']:
+                cols.setdefault(e, dict()).setdefault(w[-2].upper(), []).append(c)
+        missing = [e for e in self.elections if len(cols.get(e, [])) < 2]
+        assert len(missing) == 0, f'no D & R columns for elections {missing}'
+        self.elections = tuple(self.elections)
+        df = read_nodes(self.nodes_tbl, cols=[c for e in self.elections for p in ['D', 'R'] for c in cols[e][p]])
+        df = df.set_index(encode_geoid(df['geoid'])).drop(columns='geoid')
+        self.node_idx = {n:i for i, n in enumerate(self.graph.nodes)}
+        if self.compact:
+            df = df.groupby(df.index.map(self.node_map)).sum()
+        df = df.reindex(list(self.graph.nodes)).fillna(0)
+        self.votes_dem = np.column_stack([df[cols[e]['D']].sum(axis=1).to_numpy(dtype=float) for e in self.elections])
+        self.votes_rep = np.column_stack([df[cols[e]['R']].sum(axis=1).to_numpy(dtype=float) for e in self.elections])
+        self.district_votes = dict()
+        self.update_votes(self.districts.keys())
+
+    def update_votes(self, districts):
+######## Only the districts that changed are re-summed ########
+        for d in districts:
+            i = [self.node_idx[n] for n in self.districts[d]]
+            self.district_votes[d] = (self.votes_dem[i].sum(axis=0), self.votes_rep[i].sum(axis=0))
+        self.get_partisan()
+        self.summarize_partisan()
+
+    def get_partisan(self):
+######## seats, efficiency gap & mean-median for every election at once - arrays are districts x elections ########
+        dem = np.array([self.district_votes[d][0] for d in sorted(self.district_votes)])
+        rep = np.array([self.district_votes[d][1] for d in sorted(self.district_votes)])
+        tot = dem + rep
+        self.vote_share = np.divide(dem, tot, out=np.full(tot.shape, 0.5), where=tot>0)
+        win = dem > rep
+        need = tot / 2
+        wasted_dem = np.where(win, dem - need, dem)
+        wasted_rep = np.where(win, rep, rep - need)
+        self.partisan = pd.DataFrame({
+            'seats'         : win.sum(axis=0),
+            'efficiency_gap': (wasted_dem - wasted_rep).sum(axis=0) / tot.sum(axis=0),
+            'mean_median'   : self.vote_share.mean(axis=0) - np.median(self.vote_share, axis=0),
+        }, index=self.elections)
 
     def nodes_df(self, G=None):
         if G is None:
@@ -78,25 +169,85 @@ class MCMC(Base):
         self.summary['plan'] = [self.plan]
         self.summary['pop_imbalance'] = [self.pop_imbalance]
         self.summary['polsy_popper']  = [self.stat['polsby_popper'].mean()]
+        self.summarize_partisan()
+
+    def summarize_partisan(self):
+        if len(self.elections) > 0 and hasattr(self, 'partisan') and hasattr(self, 'summary'):
+            for e, row in self.partisan.iterrows():
+                for k, v in row.items():
+                    self.summary[f'{e}_{k}'] = [v]
+
+
+    def diagnose(self):
+######## update ess (and every diag_every steps the cross-chain R-hat) & log them with the step summary ########
+        self.diagnostics.update(self.summary[list(self.diag_metrics)].iloc[0].to_numpy(dtype=float))
+        self.ess = self.diagnostics.ess()
+        if self.client is not None and self.plan % self.diag_every == 0:
+            self.rhat = self.client.request('diag', self.random_seed, stats=self.diagnostics.chain_stats())['rhat']
+        for m in self.diag_metrics:
+            self.summary[f'{m}_ess'] = [self.ess[m]]
+            self.summary[f'{m}_rhat'] = [self.rhat.get(m, np.nan)]
+
+    def converged(self):
+        if self.ess_stop <= 0 or not (self.ess >= self.ess_stop).all():  # NaN ess is undetermined, never enough
+            return False
+        if self.client is None:
+            return True
+        return all(self.rhat.get(m, np.inf) <= self.rhat_stop for m in self.diag_metrics)
+
+    def get_metrics(self):
+######## District-level metrics of the current plan, sorted so entry i is the district of rank i ########
+        metrics = dict()
+        metrics['pop_imbalance'] = self.pop_imbalance
+        metrics['pop_deviation'] = np.sort((self.stat['total_pop'].to_numpy() - self.pop_ideal) / self.pop_ideal * 100)
+        metrics['polsby_popper'] = np.sort(self.stat['polsby_popper'].to_numpy())
+        if len(self.elections) > 0:
+            for j, e in enumerate(self.elections):
+                metrics[f'vote_share/{e}'] = np.sort(self.vote_share[:, j])
+                for k, v in self.partisan.loc[e].items():
+                    metrics[f'{k}/{e}'] = v
+        return metrics
 
 
     def run_chain(self):
         nx.set_node_attributes(self.graph, self.plan, 'plan')
         self.get_stats()
+        self.diagnostics = Diagnostics(metrics=tuple(self.diag_metrics))
+        self.rhat = dict()
+        self.client = None if self.coordinator_host is None else Client(host=self.coordinator_host, port=self.coordinator_port)
+        if self.diagnosing:
+            self.diagnose()
         self.plans      = [self.nodes_df()[['plan', self.district_type]]]
         self.stats      = [self.stat.copy()]
         self.summaries  = [self.summary.copy()]
         self.partitions = [self.partition]
+        if self.ensemble:
+            self.ensemble_stats = Ensemble(random_seed=self.random_seed).update(self.get_metrics())
+        if self.proposal_pool > 0:
+            self.proposals = Proposals(processes=self.proposal_pool, random_seed=self.random_seed)
+        if self.reversible:
+            self.tree_count = TreeCounter(self.graph, approx_above=self.approx_above)
+            self.mh = {'proposed': 0, 'accepted': 0, 'no_cut': 0, 'over_max_cuts': 0}
+        if self.sketch_size > 0:
+            self.sketch = PlanSketch(self.graph, self.district_type, num_hashes=self.sketch_size)
+            self.sketches = [self.sketch.sig.copy()]
         for k in range(1, self.max_steps+1):
 #             rpt(f"MCMC {k}")
             self.plan += 1
             nx.set_node_attributes(self.graph, self.plan, 'plan')
             while True:
-                if self.recomb():
-                    self.plans.append(self.nodes_df()[['plan', self.district_type]])
-                    self.stats.append(self.stat.copy())
-                    self.summaries.append(self.summary.copy())
+                if self.step():
+                    if self.diagnosing:
+                        self.diagnose()
+                    if self.store_plans:
+                        self.plans.append(self.nodes_df()[['plan', self.district_type]])
+                        self.stats.append(self.stat.copy())
+                        self.summaries.append(self.summary.copy())
+                    if self.ensemble:
+                        self.ensemble_stats.update(self.get_metrics())
                     self.partitions.append(self.partition)
+                    if self.sketch_size > 0:
+                        self.sketches.append(self.sketch.update())
 #                     print('success')
                     break
                 else:
@@ -105,20 +256,46 @@ class MCMC(Base):
             if self.pop_imbalance_stop and self.pop_imbalance < self.pop_imbalance_tol:
 #                 rpt(f'pop_imbalance_tol {self.pop_imbalance_tol} satisfied - stopping')
                 break
+            if self.converged():
+                rpt(f'ess >= {self.ess_stop} for {self.diag_metrics} after {self.plan} steps - stopping')
+                break
 #         print('MCMC done')
+        if self.proposal_pool > 0:
+            self.proposals.close()
+        if self.reversible:
+            rpt(f"reversible ReCom {self.mh} - {self.tree_count.hits} cached tree counts reused")
+            if self.mh['over_max_cuts'] > 0:
+                rpt(f"WARNING {self.mh['over_max_cuts']} trees had more than max_cuts={self.max_cuts} balanced cuts - raise max_cuts for exact detailed balance")
+        if self.client is not None:
+            self.client.close()
+        if self.ensemble:
+            self.ensemble_stats.save(self.results_path / f'{self.run}_ensemble.pkl')
+        if self.sketch_size > 0:
+            np.save(self.results_path / f'{self.run}_sketches.npy', np.array(self.sketches))
 
-        self.plans = pd.concat(self.plans, axis=0).rename_axis('geoid')
+        self.plans = pd.concat(self.plans, axis=0)
+        if self.compact:
+            self.plans = expand_plans(self.plans, self.node_map)
+        self.plans = self.plans.rename_axis('geoid')
         self.stats = pd.concat(self.stats, axis=0).rename_axis(self.district_type)
         self.summaries = pd.concat(self.summaries, axis=0)
         
-        load_table(tbl=self.tbl+'_plans'  , df=self.plans.reset_index()  , preview_rows=0)
-        load_table(tbl=self.tbl+'_stats'  , df=self.stats.reset_index()  , preview_rows=0)
-        load_table(tbl=self.tbl+'_summary', df=self.summaries, preview_rows=0)
+######## BigQuery gets geoid strings - decoded once per node, not once per row ########
+        nodes = pd.Index(list(self.node_map) if self.compact else self.graph.nodes)
+        geoids = decode_geoid(nodes)
+        plans = self.plans.reset_index()
+        plans['geoid'] = geoids[nodes.get_indexer(plans['geoid'])]
+        jobs = [submit(load_table, tbl=self.tbl+'_plans'  , df=plans                     , preview_rows=0),
+                submit(load_table, tbl=self.tbl+'_stats'  , df=self.stats.reset_index()  , preview_rows=0),
+                submit(load_table, tbl=self.tbl+'_summary', df=self.summaries, preview_rows=0)]
+######## local plan store so results can be tallied without a BigQuery join ########
+        self.plans.reset_index().to_parquet(self.results_path / f'{self.run}_plans.parquet', row_group_size=1000000)
+        self.stats.reset_index().to_parquet(self.results_path / f'{self.run}_stats.parquet')
         nx.write_gpickle(self.graph, self.gpickle_out)
+        wait(jobs)
         
         
-    def recomb(self):
-        self.get_stats()
+    def get_pairs(self):
         L = self.stat['total_pop'].sort_values().index.copy()
         if self.pop_imbalance < self.pop_imbalance_tol:
             tol = self.pop_imbalance_tol
@@ -128,6 +305,104 @@ class MCMC(Base):
             tol = self.pop_imbalance + 0.01
             k = int(len(L) / 2)
             pairs = [(d0, d1) for d0 in L[:k] for d1 in L[k:][::-1]]
+        return tol, pairs
+
+
+    def step(self):
+######## reversible moves need a plan inside the target's support - recomb pushes it there first ########
+        if self.reversible and self.pop_imbalance <= self.pop_imbalance_tol:
+            return self.recomb_reversible()
+        return self.recomb_multi() if self.proposal_pool > 0 else self.recomb()
+
+
+    def adjacent_pairs(self):
+        x = self.graph.nodes
+        return sorted({tuple(sorted((x[u][self.district_type], x[v][self.district_type]))) for u, v in self.graph.edges
+                       if x[u][self.district_type] != x[v][self.district_type]})
+
+
+    def recomb_reversible(self):
+######## Metropolis-Hastings ReCom: uniform adjacent pair, uniform spanning tree of their union, balanced cut k ########
+######## with probability 1/max_cuts (else stay). The union's tree count cancels from the proposal ratio, so ########
+######## log alpha = (1-tree_power) * (log tau(A) + log tau(B) - log tau(A') - log tau(B')) ########
+########             + log #pairs(P) - log #pairs(P') + log cut(A,B) - log cut(A',B') ########
+######## A stay is a step too - the plan repeats, as it must for the chain to target the right distribution ########
+        self.get_stats()
+        self.mh['proposed'] += 1
+        pairs = self.adjacent_pairs()
+        d0, d1 = pairs[self.rng.integers(len(pairs))]
+        A, B = self.districts[d0], self.districts[d1]
+        H = self.graph.subgraph(A + B)
+        P = self.stat['total_pop'].copy()
+        q = P.pop(d0) + P.pop(d1)
+        T = uniform_spanning_tree(H, self.rng)
+        cuts = balanced_cuts(T, dict(H.nodes(data='total_pop')), q, P.min(), P.max(), self.pop_ideal, self.pop_imbalance_tol)
+        self.mh['over_max_cuts'] += len(cuts) > self.max_cuts
+        k = self.rng.integers(self.max_cuts)
+        if k >= len(cuts):
+            self.mh['no_cut'] += 1
+            return True
+        T.remove_edge(*cuts[k])
+        A1 = tuple(sorted(nx.node_connected_component(T, cuts[k][0])))
+        B1 = tuple(sorted(set(A + B).difference(A1)))
+        cut = lambda X, Y: nx.cut_size(H, X, Y)
+
+        x = self.graph.nodes
+        old = {n: x[n][self.district_type] for n in A + B}
+        s = (sum(x[n]['aland'] for n in A1 if old[n]==d0) - sum(x[n]['aland'] for n in A1 if old[n]!=d0) +
+             sum(x[n]['aland'] for n in B1 if old[n]==d1) - sum(x[n]['aland'] for n in B1 if old[n]!=d1))
+        if s < 0:  # keep labels where most of the land already is so colors don't jump - see recomb
+            d0, d1 = d1, d0
+        for n in A1:
+            x[n][self.district_type] = d0
+        for n in B1:
+            x[n][self.district_type] = d1
+        log_alpha = ((1 - self.tree_power) * (self.tree_count(A) + self.tree_count(B) - self.tree_count(A1) - self.tree_count(B1))
+                     + np.log(len(pairs)) - np.log(len(self.adjacent_pairs())) + np.log(cut(A, B)) - np.log(cut(A1, B1)))
+        if np.log(self.rng.uniform()) < log_alpha:
+            self.mh['accepted'] += 1
+            self.get_stats()
+            if len(self.elections) > 0:
+                self.update_votes((d0, d1))
+        else:
+            for n, d in old.items():
+                x[n][self.district_type] = d
+        return True
+
+
+    def recomb_multi(self):
+######## same moves as recomb, but candidate (pair, tree) proposals are evaluated in parallel batches ########
+        self.get_stats()
+        tol, pairs = self.get_pairs()
+        for d0, d1, (comp0, comp1, imb) in self.proposals.propose(self, pairs, tol):
+            x = self.graph.nodes
+            old = {n: x[n][self.district_type] for n in comp0 + comp1}
+            # keep labels where most of the land already is so colors don't jump - see recomb
+            s = (sum(x[n]['aland'] for n in comp0 if old[n]==d0) -
+                 sum(x[n]['aland'] for n in comp0 if old[n]!=d0) +
+                 sum(x[n]['aland'] for n in comp1 if old[n]==d1) -
+                 sum(x[n]['aland'] for n in comp1 if old[n]!=d1))
+            if s < 0:
+                d0, d1 = d1, d0
+            for n in comp0:
+                x[n][self.district_type] = d0
+            for n in comp1:
+                x[n][self.district_type] = d1
+            self.get_stats()
+            if self.partition in self.partitions:
+                for n, d in old.items():
+                    x[n][self.district_type] = d
+                self.get_stats()
+                continue
+            if len(self.elections) > 0:
+                self.update_votes((d0, d1))
+            return True
+        return False
+
+
+    def recomb(self):
+        self.get_stats()
+        tol, pairs = self.get_pairs()
 #         print(f'pop_imbalance={self.pop_imbalance:.2f}{concat_str}setting tol={tol:.2f}%', end=concat_str)
         
         recom_found = False
@@ -206,6 +481,8 @@ class MCMC(Base):
                                 self.get_stats()
                             else:  # if this is a never-before-seen plan, keep it and return happy
 #                                 print(f'recombed {self.district_type} {d0} & {d1} got pop_imbalance={self.pop_imbalance:.2f}%', end=concat_str)
+                                if len(self.elections) > 0:
+                                    self.update_votes((d0, d1))
                                 recom_found = True
                                 break
                     if recom_found:
@@ -2,20 +2,28 @@ from . import *
 @dataclasses.dataclass
 class Nodes(Variable):
     name: str = 'nodes'
+    deps   = ('assignments', 'shapes', 'census', 'elections')
+    params = ('county_line',)
 
     def __post_init__(self):
         self.yr = self.g.shapes_yr
         self.level = self.g.level
         super().__post_init__()
+        self.tbl += f'_{self.g.district_type}'
+
+
+    def group(self, name):
+        return f'{self.tbl}_{name}'
 
 
     def get(self):
-        self.tbl += f'_{self.g.district_type}'
+######## the core table is narrow - wide attributes go to column groups that consumers read by projection ########
+        election_cols = [c for c in get_cols(self.g.elections.tbl) if c not in ['geoid', 'county']] if check_table(self.g.elections.tbl) else []
         self.cols = {'assignments': Levels + District_types,
-                     'shapes'     : ['aland', 'polygon'],
                      'census'     : Census_columns['data'],
-                     'elections'  : [c for c in get_cols(self.g.elections.tbl) if c not in ['geoid', 'county']]
-                    }
+                     'elections'  : dict()}
+        for c in election_cols:
+            self.cols['elections'].setdefault(c.split('_')[1], []).append(c)
         exists = super().get()
         if not exists['tbl']:
             if not exists['raw']:
@@ -26,17 +34,25 @@ class Nodes(Variable):
         return self
 
 
+    @traced
     def process_raw(self):
-        A_sels = [f'A.{c}'                     for c in self.cols['assignments']]
-        S_sels = [f'S.{c}'                     for c in self.cols['shapes']]
-        C_sels = [f'coalesce(C.{c}, 0) as {c}' for c in self.cols['census']]
-        E_sels = [f'coalesce(E.{c}, 0) as {c}' for c in self.cols['elections']]
-        sels = A_sels + C_sels + E_sels + S_sels 
+######## tabblock level & narrow - census & election columns are aggregated straight from their own tables ########
+        county, join = 'cast(NULL as string) as county', ''
+        if check_table(self.g.elections.tbl):
+            county = 'max(E.county) over (partition by cnty) as county'
+            join = f"""
+left join
+    (select geoid, county from {self.g.elections.tbl}) as E
+on
+    A.geoid = E.geoid"""
         query = f"""
 select
     A.geoid,
-    max(E.county) over (partition by cnty) as county,
-    {join_str(1).join(sels)},
+    {county},
+    {join_str(1).join([f'A.{c}' for c in self.cols['assignments']])},
+    coalesce(C.total_pop, 0) as total_pop,
+    S.aland,
+    S.polygon
 from
     {self.g.assignments.tbl} as A
 left join
@@ -46,15 +62,12 @@ on
 left join
     {self.g.census.tbl} as C
 on
-    A.geoid = C.geoid
-left join
-    {self.g.elections.tbl} as E
-on
-    A.geoid = E.geoid
+    A.geoid = C.geoid{join}
 """
         load_table(self.raw, query=query, preview_rows=0)
 
 
+    @traced
     def process(self):
         if self.level in ['tabblock', 'bg', 'tract', 'cnty']:
             query_temp = f"select *, substring({self.g.level}, 3) as level_temp from {self.g.assignments.tbl}"
@@ -85,8 +98,33 @@ from (
         ({query_temp})
     )
 """
-            
-        sels = [f'sum({c}) as {c}' for c in self.cols['census'] + self.cols['elections']]
+
+######## tabblock -> node map, each node taking the district holding most of its tabblocks ########
+        query_map = f"""
+select
+    geoid,
+    geoid_new,
+    max(district) over (partition by geoid_new) as district
+from (
+    select
+        *,
+        case when N = (max(N) over (partition by geoid_new)) then {self.g.district_type} else NULL end as district
+    from (
+        select
+            A.geoid,
+            A.geoid_new,
+            B.{self.g.district_type},
+            count(1) over (partition by A.geoid_new, B.{self.g.district_type}) as N
+        from (
+            {subquery(query_temp, 3)}
+            ) as A
+        left join
+            {self.raw} as B
+        on
+            A.geoid = B.geoid
+        )
+    )
+"""
         query = f"""
 select
     *,
@@ -99,33 +137,43 @@ from (
         st_perimeter(polygon) / {meters_per_mile} as perim 
     from (
         select
-            geoid_new as geoid,
-            max(county)   as county,
-            max(district) as {self.g.district_type},
-            {join_str(3).join(sels)},
-            st_union_agg(polygon) as polygon,
-            sum(aland) / {meters_per_mile**2} as aland
+            M.geoid_new as geoid,
+            max(B.county)   as county,
+            max(M.district) as {self.g.district_type},
+            sum(B.total_pop) as total_pop,
+            st_union_agg(B.polygon) as polygon,
+            sum(B.aland) / {meters_per_mile**2} as aland
         from (
-            select
-                *,
-                case when N = (max(N) over (partition by geoid_new)) then {self.g.district_type} else NULL end as district
-            from (
-                select
-                    A.geoid_new,
-                    B.*,
-                    count(1) over (partition by geoid_new, {self.g.district_type}) as N
-                from (
-                    {subquery(query_temp, 5)}
-                    ) as A
-                left join
-                    {self.raw} as B
-                on
-                    A.geoid = B.geoid
-                )
-            )
+            {subquery(query_map, 3)}
+            ) as M
+        left join
+            {self.raw} as B
+        on
+            M.geoid = B.geoid
         group by
             geoid
         )
     )
 """
-        load_table(self.tbl, query=query, preview_rows=0)
\ No newline at end of file
+        def group_query(src, cols):
+            return f"""
+select
+    M.geoid_new as geoid,
+    {join_str(1).join([f'sum(coalesce(C.{c}, 0)) as {c}' for c in cols])}
+from (
+    {subquery(query_map, 1)}
+    ) as M
+left join
+    {src} as C
+on
+    M.geoid = C.geoid
+group by
+    geoid
+"""
+        jobs = [submit(load_table, self.group('geometry'), query=query, preview_rows=0),
+                submit(load_table, self.group('census'), query=group_query(self.g.census.tbl, self.cols['census']), preview_rows=0)]
+        for yr, cols in self.cols['elections'].items():
+            jobs.append(submit(load_table, self.group(f'elections_{yr}'), query=group_query(self.g.elections.tbl, cols), preview_rows=0))
+        wait(jobs)
+######## core last - its existence marks the whole node store as complete ########
+        load_table(self.tbl, query=f"select * except (polygon, point) from {self.group('geometry')}", preview_rows=0)
@@ -0,0 +1,126 @@
+from . import *
+import multiprocessing, functools
+from .mcmc import MCMC
+
+######## Score functions take the plan's district totals (one row per district) & return one number to maximize ########
+######## Columns are the MCMC district stats (total_pop, aland, perim, polsby_popper, density), every other numeric ########
+######## node attribute summed by district, and vote_share/{election} when elections are given ########
+def mean_polsby_popper(T):
+    return T['polsby_popper'].mean()
+
+def min_polsby_popper(T):
+    return T['polsby_popper'].min()
+
+def opportunity_score(T, col, threshold=0.5):
+######## districts where col is above threshold of total_pop, plus the best share among the rest as a tie-breaker ########
+######## so bursts are rewarded for moving a near-miss district toward the threshold ########
+    share = T[col] / T['total_pop']
+    above = share > threshold
+    return above.sum() + (share[~above].max() / threshold if (~above).any() else 0)
+
+def seats_score(T, election):
+    return (T[f'vote_share/{election}'] > 0.5).sum()
+
+def opportunity(col, threshold=0.5):
+    return functools.partial(opportunity_score, col=col, threshold=threshold)
+
+def seats(election):
+    return functools.partial(seats_score, election=election)
+
+Scores = {'polsby_popper': mean_polsby_popper, 'min_polsby_popper': min_polsby_popper}
+
+
+def district_totals(M):
+    df = M.nodes_df()
+    cols = [c for c in df.select_dtypes('number').columns if c not in M.stat.columns and c != 'plan']
+    T = M.stat.drop(columns='plan').join(df.groupby(M.district_type)[cols].sum()).sort_index()
+    for j, e in enumerate(M.elections):
+        T[f'vote_share/{e}'] = M.vote_share[:, j]  # rows of vote_share follow sorted district labels
+    return T
+
+
+def burst_init(mcmc_opts, score):
+######## each worker loads the graph (and votes) once & reuses it for every burst it runs ########
+    global Burst_mcmc, Burst_score
+    Burst_mcmc = MCMC(**mcmc_opts)
+    Burst_score = score
+
+
+def burst(args):
+######## a short ReCom run from labels - returns the best plan it visited & its score ########
+    labels, seed, steps = args
+    M = Burst_mcmc
+    M.rng = np.random.default_rng(seed)
+    nx.set_node_attributes(M.graph, labels, M.district_type)
+    M.get_stats()
+    if len(M.elections) > 0:
+        M.update_votes(M.districts.keys())
+    M.partitions = [M.partition]
+######## a start plan outside pop_imbalance_tol only seeds the burst - it can't be returned as the best ########
+    best = Burst_score(district_totals(M)) if M.pop_imbalance <= M.pop_imbalance_tol else -np.inf
+    best_labels = labels
+    done = 0
+    for k in range(steps):
+        if not M.recomb():
+            break
+        done += 1
+        M.partitions.append(M.partition)
+        if M.pop_imbalance <= M.pop_imbalance_tol:
+            s = Burst_score(district_totals(M))
+            if s > best:
+                best, best_labels = s, dict(M.graph.nodes(data=M.district_type))
+    return best, best_labels, done
+
+
+@dataclasses.dataclass
+class Optimizer(Base):
+######## Short-burst optimization - many short ReCom bursts from the best plan so far, in parallel, keep the best ########
+    gpickle            : str
+    district_type      : str
+    user_name          : str
+    score              : typing.Any = 'polsby_popper'  # name in Scores or a picklable function of district totals
+    burst_length       : int = 10
+    rounds             : int = 100
+    processes          : int = None
+    random_seed        : int = 1
+    pop_imbalance_tol  : float = 10.0
+    nodes_tbl          : str = None
+    elections          : typing.Tuple = ()
+
+    def __post_init__(self):
+        if self.processes is None:
+            self.processes = multiprocessing.cpu_count()
+        if isinstance(self.score, str):
+            self.score = Scores[self.score]
+        self.mcmc_opts = {'gpickle': self.gpickle, 'district_type': self.district_type, 'max_steps': self.burst_length,
+                          'user_name': self.user_name, 'random_seed': self.random_seed, 'pop_imbalance_tol': self.pop_imbalance_tol,
+                          'nodes_tbl': self.nodes_tbl, 'elections': self.elections, 'ensemble': False, 'store_plans': False}
+        self.seed_seq = np.random.SeedSequence(self.random_seed)
+
+
+    def run(self):
+        M = MCMC(**self.mcmc_opts)
+        M.get_stats()
+        self.best_labels = dict(M.graph.nodes(data=self.district_type))
+        self.best = self.score(district_totals(M)) if M.pop_imbalance <= M.pop_imbalance_tol else -np.inf
+        self.history = [{'round': 0, 'steps': 0, 'round_best': self.best, 'best': self.best}]
+        rpt(f'short bursts of {self.burst_length} steps on {self.processes} processes - initial score {self.best:.4f}')
+        steps = 0
+        with multiprocessing.Pool(self.processes, initializer=burst_init, initargs=(self.mcmc_opts, self.score)) as pool:
+            for r in range(1, self.rounds+1):
+                seeds = [s.generate_state(1)[0] for s in self.seed_seq.spawn(self.processes)]
+                results = pool.map(burst, [(self.best_labels, s, self.burst_length) for s in seeds])
+                s, labels, _ = max(results, key=lambda x: x[0])
+                steps += sum(x[2] for x in results)
+                if s > self.best:
+                    self.best, self.best_labels = s, labels
+                self.history.append({'round': r, 'steps': steps, 'round_best': s, 'best': self.best})
+                rpt(f'round {r} - best score {self.best:.4f} after {steps} steps')
+        self.history = pd.DataFrame(self.history)
+
+######## best plan & score trace go next to the chain results ########
+        nodes = pd.Index(list(self.best_labels))
+        self.plan = pd.DataFrame({'geoid': decode_geoid(nodes), self.district_type: [self.best_labels[n] for n in nodes]})
+        self.plan.to_parquet(M.results_path / f'{M.run}_optimized_plan.parquet')
+        self.history.to_csv(M.results_path / f'{M.run}_optimized_history.csv', index=False)
+        return self
@@ -0,0 +1,76 @@
+from . import *
+import multiprocessing
+
+def propose_cut(args):
+######## One (pair, tree) proposal - runs in a worker process with its own spawned RNG stream ########
+######## Returns the two sides of a balanced cut of a random spanning tree of the merged districts, or None ########
+######## Cut edges are tried as recomb tries them - most central first, at most min(300, 20%) of them per tree. On a tree ########
+######## an edge's betweenness is (nodes below it) x (nodes above it), so that order comes from subtree sizes ########
+    nodes, edges, pops, q, P_min, P_max, pop_ideal, tol, seed, max_trees = args
+    rng = np.random.default_rng(seed)
+    H = nx.Graph()
+    H.add_nodes_from(nodes)
+    H.add_edges_from(edges)
+    pop = dict(zip(nodes, pops))
+    for i in range(max_trees):
+        for e in H.edges:
+            H.edges[e]['weight'] = rng.uniform()
+        T = nx.minimum_spanning_tree(H)
+        root = nodes[0]
+        order = list(nx.dfs_preorder_nodes(T, root))
+        pred = nx.dfs_predecessors(T, root)
+        sub = pop.copy()
+        size = dict.fromkeys(nodes, 1)
+        for n in reversed(order[1:]):
+            sub[pred[n]] += sub[n]
+            size[pred[n]] += size[n]
+        N = len(nodes)
+        central = sorted(order[1:], key=lambda n: size[n] * (N - size[n]), reverse=True)
+        for n in central[:int(min(300, 0.2*(N-1)))]:
+            s, t = sorted((sub[n], q - sub[n]))
+            imb = (max(t, P_max) - min(s, P_min)) / pop_ideal * 100
+            if imb <= tol:
+                T.remove_edge(n, pred[n])
+                side = nx.node_connected_component(T, n)
+                return tuple(sorted(side)), tuple(sorted(set(nodes) - side)), imb
+    return None
+
+
+@dataclasses.dataclass
+class Proposals(Base):
+######## Multiple-try proposals - a batch of candidate (pair, tree) proposals is evaluated in parallel ########
+######## The candidate list & its RNG streams depend only on the chain's seed, and the first valid ########
+######## never-seen candidate in list order wins, so the chain is reproducible whatever the pool timing ########
+    processes : int
+    random_seed : int = 1
+    batch     : int = 0    # candidates per round - defaults to 2 per process
+    max_trees : int = 10   # spanning trees each candidate tries
+
+    def __post_init__(self):
+        if self.batch <= 0:
+            self.batch = 2 * self.processes
+        self.seed_seq = np.random.SeedSequence(self.random_seed)
+        self.pool = multiprocessing.Pool(self.processes)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def propose(self, mcmc, pairs, tol):
+        tasks = list()
+        for d0, d1 in pairs:
+            m = list(mcmc.districts[d0]+mcmc.districts[d1])
+            H = mcmc.graph.subgraph(m)
+            if not nx.is_connected(H):
+                continue
+            P = mcmc.stat['total_pop'].copy()
+            q = P.pop(d0) + P.pop(d1)
+            pops = [H.nodes[n]['total_pop'] for n in m]
+            tasks.append(((d0, d1), (m, list(H.edges), pops, q, P.min(), P.max(), mcmc.pop_ideal, tol)))
+        for a in range(0, len(tasks), self.batch):
+            chunk = tasks[a:a+self.batch]
+            seeds = self.seed_seq.spawn(len(chunk))
+            results = self.pool.map(propose_cut, [args + (s, self.max_trees) for (_, args), s in zip(chunk, seeds)])
+            for ((d0, d1), args), res in zip(chunk, results):
+                if res is not None:
+                    yield d0, d1, res
@@ -10,11 +10,13 @@ from src import *
 from src.graph import *
 from src.mcmc import *
 from src.analysis import *
+from src.coordinator import *
 
 graph_opts = {
     'abbr'          : 'TX',
     'level'         : 'cntyvtd',
     'district_type' : 'cd',
+#     'compact'       : True,
     'election_filters' : (
         "office='President' and race='general'",
         "office='USSen' and race='general'",
@@ -76,9 +78,14 @@ mcmc_opts = {
     'pop_imbalance_tol'  : 10.0,
     'pop_imbalance_stop' : pop_imbalance_stop,
     'new_districts'      : 2,
+#     'seed_plan'          : True,
+    'compact'            : G.compact,
+#     'ess_stop'           : 1000,
     'num_colors'         : 10,
     'district_type'      : graph_opts['district_type'],
-    'gpickle'            : G.gpickle,
+    'gpickle'            : G.compaction.gpickle if G.compact else G.gpickle,
+    'nodes_tbl'          : G.nodes.tbl,
+#     'elections'          : ('President_2020_general', 'USSen_2020_general'),
 #     'gpickle'            : '/home/jupyter/redistricting_data/graph/TX/graph_TX_2020_cntyvtd_cd.gpickle'
 }
 
@@ -93,13 +100,30 @@ def f(seed):
     A.get_results()
     print(f'finished seed {seed} after {M.plan} steps with pop_imbalance={M.pop_imbalance}')
 
+######## role: local runs every seed on this machine, coordinator hands seeds out to workers on other machines ########
+######## batch runs set REDISTRICTER_ROLE (or pass the role as the first argument) & REDISTRICTING_RESULTS to a shared mount ########
+role = os.getenv('REDISTRICTER_ROLE') or (sys.argv[1] if len(sys.argv) > 1 else input(f'role - local, coordinator or worker (default=local)'))
+coordinator_port = int(os.getenv('COORDINATOR_PORT', 5555))
+coordinator_host = os.getenv('COORDINATOR_HOST')  # workers on other machines need the coordinator's address
+if role == 'worker' and coordinator_host is None:
+    coordinator_host = input(f'coordinator_host (default=localhost)')
+if not coordinator_host:
+    coordinator_host = 'localhost'
+
 start = time.time()
 seed_start = 200
 seeds_per_worker = 8
-with multiprocessing.Pool() as pool:
-    seeds = list(range(seed_start, seed_start + seeds_per_worker * pool._processes))
-    print(seeds)
-    pool.map(f, seeds)
+if role == 'coordinator':
+    seeds = list(range(seed_start, seed_start + 1000))
+    Coordinator(seeds=seeds, port=coordinator_port, done_file=results_root / f'done_{user_name}.txt').serve()
+elif role == 'worker':
+    mcmc_opts['coordinator_host'] = coordinator_host  # chains share diagnostics for cross-chain R-hat
+    run_workers(f, host=coordinator_host, port=coordinator_port)
+else:
+    with multiprocessing.Pool() as pool:
+        seeds = list(range(seed_start, seed_start + seeds_per_worker * pool._processes))
+        print(seeds)
+        pool.map(f, seeds)
 elapsed = time.time() - start
 h, m = divmod(elapsed, 3600)
 m, s = divmod(m, 60)
@@ -0,0 +1,88 @@
+from . import *
+import scipy.sparse as sp, pyarrow.parquet as pq
+
+@dataclasses.dataclass
+class Results(Base):
+    nodes      : str
+    tbl        : str
+    chunk_size : int = 2000000  # rows of the plan store (geoid x plan) per chunk
+
+    def __post_init__(self):
+        self.run = self.tbl.split(".")[-1]
+        self.abbr, self.yr, self.level, self.district_type, _, self.seed = self.run.split('_')
+        self.results_path = results_root / self.run
+        self.plans_pq = self.results_path / f'{self.run}_plans.parquet'
+        self.stats_pq = self.results_path / f'{self.run}_stats.parquet'
+        self.out_path = self.results_path / f'{self.run}_results'
+        self.attrs_path = data_path / f'results/{self.abbr}/{self.nodes.split(".")[-1]}'
+
+
+    def get_attrs(self):
+######## Node attribute matrix is downloaded once per nodes table and memory-mapped by every seed ########
+######## each version sits in a directory named by the node tables' modified times & is renamed into place complete, ########
+######## so a rebuilt nodes table gets a new matrix and seeds building at once never see half-written files ########
+        stamp = nodes_stamp(self.nodes)
+        path = self.attrs_path / cache_key(json.dumps(stamp, sort_keys=True))[:16]
+        with file_lock(self.attrs_path / 'lock'):
+            if not path.exists():
+                rpt(f'getting node attributes')
+                cols = [c for c in node_cols(self.nodes, groups=('census', 'elections')) if c not in Levels + District_types + ['county', 'aland', 'perim', 'polsby_popper', 'density', 'polygon', 'point']]
+                df = read_nodes(self.nodes, cols=cols).sort_values('geoid')
+                tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+                shutil.rmtree(tmp, ignore_errors=True)
+                tmp.mkdir(parents=True)
+                np.save(tmp / 'attrs.npy', df[cols].to_numpy(dtype='float64'))
+                pd.DataFrame({'geoid': encode_geoid(df['geoid'])}).to_parquet(tmp / 'index.parquet', index=False)
+                pd.Series(cols, name='col').to_frame().to_parquet(tmp / 'cols.parquet')
+                (tmp / 'source.json').write_text(json.dumps(stamp))
+                os.rename(tmp, path)
+######## older versions go - seeds still using one keep their memory map, the files vanish only when it closes ########
+                for old in self.attrs_path.iterdir():
+                    if old.is_dir() and old != path:
+                        shutil.rmtree(old, ignore_errors=True)
+            self.attrs = np.load(path / 'attrs.npy', mmap_mode='r')
+            self.geoids = pd.Index(pd.read_parquet(path / 'index.parquet')['geoid'])
+            self.cols = pd.read_parquet(path / 'cols.parquet')['col'].tolist()
+        return self
+
+
+    def stream_plans(self):
+######## Yield whole plans in chunks - rows of a plan that straddle a chunk boundary are carried to the next chunk ########
+        carry = None
+        for batch in pq.ParquetFile(self.plans_pq).iter_batches(batch_size=self.chunk_size):
+            df = batch.to_pandas()
+            if carry is not None:
+                df = pd.concat([carry, df], ignore_index=True)
+            last = df['plan'].iloc[-1]
+            mask = df['plan'] == last
+            carry = df[mask]
+            if (~mask).any():
+                yield df[~mask]
+        if carry is not None and len(carry) > 0:
+            yield carry
+
+
+    def tally(self, df):
+######## District totals for every plan in the chunk as one sparse (plan, district) x node product with the node x attribute matrix ########
+        node = self.geoids.get_indexer(df['geoid'])
+        assert (node >= 0).all(), 'plan store has geoids missing from nodes table'
+        keys = pd.MultiIndex.from_arrays([df['plan'], df[self.district_type]])
+        row, uniq = pd.factorize(keys)
+        M = sp.csr_matrix((np.ones(len(row)), (row, node)), shape=(len(uniq), len(self.geoids)))
+        totals = pd.DataFrame(M @ self.attrs, columns=self.cols)
+        totals.insert(0, self.district_type, uniq.get_level_values(1))
+        totals.insert(0, 'plan', uniq.get_level_values(0))
+        return totals
+
+
+    def get(self):
+        self.get_attrs()
+        stats = pd.read_parquet(self.stats_pq)
+        shutil.rmtree(self.out_path, ignore_errors=True)
+        self.out_path.mkdir(parents=True, exist_ok=True)
+        for i, df in enumerate(self.stream_plans()):
+            rpt(f'chunk {i}')
+            totals = self.tally(df)
+            totals = stats.merge(totals, on=['plan', self.district_type], how='right').sort_values(['plan', self.district_type])
+            totals.to_parquet(self.out_path / f'part_{str(i).rjust(5, "0")}.parquet', index=False)
+        return self
@@ -0,0 +1,55 @@
+from . import *
+
+def tree_bipartition(H, target, rest_target, eps, rng, pop_col='total_pop', max_trees=1000):
+######## Cut a random spanning tree of H into a piece with pop ~ target & a remainder with pop ~ rest_target ########
+######## Both pieces of a tree cut are connected, so any balanced cut edge gives two valid districts ########
+    pop = dict(H.nodes(data=pop_col))
+    total = sum(pop.values())
+    ok = lambda p, t: abs(p - t) <= eps * t
+    for i in range(max_trees):
+        for e in H.edges:
+            H.edges[e]['weight'] = rng.uniform()
+        T = nx.minimum_spanning_tree(H)  # random weights so this is really a random spanning tree
+        root = next(iter(T.nodes))
+        order = list(nx.dfs_preorder_nodes(T, root))
+        pred = nx.dfs_predecessors(T, root)
+        sub = pop.copy()  # population of the subtree hanging below each node
+        for n in reversed(order[1:]):
+            sub[pred[n]] += sub[n]
+        cands = list()
+        for n in order[1:]:
+            if ok(sub[n], target) and ok(total - sub[n], rest_target):
+                cands.append((n, True))
+            if ok(total - sub[n], target) and ok(sub[n], rest_target):
+                cands.append((n, False))
+        if len(cands) > 0:
+            n, below = cands[rng.integers(len(cands))]
+            T.remove_edge(n, pred[n])
+            side = nx.node_connected_component(T, n)
+            return side if below else set(H.nodes) - side
+    return None
+
+
+def recursive_tree_part(graph, num_districts, pop_imbalance_tol, rng, pop_col='total_pop', max_restarts=100):
+######## Split off one district at a time until num_districts connected districts remain ########
+######## Every district ends within +/- tol/2 % of ideal, so pop_imbalance < pop_imbalance_tol from step 0 ########
+    pop_total = sum(x for n, x in graph.nodes(data=pop_col))
+    pop_ideal = pop_total / num_districts
+    eps = 0.95 * pop_imbalance_tol / 200
+    for restart in range(max_restarts):
+        remaining = set(graph.nodes)
+        labels = dict()
+        for k in range(1, num_districts):
+            H = graph.subgraph(remaining).copy()
+            side = tree_bipartition(H, pop_ideal, (num_districts - k) * pop_ideal, eps, rng, pop_col)
+            if side is None:
+                break
+            for n in side:
+                labels[n] = str(k)
+            remaining -= side
+        else:
+            for n in remaining:
+                labels[n] = str(num_districts)
+            return labels
+    raise Exception(f'could not find a seed plan with {num_districts} districts within {pop_imbalance_tol}% after {max_restarts} restarts')
+
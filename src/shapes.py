@@ -30,26 +30,34 @@ class Shapes(Variable):
         return self
 
 
+    @traced
     def process_raw(self):
         for fn in self.zipfile.namelist():
             self.zipfile.extract(fn)
         a = 0
         chunk_size = 50000
+        jobs = list()
         while True:
             rpt(f'starting row {a}')
             df = lower(gpd.read_file(self.path, rows=slice(a, a+chunk_size)))
             df.columns = [x[:-2] if x[-2:].isnumeric() else x for x in df.columns]
             df = df[['geoid', 'aland', 'geometry']]#, 'intptlat', 'intptlon']]
             df['geometry'] = df['geometry'].apply(lambda p: orient(p, -1))
-            load_table(self.raw, df=df.to_wkb(), overwrite=a==0)
+######## first chunk truncates, later chunks append in the background while the next chunk is read ########
+            if a == 0:
+                load_table(self.raw, df=df.to_wkb(), overwrite=True)
+            else:
+                jobs.append(submit(load_table, self.raw, df=df.to_wkb(), overwrite=False))
             if df.shape[0] < chunk_size:
                 break
             else:
                 a += chunk_size
+        wait(jobs)
         for fn in self.zipfile.namelist():
             os.unlink(fn)
 
 
+    @traced
     def process(self):                
         query = f"""
 select
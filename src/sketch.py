@@ -0,0 +1,178 @@
+from . import *
+import scipy.sparse as sp, scipy.sparse.csgraph as csgraph
+
+######## A plan of connected districts is determined by its cut edges (edges joining two districts), so plans are compared ########
+######## by the Jaccard similarity of their cut-edge sets, estimated from MinHash signatures - the fraction of equal entries ########
+######## Edges are hashed from their geoid codes with a fixed seed, so signatures from different chains are comparable ########
+
+def splitmix64(x):
+    with np.errstate(over='ignore'):
+        x = np.asarray(x, dtype='uint64') + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def edge_hashes(u, v, num_hashes, hash_seed=0):
+######## edges x num_hashes uint32 - one independent hash of every edge per signature entry ########
+    u, v = np.minimum(u, v).astype('uint64'), np.maximum(u, v).astype('uint64')
+    with np.errstate(over='ignore'):
+        key = splitmix64(u) ^ (v * np.uint64(0x9E3779B97F4A7C15))
+    seeds = splitmix64(np.uint64(hash_seed) * np.uint64(num_hashes) + np.arange(num_hashes, dtype='uint64'))
+    return (splitmix64(key[:, None] ^ seeds[None, :]) >> np.uint64(32)).astype('uint32')
+
+
+def similarity(a, b):
+######## estimated Jaccard similarity of cut-edge sets - works row-wise on stacks of signatures ########
+    return (np.asarray(a) == np.asarray(b)).mean(axis=-1)
+
+
+@dataclasses.dataclass
+class PlanSketch(Base):
+######## MinHash signature of the current plan, updated from the nodes that moved since the last call ########
+######## Only edges touching moved nodes are re-examined; a signature entry is recomputed over the cut ########
+######## only when the edge holding its minimum stops being cut ########
+    graph         : typing.Any
+    district_type : str
+    num_hashes    : int = 64
+    hash_seed     : int = 0
+
+    def __post_init__(self):
+        self.nodes = list(self.graph.nodes)
+        idx = {n: i for i, n in enumerate(self.nodes)}
+        E = np.array([(idx[u], idx[v]) for u, v in self.graph.edges], dtype='int64').reshape(-1, 2)
+        self.eu, self.ev = E[:, 0], E[:, 1]
+        codes = np.array(self.nodes, dtype='int64')
+        self.H = edge_hashes(codes[self.eu], codes[self.ev], self.num_hashes, self.hash_seed)
+        e = np.arange(len(E))
+        self.incidence = sp.csr_matrix((np.ones(2*len(E), dtype='int8'), (np.concatenate([self.eu, self.ev]), np.concatenate([e, e]))), shape=(len(self.nodes), len(E)))
+        self.labels = self.get_labels()
+        self.cut = self.labels[self.eu] != self.labels[self.ev]
+        self.sig = self.minhash(self.cut)
+        self.recomputed = 0
+
+
+    def get_labels(self):
+        return np.array([d for n, d in self.graph.nodes(data=self.district_type)], dtype=object)
+
+
+    def minhash(self, mask, cols=slice(None)):
+        H = self.H[mask][:, cols]
+        return H.min(axis=0) if len(H) > 0 else np.full(H.shape[1], np.iinfo('uint32').max, dtype='uint32')
+
+
+    def update(self):
+        labels = self.get_labels()
+        moved = np.flatnonzero(labels != self.labels)
+        if len(moved) > 0:
+            t = np.unique(self.incidence[moved].indices)
+            new = labels[self.eu[t]] != labels[self.ev[t]]
+            old = self.cut[t]
+            added, removed = t[new & ~old], t[old & ~new]
+            self.cut[t] = new
+            if len(removed) > 0:
+                stale = (self.H[removed] == self.sig).any(axis=0)
+                if stale.any():
+                    self.sig[stale] = self.minhash(self.cut, stale)
+                    self.recomputed += stale.sum()
+            if len(added) > 0:
+                self.sig = np.minimum(self.sig, self.H[added].min(axis=0))
+            self.labels = labels
+        return self.sig.copy()
+
+
+def band_hashes(sigs, bands):
+######## plans x bands uint64 - plans agreeing on every entry of a band share its hash ########
+    r = sigs.shape[1] // bands
+    B = np.zeros((len(sigs), bands), dtype='uint64')
+    for b in range(bands):
+        for j in range(b*r, (b+1)*r):
+            B[:, b] = splitmix64(B[:, b] ^ sigs[:, j].astype('uint64'))
+    return B
+
+
+@dataclasses.dataclass
+class SketchIndex(Base):
+######## LSH over the saved signatures of many chains - near-duplicate plans, their clusters, diversity & representatives ########
+######## Plans sharing a band are candidates; a candidate joins its bucket's first plan when their estimated similarity ########
+######## is at least threshold. Clusters are connected components of those links. Nothing but the signatures is loaded ########
+    runs          : typing.Tuple  # run names, as in results/{run}
+    bands         : int = 8       # candidates are found above roughly (1/bands)^(bands/num_hashes)
+    threshold     : float = 0.8
+    sample_pairs  : int = 100000
+    random_seed   : int = 0
+
+    def __post_init__(self):
+        self.rng = np.random.default_rng(self.random_seed)
+
+
+    def load(self):
+        L = [np.load(results_root / f'{run}/{run}_sketches.npy') for run in self.runs]
+        self.sigs = np.concatenate(L)
+        self.ids = pd.DataFrame({'run': np.repeat(np.arange(len(L)), [len(x) for x in L]), 'plan': np.concatenate([np.arange(len(x)) for x in L])})
+        assert self.sigs.shape[1] % self.bands == 0, f'bands={self.bands} must divide num_hashes={self.sigs.shape[1]}'
+        return self
+
+
+    def near_duplicates(self):
+######## verified (plan, bucket representative) links - linear in plans per band, never all pairs ########
+        B = band_hashes(self.sigs, self.bands)
+        links = list()
+        for b in range(self.bands):
+            order = np.argsort(B[:, b], kind='stable')
+            h = B[order, b]
+            start = np.concatenate([[True], h[1:] != h[:-1]])
+            rep = order[np.flatnonzero(start)[np.cumsum(start) - 1]]
+            keep = order != rep
+            a, r = order[keep], rep[keep]
+            s = similarity(self.sigs[a], self.sigs[r])
+            links.append(pd.DataFrame({'a': a, 'b': r, 'similarity': s})[s >= self.threshold])
+        self.links = pd.concat(links, ignore_index=True).drop_duplicates(['a', 'b'])
+        return self.links
+
+
+    def clusters(self):
+        N = len(self.sigs)
+        G = sp.csr_matrix((np.ones(len(self.links)), (self.links['a'], self.links['b'])), shape=(N, N))
+        self.num_clusters, self.ids['cluster'] = csgraph.connected_components(G, directed=False)
+        return self.ids
+
+
+    def representatives(self, max_sample=256):
+######## per cluster, the sampled member most similar on average to the rest of the sample - singletons represent themselves ########
+        size = self.ids.groupby('cluster').size()
+        R = self.ids[self.ids['cluster'].map(size) == 1].reset_index().assign(size=1, mean_similarity=1.0)
+        L = list()
+        for c, grp in self.ids[self.ids['cluster'].map(size) > 1].groupby('cluster'):
+            idx = grp.index.to_numpy()
+            ref = idx if len(idx) <= max_sample else self.rng.choice(idx, max_sample, replace=False)
+            score = np.array([similarity(self.sigs[i], self.sigs[ref]).mean() for i in ref])
+            L.append({'cluster': c, 'size': len(idx), 'index': ref[score.argmax()], 'mean_similarity': score.max()})
+        L = pd.DataFrame(L, columns=['cluster', 'size', 'index', 'mean_similarity']).join(self.ids[['run', 'plan']], on='index')
+        self.reps = pd.concat([L, R], ignore_index=True)[['cluster', 'size', 'run', 'plan', 'mean_similarity']].sort_values('size', ascending=False, ignore_index=True)
+        self.reps['run'] = np.array(self.runs)[self.reps['run']]
+        return self.reps
+
+
+    def diversity(self):
+######## mean estimated similarity of random plan pairs, within & across runs, and effective number of clusters ########
+        i, j = self.rng.integers(len(self.sigs), size=(2, self.sample_pairs))
+        s = similarity(self.sigs[i], self.sigs[j])
+        same = self.ids['run'].to_numpy()[i] == self.ids['run'].to_numpy()[j]
+        p = self.ids['cluster'].value_counts(normalize=True).to_numpy()
+        self.summary = pd.Series({'plans': len(self.sigs), 'runs': len(self.runs), 'near_duplicate_links': len(self.links),
+            'clusters': self.num_clusters, 'effective_clusters': np.exp(-(p * np.log(p)).sum()),
+            'mean_similarity': s.mean(), 'mean_similarity_within_runs': s[same].mean() if same.any() else np.nan,
+            'mean_similarity_across_runs': s[~same].mean() if (~same).any() else np.nan})
+        return self.summary
+
+
+    def get(self):
+        self.load()
+        rpt(f'lsh over {len(self.sigs)} plans from {len(self.runs)} runs')
+        self.near_duplicates()
+        self.clusters()
+        self.representatives()
+        self.diversity()
+        print(self.summary.to_string())
+        return self
@@ -0,0 +1,88 @@
+from . import *
+import scipy.sparse as sp, scipy.sparse.linalg as spla
+try:
+    from sksparse.cholmod import cholesky  # CHOLMOD when scikit-sparse is installed - else LU from scipy
+except ImportError:
+    cholesky = None
+
+def logdet_spd(M):
+######## log determinant of a sparse symmetric positive definite matrix ########
+    if cholesky is not None:
+        return cholesky(M.tocsc()).logdet()
+    lu = spla.splu(M.tocsc(), permc_spec='MMD_AT_PLUS_A')
+    return np.log(np.abs(lu.U.diagonal())).sum()  # L has unit diagonal
+
+
+def uniform_spanning_tree(H, rng):
+######## Wilson's algorithm - loop-erased random walks give an exactly uniform spanning tree ########
+######## (random-weight minimum spanning trees, as recomb uses, are not uniform) ########
+    nodes = list(H.nodes)
+    nbrs = {n: list(H.neighbors(n)) for n in nodes}
+    in_tree = {nodes[rng.integers(len(nodes))]}
+    nxt = dict()
+    T = nx.Graph()
+    T.add_nodes_from(nodes)
+    for u in rng.permutation(len(nodes)):
+        u = nodes[u]
+        v = u
+        while v not in in_tree:
+            nxt[v] = nbrs[v][rng.integers(len(nbrs[v]))]
+            v = nxt[v]
+        v = u
+        while v not in in_tree:
+            in_tree.add(v)
+            T.add_edge(v, nxt[v])
+            v = nxt[v]
+    return T
+
+
+def balanced_cuts(T, pop, q, P_min, P_max, pop_ideal, tol):
+######## every tree edge whose removal leaves the plan within tol, as the node set below it - deterministic order ########
+    root = min(T.nodes)
+    order = list(nx.dfs_preorder_nodes(T, root))
+    pred = nx.dfs_predecessors(T, root)
+    sub = {n: pop[n] for n in order}
+    for n in reversed(order[1:]):
+        sub[pred[n]] += sub[n]
+    cuts = list()
+    for n in order[1:]:
+        s, t = sorted((sub[n], q - sub[n]))
+        if (max(t, P_max) - min(s, P_min)) / pop_ideal * 100 <= tol:
+            cuts.append((n, pred[n]))
+    return cuts
+
+
+@dataclasses.dataclass
+class TreeCounter(Base):
+######## log spanning-tree counts of district subgraphs = logdet of the reduced Laplacian (matrix-tree theorem) ########
+######## Results are cached by node set, so districts that did not change are never factored again ########
+######## Districts above approx_above nodes use the Hadamard bound tau <= prod(deg) / max(deg) instead ########
+    graph        : typing.Any
+    approx_above : int = 5000
+    cache_size   : int = 10000
+
+    def __post_init__(self):
+        self.idx = {n: i for i, n in enumerate(self.graph.nodes)}
+        self.adj = nx.to_scipy_sparse_array(self.graph, nodelist=list(self.graph.nodes), weight=None, format='csr')
+        self.cache = dict()
+        self.hits = 0
+
+    def __call__(self, nodes):
+        key = hash(tuple(sorted(nodes)))
+        if key in self.cache:
+            self.hits += 1
+            return self.cache[key]
+        i = np.array([self.idx[n] for n in nodes])
+        A = self.adj[i][:, i]
+        deg = np.asarray(A.sum(axis=1)).ravel()
+        if len(i) == 1:
+            x = 0.0
+        elif len(i) > self.approx_above:
+            x = np.log(deg).sum() - np.log(deg.max())
+        else:
+            L = (sp.diags(deg) - A).tocsr()
+            x = logdet_spd(L[1:, 1:])  # any row & column may go
+        if len(self.cache) >= self.cache_size:
+            self.cache.pop(next(iter(self.cache)))  # oldest first
+        self.cache[key] = x
+        return x
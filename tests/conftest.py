@@ -0,0 +1,32 @@
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import pytest
+import src
+from fake_bigquery import FakeClient
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+######## every BigQuery call goes to an in-memory warehouse & every cache under tmp_path ########
+    client = FakeClient()
+    monkeypatch.setattr(src, 'data_path', tmp_path / 'data')
+    monkeypatch.setattr(src, 'cache_path', tmp_path / 'data/cache')
+    old = src.bqclient, src.bqstorage
+    src.set_client(client)
+    yield client
+    src.set_client(*old)
+
+
+@pytest.fixture
+def lattice_nodes(tmp_path, monkeypatch):
+######## a 6x6 lattice of 0.01 degree squares as the nodes table the Geometry cache is built from - row i, column j ########
+    import shapely.geometry, src.maps
+    from src.fixtures import lattice
+    df = lattice(36)
+    df['polygon'] = [shapely.geometry.box(j / 100, i / 100, (j+1) / 100, (i+1) / 100).wkt for i, j in zip(df['i'], df['j'])]
+    df = df.assign(density=1.0, perim=4.0, polsby_popper=78.5)
+    monkeypatch.setattr(src.maps, 'data_path', tmp_path)
+    monkeypatch.setattr(src.maps, 'nodes_stamp', lambda tbl: {tbl: '1'})
+    monkeypatch.setattr(src.maps, 'read_nodes', lambda tbl, cols, groups=None: df[['geoid'] + cols].copy())
+    return df
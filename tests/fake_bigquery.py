@@ -0,0 +1,81 @@
+import re, io, time, types, datetime
+import pandas as pd
+import google.api_core.exceptions
+
+######## In-memory stand-in for bigquery.Client - tables are DataFrames and queries understand ########
+######## select <cols | *> from <tbl> [limit n] [offset m], which is all the helpers under test issue ########
+
+class FakeJob():
+    def __init__(self, df=None, job_type='query', output_rows=None):
+        self.df, self.job_type, self.output_rows = df, job_type, output_rows
+        self.job_id = f'fake_{time.perf_counter_ns()}'
+        self.total_bytes_processed = self.total_bytes_billed = self.slot_millis = 0
+        self.created = self.ended = datetime.datetime.now()
+
+    def result(self):
+        return self
+
+    def to_dataframe(self, **kwargs):
+        if self.df is None:
+            raise ValueError('job has no result rows')
+        return self.df.copy()
+
+
+class FakeClient():
+    def __init__(self):
+        self.tables = dict()
+        self.modified = dict()
+        self.queries = list()
+        self.listed = list()
+
+    def put(self, tbl, df):
+        self.tables[tbl] = df.reset_index(drop=True).copy()
+        self.modified[tbl] = datetime.datetime.now(datetime.timezone.utc)
+
+    def get_table(self, tbl):
+        if tbl not in self.tables:
+            raise google.api_core.exceptions.NotFound(tbl)
+        schema = [types.SimpleNamespace(name=c) for c in self.tables[tbl].columns]
+        return types.SimpleNamespace(table_id=tbl.split('.')[-1], modified=self.modified[tbl], schema=schema)
+
+    def list_tables(self, ds):
+        self.listed.append(ds)
+        return [types.SimpleNamespace(table_id=t.split('.')[-1]) for t in self.tables if t.rsplit('.', 1)[0] == ds]
+
+    def delete_table(self, tbl, not_found_ok=True):
+        if tbl not in self.tables and not not_found_ok:
+            raise google.api_core.exceptions.NotFound(tbl)
+        self.tables.pop(tbl, None)
+        self.modified.pop(tbl, None)
+
+    def write(self, tbl, df, job_config=None):
+        append = getattr(job_config, 'write_disposition', None) == 'WRITE_APPEND' and tbl in self.tables
+        self.put(tbl, pd.concat([self.tables[tbl], df]) if append else df)
+        return FakeJob(job_type='load', output_rows=len(df))
+
+    def load_table_from_dataframe(self, df, tbl, job_config=None):
+        return self.write(tbl, df, job_config)
+
+    def load_table_from_file(self, f, tbl, job_config=None):
+        sep = getattr(job_config, 'field_delimiter', None) or ','
+        schema = getattr(job_config, 'schema', None)
+        names = None if not schema else [s['name'] if isinstance(s, dict) else s.name for s in schema]
+        df = pd.read_csv(io.BytesIO(f.read()), sep=sep, dtype=str, header=None if names else 'infer', names=names)
+        return self.write(tbl, df, job_config)
+
+    def query(self, query, job_config=None):
+        self.queries.append(query)
+        m = re.fullmatch(r'\s*select\s+(.+?)\s+from\s+([\w-]+\.\w+\.\w+)(?:\s+limit\s+(\d+))?(?:\s+offset\s+(\d+))?\s*', query, re.S | re.I)
+        assert m is not None, f'fake client cannot run {query}'
+        cols, tbl, limit, offset = m.groups()
+        if tbl not in self.tables:
+            raise google.api_core.exceptions.NotFound(tbl)
+        df = self.tables[tbl]
+        if cols.strip() != '*':
+            df = df[[c.strip() for c in cols.split(',')]]
+        start = int(offset or 0)
+        df = df.iloc[start: None if limit is None else start + int(limit)].reset_index(drop=True)
+        destination = getattr(job_config, 'destination', None)
+        if destination is not None:
+            return self.write(destination, df, job_config)
+        return FakeJob(df)
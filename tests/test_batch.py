@@ -0,0 +1,49 @@
+import pyarrow as pa, pyarrow.parquet as pq
+import src.batch
+from src import Stages
+from src.batch import Batch, State_blocks, default_blocks
+
+
+def make(jobs, tmp_path, monkeypatch):
+    monkeypatch.setattr(src.batch, 'data_path', tmp_path)
+    return Batch(jobs, cpus=4, mem_gb=16)
+
+
+def test_shared_stages_are_deduplicated(tmp_path, monkeypatch):
+    b = make([{'abbr': 'TX', 'level': 'tract'}, {'abbr': 'TX', 'level': 'cntyvtd'}], tmp_path, monkeypatch)
+    stages = [t['stage'] for t in b.tasks.values()]
+    assert all(stages.count(s) == 1 for s in ['crosswalks', 'assignments', 'shapes', 'census', 'elections'])
+    assert stages.count('nodes') == 2 and stages.count('graph') == 2
+
+
+def test_election_filters_split_elections_and_downstream(tmp_path, monkeypatch):
+    b = make([{'abbr': 'TX'}, {'abbr': 'TX', 'election_filters': ("office='President'",)}], tmp_path, monkeypatch)
+    stages = [t['stage'] for t in b.tasks.values()]
+    assert stages.count('census') == 1
+    assert all(stages.count(s) == 2 for s in ['elections', 'nodes', 'graph'])
+
+
+def test_tasks_chain_through_stages(tmp_path, monkeypatch):
+    b = make([{'abbr': 'TX'}, {'abbr': 'CA'}], tmp_path, monkeypatch)
+    for k, t in b.tasks.items():
+        i = Stages.index(t['stage'])
+        if i == 0:
+            assert t['deps'] == set()
+        else:
+            [d] = t['deps']
+            assert d[0] == k[0] and b.tasks[d]['stage'] == Stages[i-1]
+
+
+def test_blocks_fall_back_to_the_static_table(tmp_path, monkeypatch):
+    b = make([{'abbr': 'TX'}], tmp_path, monkeypatch)
+    assert b.blocks('TX') == State_blocks['TX']
+    assert b.blocks('ZZ') == default_blocks
+    assert b.estimate(b.tasks[b.task_key(b.jobs[0], 'graph')])['mem_gb'] > b.estimate({'job': {'abbr': 'WY'}, 'stage': 'graph'})['mem_gb']
+
+
+def test_blocks_read_the_assignments_parquet(tmp_path, monkeypatch):
+    b = make([{'abbr': 'TX'}], tmp_path, monkeypatch)
+    (tmp_path / 'assignments/TX').mkdir(parents=True)
+    pq.write_table(pa.table({'geoid': list(range(1234))}), tmp_path / 'assignments/TX/assignments_TX_2020.parquet')
+    pq.write_table(pa.table({'geoid': list(range(7))}), tmp_path / 'assignments/TX/assignments_TX_2020_parent.parquet')
+    assert b.blocks('TX') == 1234
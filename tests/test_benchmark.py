@@ -0,0 +1,24 @@
+import socket
+import google.auth
+import src, src.fixtures, src.benchmark
+from src.benchmark import bench_stage
+
+
+def test_fixture_pipeline_runs_offline(fake, tmp_path, monkeypatch):
+######## every ingest stage on a tiny synthetic state with sockets & credentials disabled ########
+    def offline(*args, **kwargs):
+        raise OSError('network access in an offline test')
+    monkeypatch.setattr(socket.socket, 'connect', offline)
+    monkeypatch.setattr(google.auth, 'default', offline)
+    for module in [src.fixtures, src.benchmark]:
+        monkeypatch.setattr(module, 'data_path', src.data_path)
+    monkeypatch.chdir(tmp_path)
+
+    zips = src.fixtures.write_fixtures(blocks=400)
+    assert src.get_state('ZZ')['fips'] == '99'
+    for stage in ['crosswalks', 'assignments', 'shapes', 'census', 'elections']:
+        r = bench_stage(('ZZ', '99', stage, 400))
+        assert r['stage'] == stage and r['input_mb'] > 0
+        assert zips[stage].exists()
+    assert r['rows_uploaded'] > 0
+    assert len(list((src.data_path / 'benchmark/warehouse/ZZ_400').glob('*'))) > 0
@@ -0,0 +1,95 @@
+import pandas as pd
+import src
+
+
+def test_get_meta_goes_through_the_client(fake):
+    tbl = 'proj.ds.nodes'
+    assert src.check_table(tbl) is False
+    fake.put(tbl, pd.DataFrame({'geoid': ['1', '2'], 'total_pop': [5, 7]}))
+    src.invalidate(tbl)
+    meta = src.get_meta(tbl)
+    assert meta['exists'] is True
+    assert src.get_cols(tbl) == ['total_pop']
+
+
+def test_load_table_writes_to_the_client_and_invalidates_meta(fake):
+    tbl = 'proj.ds.plans'
+    src.load_table(tbl, df=pd.DataFrame({'geoid': ['1'], 'cd': ['1']}))
+    assert src.get_cols(tbl) == ['cd']
+    src.load_table(tbl, df=pd.DataFrame({'geoid': ['1', '2'], 'cd': ['1', '2'], 'plan': [0, 0]}))
+    assert src.get_cols(tbl) == ['cd', 'plan']
+    pd.testing.assert_frame_equal(fake.tables[tbl], pd.DataFrame({'geoid': ['1', '2'], 'cd': ['1', '2'], 'plan': [0, 0]}))
+
+
+def test_run_query_goes_through_the_client_and_caches(fake):
+    tbl = 'proj.ds.stats'
+    df = pd.DataFrame({'plan': [0, 1, 2], 'pop_imbalance': [3.0, 2.0, 1.0]})
+    src.load_table(tbl, df=df)
+    query = f'select plan, pop_imbalance from {tbl}'
+    pd.testing.assert_frame_equal(src.run_query(query), df)
+    assert len(fake.queries) == 1
+    pd.testing.assert_frame_equal(src.run_query(query), df)
+    assert len(fake.queries) == 1  # served from the result cache
+    src.load_table(tbl, df=df.head(2))
+    pd.testing.assert_frame_equal(src.run_query(query), df.head(2))
+    assert len(fake.queries) == 2  # the table changed, so the cached result is stale
+
+
+def test_changes_made_elsewhere_are_seen(fake, monkeypatch):
+    tbl = 'proj.ds.nodes'
+    assert src.check_table(tbl) is False
+    fake.put(tbl, pd.DataFrame({'geoid': ['1'], 'total_pop': [5]}))  # another machine creates the table
+    monkeypatch.setattr(src, 'meta_ttl', 0)
+    assert src.check_table(tbl) is True
+    query = f'select geoid, total_pop from {tbl}'
+    assert src.run_query(query)['total_pop'].tolist() == [5]
+    fake.put(tbl, pd.DataFrame({'geoid': ['1'], 'total_pop': [9]}))  # ... and rewrites it
+    assert src.run_query(query)['total_pop'].tolist() == [9]
+
+
+def test_uncacheable_results_are_returned(fake, monkeypatch):
+    tbl = 'proj.ds.stats'
+    src.load_table(tbl, df=pd.DataFrame({'plan': [0]}))
+    def fail(*args, **kwargs):
+        raise TypeError('no parquet form')
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', fail)
+    assert src.run_query(f'select plan from {tbl}')['plan'].tolist() == [0]
+
+
+def test_node_groups_lists_each_dataset_once(fake):
+    core = 'proj.ds.nodes_TX_2020_tract_cd'
+    fake.put(core, pd.DataFrame({'geoid': ['1']}))
+    fake.put(core + '_census', pd.DataFrame({'geoid': ['1'], 'total_pop': [5]}))
+    assert src.node_groups(core) == {'census': core + '_census'}
+    assert src.node_groups(core) == {'census': core + '_census'}
+    assert fake.listed == ['proj.ds']
+    src.load_table(core + '_geometry', df=pd.DataFrame({'geoid': ['1'], 'aland': [1.0]}))
+    assert sorted(src.node_groups(core)) == ['census', 'geometry']
+    src.delete_table(core + '_census')
+    assert sorted(src.node_groups(core)) == ['geometry']
+    assert fake.listed == ['proj.ds'] * 3
+
+
+def test_load_table_span_counts_rows_once(fake):
+    src.load_table('proj.ds.plans', df=pd.DataFrame({'geoid': ['1', '2', '3'], 'cd': ['1', '1', '2']}))
+    s = [s for s in src.Spans if s['name'] == 'load_table'][-1]
+    assert s['rows_in'] == 3
+    assert s['peak_rss_growth_gb'] >= 0 and s['process_peak_rss_gb'] >= s['peak_rss_growth_gb']
+
+
+def test_spans_keep_only_the_most_recent(monkeypatch):
+    monkeypatch.setattr(src, 'Spans', src.collections.deque(maxlen=3))
+    for k in range(5):
+        with src.span(f'step {k}'):
+            pass
+    assert [s['name'] for s in src.Spans] == ['step 2', 'step 3', 'step 4']
+
+
+def test_overwrite_applies_to_a_passed_job_config(fake):
+    tbl = 'proj.ds.plans'
+    df = pd.DataFrame({'geoid': ['1'], 'cd': ['1']})
+    src.load_table(tbl, df=df)
+    src.load_table(tbl, df=df, overwrite=False, job_config=src.bigquery.LoadJobConfig())
+    assert len(fake.tables[tbl]) == 2
+    src.load_table(tbl, df=df, job_config=src.bigquery.LoadJobConfig(write_disposition='WRITE_APPEND'))
+    assert len(fake.tables[tbl]) == 1
@@ -0,0 +1,33 @@
+import networkx as nx
+from src.compaction import compact_graph
+
+
+def cycle_graph(pops):
+######## a cycle of unit squares, all in district 1 ########
+    G = nx.cycle_graph(len(pops))
+    for n, p in enumerate(pops):
+        G.nodes[n].update({'cd': '1', 'total_pop': p, 'aland': 1.0, 'perim': 4.0})
+    nx.set_edge_attributes(G, 1.0, 'shared_perim')
+    return G
+
+
+def test_only_enclaves_merge_by_default():
+    G = cycle_graph([5, 6, 0, 3])
+    G.add_edge(0, 4, shared_perim=1.0)
+    G.add_edge(4, 5, shared_perim=1.0)
+    G.nodes[4].update({'cd': '1', 'total_pop': 2, 'aland': 1.0, 'perim': 4.0})
+    G.nodes[5].update({'cd': '1', 'total_pop': 1, 'aland': 1.0, 'perim': 4.0})
+    H, node_map = compact_graph(G, 'cd')
+######## the dangling path 0-4-5 folds into 0 - the zero-population node 2 on the cycle is kept ########
+    assert sorted(H) == [0, 1, 2, 3]
+    assert node_map[4] == node_map[5] == 0
+    assert H.nodes[0]['total_pop'] == 8 and H.nodes[0]['perim'] == 8.0
+
+
+def test_zero_pop_merges_only_when_asked():
+    G = cycle_graph([5, 0, 7, 3])
+    H, node_map = compact_graph(G, 'cd')
+    assert len(H) == 4
+    H, node_map = compact_graph(G, 'cd', zero_pop=True)
+    assert len(H) == 3 and node_map[1] in (0, 2)
+    assert sum(nx.get_node_attributes(H, 'total_pop').values()) == 15
@@ -0,0 +1,48 @@
+import networkx as nx, pandas as pd
+from src import encode_geoid
+from src.contraction import level_mapping, contract_graph
+
+######## county 001 is split between districts 1 & 2, county 003 lies entirely in district 2 ########
+Blocks = ['480010001001000', '480010001001001', '480010002001000', '480010002001001', '480030001001000', '480030001001001']
+Districts = ['1', '1', '2', '2', '2', '2']
+
+
+def assignments():
+    return pd.DataFrame({'geoid': Blocks, 'cnty': [g[:5] for g in Blocks], 'cd': Districts})
+
+
+def tabblock_graph():
+######## as Graph builds it with county_line=True - nodes drop the state fips & county 003 is one node ########
+    nodes = [g[2:] for g in Blocks[:4]] + ['003']
+    G = nx.path_graph(nodes)
+    for n, d in zip(nodes, Districts[:4] + ['2']):
+        G.nodes[n].update({'cd': d, 'total_pop': 10, 'aland': 1.0, 'perim': 4.0})
+    nx.set_edge_attributes(G, 1.0, 'shared_perim')
+    nx.set_edge_attributes(G, 0.5, 'distance')
+    return nx.relabel_nodes(G, dict(zip(nodes, encode_geoid(nodes).tolist())))
+
+
+def contract(level, county_line=True):
+    m = level_mapping(assignments(), level, 'cd', county_line)
+    return contract_graph(tabblock_graph(), dict(zip(encode_geoid(m.index).tolist(), encode_geoid(m.to_numpy()).tolist())), 'cd')
+
+
+def test_level_mapping_uses_node_ids():
+    m = level_mapping(assignments(), 'tract', 'cd', county_line=True)
+    assert m['0010001001000'] == '001000100' and m['0010002001001'] == '001000200'
+    assert m['0030001001000'] == '003' and m['003'] == '003'
+    m = level_mapping(assignments(), 'tract', 'cd', county_line=False)
+    assert m['0030001001000'] == '003000100' and '003' not in m.index
+
+
+def test_contract_tabblock_graph_to_tracts():
+    H = contract('tract')
+    tracts = dict(zip(encode_geoid(['001000100', '001000200', '003']).tolist(), ['t1', 't2', 'c3']))
+    assert set(H.nodes) == set(tracts)
+    H = nx.relabel_nodes(H, tracts)
+    assert sorted(map(sorted, H.edges)) == [['c3', 't2'], ['t1', 't2']]
+    assert H.nodes['t1']['cd'] == '1' and H.nodes['t2']['cd'] == '2' and H.nodes['c3']['cd'] == '2'
+    assert H.nodes['t1']['total_pop'] == 20 and H.nodes['c3']['total_pop'] == 10
+######## two squares sharing one side lose it twice ########
+    assert H.nodes['t1']['perim'] == 6.0
+    assert H.edges['t1', 't2']['shared_perim'] == 1.0
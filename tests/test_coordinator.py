@@ -0,0 +1,60 @@
+import os, time, threading, multiprocessing, pathlib
+import pytest
+from src.coordinator import Coordinator, run_worker
+
+
+def start(coordinator):
+    thread = threading.Thread(target=coordinator.serve, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while coordinator.port == 0:
+        assert time.time() < deadline, 'coordinator did not start'
+        time.sleep(0.01)
+    return thread
+
+
+def work(seed, path, crash_seed):
+######## each finished seed leaves a file - the first attempt at crash_seed dies without reporting back ########
+    path = pathlib.Path(path)
+    if seed == crash_seed and not (path / 'crashed').exists():
+        (path / 'crashed').touch()
+        os._exit(1)
+    time.sleep(0.01)
+    (path / f'{seed}_{os.getpid()}').touch()
+
+
+def run(fn_args, port):
+    run_worker(lambda seed: work(seed, *fn_args), host='127.0.0.1', port=port, heartbeat=0.05, poll=0.05)
+
+
+@pytest.mark.parametrize('crash_seed', [None, 3])
+def test_workers_finish_every_seed_once(tmp_path, crash_seed):
+    seeds = list(range(12))
+    C = Coordinator(seeds=seeds, host='127.0.0.1', port=0, lease_timeout=0.5)
+    thread = start(C)
+    ctx = multiprocessing.get_context('fork')
+    P = [ctx.Process(target=run, args=((str(tmp_path), crash_seed), C.port)) for i in range(3)]
+    for p in P:
+        p.start()
+    thread.join(timeout=60)
+    for p in P:
+        p.join(timeout=10)
+    assert not thread.is_alive()
+    assert C.done == set(seeds) and len(C.failed) == 0
+    finished = [int(f.name.split('_')[0]) for f in tmp_path.glob('*_*')]
+    assert sorted(finished) == seeds  # every seed ran to completion exactly once
+    for s in seeds:
+        assert C.leased[s] == (2 if s == crash_seed else 1)  # only the dead worker's seed was handed out again
+
+
+def test_expired_lease_is_reissued_and_only_the_holder_finishes():
+    C = Coordinator(seeds=[7], lease_timeout=0.05)
+    assert C.handle({'op': 'lease', 'worker': 'a'}) == {'seed': 7}
+    assert C.handle({'op': 'lease', 'worker': 'b'}) == {'seed': None, 'wait': True}
+    time.sleep(0.1)
+    assert C.handle({'op': 'lease', 'worker': 'b'}) == {'seed': 7}
+    assert C.handle({'op': 'heartbeat', 'worker': 'a', 'seed': 7}) == {'ok': False}
+    assert C.handle({'op': 'done', 'worker': 'a', 'seed': 7}) == {'ok': False}
+    assert not C.finished.is_set()
+    assert C.handle({'op': 'done', 'worker': 'b', 'seed': 7}) == {'ok': True}
+    assert C.finished.is_set() and C.done == {7}
@@ -0,0 +1,25 @@
+import numpy as np
+from src.diagnostics import Diagnostics
+
+
+def chain(phi, n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.zeros(n)
+    for t in range(1, n):
+        x[t] = phi * x[t-1] + rng.normal()
+    return x
+
+
+def test_independent_draws_have_full_ess():
+    D = Diagnostics(metrics=('x',), max_lag=50)
+    for x in chain(0.0, 2000):
+        D.update([x])
+    assert 1000 < D.ess()['x'] <= 2000
+
+
+def test_unfinished_positive_sequence_is_undetermined():
+######## autocorrelation is still ~0.9 at lag 20, so Geyer's sequence has not ended by max_lag ########
+    D = Diagnostics(metrics=('x',), max_lag=20)
+    for x in chain(0.995, 2000):
+        D.update([x])
+    assert np.isnan(D.ess()['x'])
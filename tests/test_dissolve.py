@@ -0,0 +1,32 @@
+import shapely.ops, shapely.wkt
+import pytest
+from src import encode_geoid
+from src.dissolve import Dissolve
+
+
+def outline(lattice_nodes, mask):
+    D = Dissolve.__new__(Dissolve)  # only the topology - no plan store
+    D.nodes, D.tol = 'proj.ds.nodes', 0
+    D.get_topology()
+    region = D.region(D.geoids.get_indexer(encode_geoid(lattice_nodes.loc[mask, 'geoid'])))
+    union = shapely.ops.unary_union([shapely.wkt.loads(p) for p in lattice_nodes.loc[mask, 'polygon']])
+    assert region.symmetric_difference(union).area == pytest.approx(0, abs=1e-12)
+    assert region.area == pytest.approx(union.area)
+    return region
+
+
+def test_block_of_rows(lattice_nodes):
+    region = outline(lattice_nodes, lattice_nodes['i'] < 3)
+    assert len(region.geoms) == 1 and len(region.geoms[0].interiors) == 0
+
+
+def test_district_with_a_hole(lattice_nodes):
+    i, j = lattice_nodes['i'], lattice_nodes['j']
+    region = outline(lattice_nodes, ~(i.isin([2, 3]) & j.isin([2, 3])))
+    assert len(region.geoms) == 1 and len(region.geoms[0].interiors) == 1
+
+
+def test_district_filling_a_hole_and_split_districts(lattice_nodes):
+    i, j = lattice_nodes['i'], lattice_nodes['j']
+    assert len(outline(lattice_nodes, i.isin([2, 3]) & j.isin([2, 3])).geoms) == 1
+    assert len(outline(lattice_nodes, j.isin([0, 5])).geoms) == 2
@@ -0,0 +1,33 @@
+import numpy as np
+from src.ensemble import Stat, Ensemble, Hist_ranges
+
+
+def test_merge_matches_one_pass():
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(size=(700, 3)), rng.normal(5, 2, size=(300, 3))
+    a = Stat(width=3, hist_range=(-10.0, 10.0)).update(x)
+    b = Stat(width=3, hist_range=(-10.0, 10.0)).update(y)
+    c = Stat(width=3, hist_range=(-10.0, 10.0)).update(np.concatenate([x, y]))
+    a.merge(b)
+    assert a.n == c.n == 1000
+    assert np.allclose(a.mean, c.mean) and np.allclose(a.var, c.var) and np.allclose(a.var, np.concatenate([x, y]).var(axis=0, ddof=1))
+    assert (a.min == c.min).all() and (a.max == c.max).all() and (a.hist == c.hist).all()
+
+
+def test_compactor_keeps_weight_and_quantiles():
+    rng = np.random.default_rng(1)
+    x = rng.uniform(size=20000)
+    s = Stat(width=1, k=200, rng=rng)
+    for chunk in np.array_split(x, 100):
+        s.update(chunk)
+    assert sum(len(L) * 2**h for h, L in enumerate(s.levels)) == len(x)  # every observation is still represented once
+    assert sum(len(L) for L in s.levels) < 2000                           # ... by far fewer items
+    q = s.quantile([0.1, 0.5, 0.9])[:, 0]
+    assert np.abs(q - np.quantile(x, [0.1, 0.5, 0.9])).max() < 0.03
+
+
+def test_seat_counts_get_their_own_bins():
+    E = Ensemble().update({'seats': 3}).update({'seats': 4}).update({'seats': 4})
+    s = E.stats['seats']
+    assert s.bins == Hist_ranges['seats'][2]
+    assert s.hist[3, 0] == 1 and s.hist[4, 0] == 2 and s.hist.sum() == 3
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from src import encode_geoid, decode_geoid
+
+######## one id of every width the stages produce - levels, node ids without the state fips, county_line counties ########
+Ids = ['48', '01', '48001', '01001', '48001000100', '01001000100', '480010001001', '480010001001000', '010010001001000',
+       '0010001001000', '001000100', '001', '000', '0', '00000000000000', '001000001a', '201000pct12', 'zz9']
+
+
+def test_round_trip_of_every_width():
+    codes = encode_geoid(Ids)
+    assert codes.dtype == np.int64
+    assert len(set(codes.tolist())) == len(Ids)  # leading zeros & length are kept
+    assert decode_geoid(codes).tolist() == [g.lower() for g in Ids]
+
+
+def test_numeric_ids_sort_like_strings_of_one_width():
+    g = ['010010001001000', '480010001001000', '480010001001001', '480010002001000']
+    assert np.all(np.diff(encode_geoid(g)) > 0)
+
+
+@pytest.mark.parametrize('bad', ['4800100010010001', '48-001', '1234567890abc'])
+def test_unencodable_ids_are_rejected(bad):
+    with pytest.raises(AssertionError):
+        encode_geoid([bad])
@@ -0,0 +1,20 @@
+import numpy as np
+from src.lookup import Lookup
+from src.maps import Geometry
+
+
+def test_nodes_at_finds_the_lattice_square(lattice_nodes):
+    L = Lookup.__new__(Lookup)  # the point -> node half of get() - no plans needed
+    gdf = Geometry(nodes='proj.ds.nodes', tols=()).get().load()
+    L.geoids, L.polygons = gdf['geoid'].to_numpy(), gdf.geometry
+    L.tree = L.polygons.sindex
+
+    rng = np.random.default_rng(0)
+    df = lattice_nodes.sample(20, random_state=0)
+    lat = (df['i'] + rng.uniform(0.05, 0.95, len(df))) / 100
+    lon = (df['j'] + rng.uniform(0.05, 0.95, len(df))) / 100
+    node = L.nodes_at(lat, lon)
+    assert list(L.geoids[node]) == list(df['geoid'])
+
+    node = L.nodes_at([-0.005, 0.035, 0.065], [0.035, 0.035, 0.035])  # below, inside & above the lattice
+    assert node[0] == -1 and node[2] == -1 and L.geoids[node[1]] == lattice_nodes.query('i == 3 and j == 3')['geoid'].item()
@@ -0,0 +1,28 @@
+import pandas as pd, shapely.geometry
+import src.maps
+from src.maps import Geometry
+
+
+def test_geometry_cache_keeps_other_tols_and_rebuilds_when_stale(tmp_path, monkeypatch):
+    stamp, reads = {'proj.ds.nodes': '1'}, list()
+    def read_nodes(tbl, cols, groups=None):
+        reads.append(tbl)
+        squares = [shapely.geometry.box(x, 0, x + 0.01, 0.01).wkt for x in [0, 0.01, 0.02]]
+        return pd.DataFrame({'geoid': ['001', '002', '003'], 'county': 'A', 'total_pop': [1, 2, 3], 'density': 1.0,
+                             'aland': 1.0, 'perim': 4.0, 'polsby_popper': 78.5, 'polygon': squares})
+    monkeypatch.setattr(src.maps, 'data_path', tmp_path)
+    monkeypatch.setattr(src.maps, 'nodes_stamp', lambda tbl: dict(stamp))
+    monkeypatch.setattr(src.maps, 'read_nodes', read_nodes)
+
+    G = Geometry(nodes='proj.ds.nodes', tols=(0.001,)).get()
+    Geometry(nodes='proj.ds.nodes', tols=()).get()    # as Lookup asks
+    Geometry(nodes='proj.ds.nodes', tols=(0,)).get()  # as Dissolve asks
+    assert G.geo_pq(0.001).exists() and G.geo_pq(0).exists() and G.exact_pq.exists()
+    assert len(reads) == 1
+    assert len(G.load()) == 3 and len(G.load(0.001)) == 3
+
+    stamp['proj.ds.nodes'] = '2'  # the nodes table was rebuilt
+    Geometry(nodes='proj.ds.nodes', tols=(0,)).get()
+    assert len(reads) == 2
+    assert G.geo_pq(0).exists() and not G.geo_pq(0.001).exists()
+    assert sorted(p.name for p in tmp_path.glob('geometry/*')) == ['nodes', 'nodes.lock']  # no leftover temp copies
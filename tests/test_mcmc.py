@@ -0,0 +1,41 @@
+import numpy as np, pandas as pd
+import pytest
+from src.mcmc import MCMC
+
+
+def voter(labels, votes_dem, votes_rep):
+######## just the state update_votes reads - no graph or warehouse needed ########
+    M = MCMC.__new__(MCMC)
+    M.elections = ('e1', 'e2')
+    M.node_idx = {n: n for n in labels}
+    M.votes_dem, M.votes_rep = votes_dem, votes_rep
+    M.districts = {d: tuple(n for n in sorted(labels) if labels[n] == d) for d in sorted(set(labels.values()))}
+    M.district_votes = dict()
+    return M
+
+
+def test_incremental_votes_match_a_full_recount():
+    rng = np.random.default_rng(0)
+    votes_dem, votes_rep = rng.integers(0, 100, size=(2, 30, 2)).astype(float)
+    labels = {n: str(n % 3) for n in range(30)}
+    M = voter(labels, votes_dem, votes_rep)
+    M.update_votes(M.districts.keys())
+    for step in range(100):
+        n = int(rng.integers(30))
+        d0 = labels[n]
+        if len(M.districts[d0]) == 1:
+            continue
+        d1 = str(rng.choice([d for d in '012' if d != d0]))
+        labels[n] = d1
+        M.districts = voter(labels, votes_dem, votes_rep).districts
+        M.update_votes((d0, d1))
+    full = voter(labels, votes_dem, votes_rep)
+    full.update_votes(full.districts.keys())
+    pd.testing.assert_frame_equal(M.partisan, full.partisan)
+    for d in full.district_votes:
+        assert np.allclose(M.district_votes[d], full.district_votes[d])
+
+
+def test_elections_need_a_nodes_table():
+    with pytest.raises(AssertionError, match='nodes_tbl'):
+        MCMC(gpickle='graph_TX_2020_tract_cd.gpickle', district_type='cd', max_steps=1, user_name='test', elections=('President_2020_general',))
@@ -0,0 +1,43 @@
+import numpy as np, networkx as nx
+import src.optimize
+from src.optimize import burst
+
+
+class Chain():
+######## stands in for the burst's MCMC - each recomb step jumps to the next (pop_imbalance, labels) ########
+    def __init__(self, start_imbalance, steps):
+        self.graph, self.district_type, self.elections = nx.path_graph(2), 'cd', ()
+        self.pop_imbalance_tol, self.partition = 10.0, None
+        self.start_imbalance, self.steps = start_imbalance, list(steps)
+
+    def get_stats(self):
+        self.pop_imbalance = self.start_imbalance
+
+    def recomb(self):
+        if len(self.steps) == 0:
+            return False
+        self.pop_imbalance, labels = self.steps.pop(0)
+        nx.set_node_attributes(self.graph, labels, self.district_type)
+        return True
+
+
+def run(monkeypatch, chain):
+    monkeypatch.setattr(src.optimize, 'Burst_mcmc', chain, raising=False)
+    monkeypatch.setattr(src.optimize, 'Burst_score', lambda T: T, raising=False)
+    monkeypatch.setattr(src.optimize, 'district_totals', lambda M: M.pop_imbalance)  # score = imbalance, so worse plans score higher
+    return burst(({0: '1', 1: '1'}, 0, 5))
+
+
+def test_start_plan_outside_tolerance_is_never_best(monkeypatch):
+    best, labels, done = run(monkeypatch, Chain(20.0, [(5.0, {0: '1', 1: '2'}), (15.0, {0: '2', 1: '2'})]))
+    assert (best, labels, done) == (5.0, {0: '1', 1: '2'}, 2)
+
+
+def test_no_plan_within_tolerance_scores_minus_inf(monkeypatch):
+    best, labels, done = run(monkeypatch, Chain(20.0, [(15.0, {0: '1', 1: '2'})]))
+    assert best == -np.inf and labels == {0: '1', 1: '1'}
+
+
+def test_start_plan_within_tolerance_counts(monkeypatch):
+    best, labels, _ = run(monkeypatch, Chain(8.0, [(5.0, {0: '1', 1: '2'})]))
+    assert (best, labels) == (8.0, {0: '1', 1: '1'})
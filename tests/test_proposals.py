@@ -0,0 +1,28 @@
+import networkx as nx
+from src.proposals import propose_cut
+
+
+def args(seed):
+######## two districts of a 6x6 grid merged - the other districts sit at the ideal of 18 ########
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(6, 6))
+    nodes = list(G.nodes)
+    return (nodes, list(G.edges), [1] * len(nodes), 36, 18, 18, 18.0, 5.0, seed, 50)
+
+
+def test_propose_cut_returns_a_balanced_cut():
+    G = nx.Graph(args(0)[1])
+    for seed in range(5):
+        res = propose_cut(args(seed))
+        assert res is not None
+        a, b, imb = res
+        assert sorted(a + b) == sorted(G.nodes) and len(a) == len(b) == 18
+        assert nx.is_connected(G.subgraph(a)) and nx.is_connected(G.subgraph(b))
+        assert imb <= 5.0
+        assert propose_cut(args(seed)) == res  # the candidate's seed fixes its answer
+
+
+def test_propose_cut_gives_up_when_no_cut_balances():
+    a = list(args(0))
+    a[7] = -1.0  # no cut meets a negative tolerance
+    a[9] = 3
+    assert propose_cut(tuple(a)) is None
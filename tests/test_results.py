@@ -0,0 +1,56 @@
+import numpy as np, pandas as pd
+import src, src.results
+from src import encode_geoid
+from src.results import Results
+
+Nodes = 'proj.ds.nodes_TX_2020_tract_cd'
+Geoids = ['48001000100', '48001000200', '48001000300']
+
+
+def results(tmp_path, monkeypatch, chunk_size=4):
+    monkeypatch.setattr(src.results, 'results_root', tmp_path / 'results')
+    monkeypatch.setattr(src.results, 'data_path', tmp_path / 'data')
+    return Results(nodes=Nodes, tbl='proj.ds.TX_2020_tract_cd_seed_0001', chunk_size=chunk_size)
+
+
+def plans():
+######## 3 plans x 3 nodes - node 2 moves to district 1 in plan 1, node 0 to district 2 in plan 2 ########
+    return pd.DataFrame({'plan': np.repeat([0, 1, 2], 3),
+                         'geoid': np.tile(encode_geoid(Geoids), 3),
+                         'cd': ['1', '1', '2', '1', '1', '1', '2', '1', '2']})
+
+
+def test_stream_plans_keeps_each_plan_whole(tmp_path, monkeypatch):
+    R = results(tmp_path, monkeypatch)
+    R.results_path.mkdir(parents=True)
+    plans().to_parquet(R.plans_pq, row_group_size=4)
+    chunks = list(R.stream_plans())
+    assert len(chunks) > 1
+    seen = [set(c['plan']) for c in chunks]
+    assert all(a.isdisjoint(b) for i, a in enumerate(seen) for b in seen[i+1:])
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), plans())
+
+
+def test_tally_is_the_plan_by_attribute_product(tmp_path, monkeypatch):
+    R = results(tmp_path, monkeypatch)
+    R.attrs = np.array([[1.0, 10.0], [2.0, 20.0], [4.0, 40.0]])
+    R.geoids = pd.Index(encode_geoid(Geoids))
+    R.cols = ['total_pop', 'votes']
+    T = R.tally(plans()).sort_values(['plan', 'cd'], ignore_index=True)
+    assert T['plan'].tolist() == [0, 0, 1, 2, 2]
+    assert T['cd'].tolist() == ['1', '2', '1', '1', '2']
+    assert T['total_pop'].tolist() == [3.0, 4.0, 7.0, 2.0, 5.0]
+    assert T['votes'].tolist() == [30.0, 40.0, 70.0, 20.0, 50.0]
+
+
+def test_node_attributes_are_rebuilt_when_the_nodes_table_changes(fake, tmp_path, monkeypatch):
+    R = results(tmp_path, monkeypatch)
+    monkeypatch.setattr(src.results, 'node_cols', lambda tbl, groups=None: {'total_pop': tbl})
+    monkeypatch.setattr(src.results, 'read_nodes', lambda tbl, cols, groups=None: fake.tables[tbl][['geoid'] + cols])
+    monkeypatch.setattr(src, 'meta_ttl', 0)
+    fake.put(Nodes, pd.DataFrame({'geoid': Geoids, 'total_pop': [1, 2, 3]}))
+    assert R.get_attrs().attrs[:, 0].tolist() == [1, 2, 3]
+    assert Results(nodes=Nodes, tbl=R.tbl).get_attrs().attrs[:, 0].tolist() == [1, 2, 3]  # reused
+    fake.put(Nodes, pd.DataFrame({'geoid': Geoids, 'total_pop': [5, 6, 7]}))  # nodes table rebuilt
+    assert R.get_attrs().attrs[:, 0].tolist() == [5, 6, 7]
+    assert len([p for p in R.attrs_path.iterdir() if p.is_dir()]) == 1
@@ -0,0 +1,21 @@
+import numpy as np, networkx as nx
+import pytest
+from src.seeds import recursive_tree_part
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_seed_plan_is_connected_and_balanced(seed):
+    rng = np.random.default_rng(seed)
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(12, 12))
+    for n in G:
+        G.nodes[n]['total_pop'] = int(rng.integers(50, 150))
+    tol = 10.0
+    labels = recursive_tree_part(G, 4, tol, rng)
+    assert set(labels) == set(G.nodes) and sorted(set(labels.values())) == ['1', '2', '3', '4']
+    pops = list()
+    for d in set(labels.values()):
+        N = [n for n in G if labels[n] == d]
+        assert nx.is_connected(G.subgraph(N))
+        pops.append(sum(G.nodes[n]['total_pop'] for n in N))
+    ideal = sum(pops) / 4
+    assert (max(pops) - min(pops)) / ideal * 100 < tol
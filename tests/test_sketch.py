@@ -0,0 +1,21 @@
+import numpy as np, networkx as nx
+import pytest
+from src.sketch import PlanSketch, similarity
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_update_matches_full_minhash_after_random_moves(seed):
+    rng = np.random.default_rng(seed)
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(10, 10))
+    for n in G:
+        G.nodes[n]['cd'] = str(n // 25)
+    S = PlanSketch(G, 'cd', num_hashes=32)
+    for step in range(50):
+        for n in rng.choice(len(G), size=rng.integers(1, 6), replace=False):  # a node takes a neighbor's label
+            nbrs = list(G.neighbors(n))
+            G.nodes[n]['cd'] = G.nodes[nbrs[rng.integers(len(nbrs))]]['cd']
+        sig = S.update()
+        full = PlanSketch(G, 'cd', num_hashes=32).sig
+        assert (sig == full).all()
+    assert S.recomputed > 0  # the stale-minimum path ran
+    assert similarity(sig, full) == 1.0
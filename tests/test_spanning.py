@@ -0,0 +1,33 @@
+import numpy as np, networkx as nx
+import pytest
+from src.spanning import TreeCounter, uniform_spanning_tree
+
+
+def kirchhoff(H):
+    L = nx.laplacian_matrix(H, weight=None).toarray().astype(float)
+    return np.linalg.slogdet(L[1:, 1:])[1]
+
+
+@pytest.mark.parametrize('m, n, count', [(2, 2, 4), (2, 3, 15), (3, 3, 192), (4, 4, 100352)])
+def test_log_count_matches_known_grid_counts(m, n, count):
+    G = nx.grid_2d_graph(m, n)
+    assert TreeCounter(G)(list(G.nodes)) == pytest.approx(np.log(count))
+
+
+def test_log_count_matches_kirchhoff_on_subgraphs():
+    G = nx.grid_2d_graph(6, 6)
+    C = TreeCounter(G)
+    for nodes in [[(i, j) for i in range(3) for j in range(6)], [(i, j) for i in range(6) for j in range(6) if i <= j]]:
+        assert C(nodes) == pytest.approx(kirchhoff(G.subgraph(nodes)))
+    assert C(nodes) == C(list(reversed(nodes))) and C.hits == 2
+
+
+def test_approximation_bounds_the_count():
+    G = nx.grid_2d_graph(5, 5)
+    assert TreeCounter(G, approx_above=10)(list(G.nodes)) >= kirchhoff(G)
+
+
+def test_uniform_spanning_tree_spans():
+    G = nx.grid_2d_graph(5, 5)
+    T = uniform_spanning_tree(G, np.random.default_rng(0))
+    assert nx.is_tree(T) and set(T.nodes) == set(G.nodes) and all(G.has_edge(*e) for e in T.edges)
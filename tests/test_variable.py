@@ -0,0 +1,31 @@
+import dataclasses, types, typing, sys
+import pandas as pd
+import src
+
+
+@dataclasses.dataclass
+class Stage(src.Variable):
+    name : str = 'stage'
+    yr   : int = 2020
+
+
+@dataclasses.dataclass
+class G(src.Base):
+    state         : typing.Any = types.SimpleNamespace(abbr='ZZ')
+    district_type : str = 'cd'
+
+
+def test_load_checks_the_table(fake):
+    s = Stage(G())
+    assert s.load() is False
+    fake.put(s.tbl, pd.DataFrame({'geoid': ['1']}))
+    src.invalidate(s.tbl)
+    assert s.load() is True
+
+
+def test_fingerprint_ignores_shared_init_but_follows_version(monkeypatch):
+    fp = Stage(G()).fingerprint()
+    monkeypatch.setattr(sys.modules['src'], '__file__', '/nonexistent/__init__.py')  # never read
+    assert Stage(G()).fingerprint() == fp
+    monkeypatch.setattr(Stage, 'version', 1)
+    assert Stage(G()).fingerprint() != fp